@@ -1,20 +1,36 @@
 from django.contrib import admin
+from django.utils import timezone
+from .delivery import address_key
 from .models import (
     Appointment,
     BedBooking,
     Cart,
     CartItem,
+    DailyRollup,
     Doctor,
+    DoctorLanguage,
+    GeocodedAddress,
     Hospital,
     HospitalBed,
+    HospitalSpecialty,
+    IdempotencyKey,
+    InventoryCheckpoint,
+    InventoryLedgerEntry,
+    Job,
+    Language,
     Medicine,
     MedicineOrder,
     MedicineOrderItem,
+    MedicineProduct,
     Notification,
+    NotificationArchive,
+    OxygenAllocation,
     OxygenBooking,
     OxygenCylinderStock,
     OxygenSupplier,
     Pharmacy,
+    Review,
+    Specialty,
     SupportRequest,
     UserProfile,
 )
@@ -25,6 +41,11 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'role', 'city', 'phone')
 
 
+class HospitalSpecialtyInline(admin.TabularInline):
+    model = HospitalSpecialty
+    extra = 1
+
+
 class HospitalBedInline(admin.TabularInline):
     model = HospitalBed
     extra = 1
@@ -43,11 +64,29 @@ class HospitalAdmin(admin.ModelAdmin):
         'state',
         'hospital_type',
         'rating',
+        'rating_count',
         'support_24_7',
     )
     list_filter = ('city', 'state', 'hospital_type', 'support_24_7')
-    search_fields = ('name', 'city', 'specialties_offered')
-    inlines = [HospitalBedInline, DoctorInline]
+    search_fields = ('name', 'city', 'specialties__name')
+    inlines = [HospitalSpecialtyInline, HospitalBedInline, DoctorInline]
+
+
+@admin.register(Specialty)
+class SpecialtyAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key')
+    search_fields = ('name',)
+
+
+class DoctorLanguageInline(admin.TabularInline):
+    model = DoctorLanguage
+    extra = 1
+
+
+@admin.register(Language)
+class LanguageAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key')
+    search_fields = ('name',)
 
 
 @admin.register(Doctor)
@@ -60,10 +99,19 @@ class DoctorAdmin(admin.ModelAdmin):
         'qualification',
         'consultation_fee',
         'rating',
+        'rating_count',
         'is_active',
     )
-    list_filter = ('speciality', 'city', 'hospital')
+    list_filter = ('speciality', 'city', 'hospital', 'languages')
     search_fields = ('name', 'hospital__name', 'speciality', 'qualification')
+    inlines = [DoctorLanguageInline]
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'hospital', 'rating', 'created_at')
+    list_filter = ('rating',)
+    raw_id_fields = ('patient', 'appointment', 'bed_booking')
 
 
 @admin.register(Appointment)
@@ -79,7 +127,7 @@ class OxygenCylinderStockInline(admin.TabularInline):
 
 @admin.register(OxygenSupplier)
 class OxygenSupplierAdmin(admin.ModelAdmin):
-    list_display = ('name', 'city', 'contact_phone', 'delivery_available')
+    list_display = ('name', 'city', 'contact_phone', 'delivery_available', 'delivery_vehicles', 'vehicle_capacity')
     inlines = [OxygenCylinderStockInline]
 
 
@@ -90,13 +138,33 @@ class OxygenCylinderStockAdmin(admin.ModelAdmin):
 
 @admin.register(OxygenBooking)
 class OxygenBookingAdmin(admin.ModelAdmin):
-    list_display = ('patient', 'stock', 'quantity', 'scheduled_date', 'status')
-    list_filter = ('status',)
+    list_display = ('patient', 'stock', 'quantity', 'scheduled_date', 'status', 'reserved')
+    list_filter = ('status', 'reserved')
+    raw_id_fields = ('allocation',)
+
+
+class OxygenAllocationBookingInline(admin.TabularInline):
+    model = OxygenBooking
+    fields = ('stock', 'quantity', 'status')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OxygenAllocation)
+class OxygenAllocationAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'city', 'capacity_litres', 'quantity', 'created_at')
+    search_fields = ('patient__username', 'city')
+    inlines = [OxygenAllocationBookingInline]
 
 
 class MedicineInline(admin.TabularInline):
     model = Medicine
     extra = 1
+    autocomplete_fields = ('product',)
 
 
 @admin.register(Pharmacy)
@@ -105,21 +173,27 @@ class PharmacyAdmin(admin.ModelAdmin):
     inlines = [MedicineInline]
 
 
+@admin.register(MedicineProduct)
+class MedicineProductAdmin(admin.ModelAdmin):
+    list_display = ('name', 'brand', 'form', 'strength')
+    list_filter = ('form',)
+    search_fields = ('name', 'brand')
+
+
 @admin.register(Medicine)
 class MedicineAdmin(admin.ModelAdmin):
     list_display = (
-        'name',
-        'brand',
-        'form',
-        'strength',
+        'product',
         'pharmacy',
         'price',
         'pack_size',
         'stock',
         'is_essential',
     )
-    list_filter = ('is_essential', 'form', 'brand', 'pharmacy')
-    search_fields = ('name', 'brand', 'pharmacy__name')
+    list_filter = ('is_essential', 'product__form', 'pharmacy')
+    search_fields = ('product__name', 'product__brand', 'pharmacy__name')
+    list_select_related = ('product', 'pharmacy')
+    autocomplete_fields = ('product',)
 
 
 class MedicineOrderItemInline(admin.TabularInline):
@@ -154,8 +228,89 @@ class SupportRequestAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'notification_type', 'message', 'is_read', 'created_at')
     list_filter = ('notification_type', 'is_read')
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ('user', 'notification_type', 'message', 'count', 'created_at')
+    list_filter = ('notification_type',)
+
+
 @admin.register(BedBooking)
 class BedBookingAdmin(admin.ModelAdmin):
     list_display = ('id', 'patient', 'hospital_bed', 'booking_date', 'status', 'created_at')
     list_filter = ('status', 'booking_date')
     search_fields = ('patient__username', 'hospital_bed__hospital__name')
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'metric', 'key', 'status', 'count', 'amount')
+    list_filter = ('metric', 'status')
+    date_hierarchy = 'day'
+
+
+@admin.register(InventoryLedgerEntry)
+class InventoryLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('seq', 'created_at', 'resource', 'object_id', 'field', 'delta', 'value_after', 'reason', 'user')
+    list_filter = ('resource', 'reason')
+    search_fields = ('object_id',)
+    date_hierarchy = 'created_at'
+
+    # The ledger is append-only; entries are only removed by compaction.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InventoryCheckpoint)
+class InventoryCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'object_id', 'field', 'value', 'seq')
+    list_filter = ('resource',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('lease', 'locked_until', 'last_error', 'created_at')
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='RUNNING').update(
+            status='QUEUED', run_at=timezone.now(), attempts=0, last_error='',
+        )
+        self.message_user(request, f'{updated} job(s) queued again.')
+
+
+@admin.register(GeocodedAddress)
+class GeocodedAddressAdmin(admin.ModelAdmin):
+    list_display = ('address', 'latitude', 'longitude', 'updated_at')
+    search_fields = ('address',)
+    exclude = ('key',)
+
+    def save_model(self, request, obj, form, change):
+        obj.key = address_key(obj.address)
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'status_code', 'location', 'created_at')
+    search_fields = ('key', 'user__username')
+    raw_id_fields = ('user',)
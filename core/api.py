@@ -0,0 +1,612 @@
+"""
+Read-only JSON API (v1) for hospitals, doctors, medicines and oxygen stock.
+
+Responses are built from ``.values()`` rows and serialised directly, so no
+model instances are created. Every endpoint supports:
+
+* ``fields=a,b,c`` to select a subset of the published fields;
+* ``limit=N`` and ``after=<id>`` for keyset pagination on the primary key.
+
+``availability`` is the exception: it is a bulk columnar feed for aggregators
+and returns every bed row for a state in one response. ``bed_recommendations``
+is served from the in-memory index in ``core.placement``.
+"""
+import datetime
+import decimal
+import json
+import struct
+import sys
+import zlib
+from array import array
+from itertools import islice
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from . import doctor_ranking, inventory, occupancy, placement
+from .caching import DOCTORS, HOSPITALS, MEDICINES, OXYGEN, conditional_on
+from .models import (
+    Doctor,
+    DoctorLanguage,
+    Hospital,
+    HospitalBed,
+    HospitalSpecialty,
+    Medicine,
+    MedicineProduct,
+    OxygenCylinderStock,
+    Specialty,
+)
+from .ratelimit import rate_limit
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+HOSPITAL_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'city': 'city',
+    'state': 'state',
+    'hospital_type': 'hospital_type',
+    'rating': 'rating',
+    'contact_phone': 'contact_phone',
+    'emergency_contact': 'emergency_contact',
+    'support_24_7': 'support_24_7',
+}
+BED_FIELDS = ('bed_type', 'total_beds', 'available_beds')
+
+DOCTOR_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'speciality': 'speciality',
+    'hospital_id': 'hospital_id',
+    'hospital_name': 'hospital__name',
+    'city': 'city',
+    'qualification': 'qualification',
+    'experience_years': 'experience_years',
+    'consultation_fee': 'consultation_fee',
+    'rating': 'rating',
+    'available_from': 'available_from',
+    'available_to': 'available_to',
+    'open_slots': 'open_slots',
+    'rank_score': 'rank_score',
+}
+
+MEDICINE_FIELDS = {
+    'id': 'id',
+    'product_id': 'product_id',
+    'name': 'product__name',
+    'brand': 'product__brand',
+    'form': 'product__form',
+    'strength': 'product__strength',
+    'pack_size': 'pack_size',
+    'price': 'price',
+    'stock': 'stock',
+    'is_essential': 'is_essential',
+    'pharmacy_id': 'pharmacy_id',
+    'pharmacy_name': 'pharmacy__name',
+    'city': 'pharmacy__city',
+}
+
+OXYGEN_FIELDS = {
+    'id': 'id',
+    'supplier_id': 'supplier_id',
+    'supplier_name': 'supplier__name',
+    'city': 'supplier__city',
+    'delivery_available': 'supplier__delivery_available',
+    'capacity_litres': 'capacity_litres',
+    'price_per_cylinder': 'price_per_cylinder',
+    'available_cylinders': 'available_cylinders',
+}
+
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """
+    Serialise ``payload`` to UTF-8 JSON bytes, using orjson when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def _json_response(payload):
+    return HttpResponse(dumps(payload), content_type='application/json')
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _parse_fields(request, available):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ValueError(f'Unknown field(s): {", ".join(unknown)}')
+    if 'id' not in fields:
+        # The cursor is the primary key, so it is always returned.
+        fields.insert(0, 'id')
+    return fields
+
+
+def _parse_page(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        raise ValueError('limit and after must be integers')
+    return max(1, min(limit, MAX_LIMIT)), after
+
+
+def _page(request, queryset, available, order='pk'):
+    """
+    Apply field selection and keyset pagination and return ``(rows, next)``.
+
+    Rows are plain dicts keyed by public field name. ``order`` may name a
+    joined column equal to the primary key, whose index can then return the
+    page in order.
+    """
+    fields = _parse_fields(request, available)
+    limit, after = _parse_page(request)
+    lookups = [available[f] for f in fields]
+    rows = list(
+        queryset.filter(pk__gt=after)
+        .order_by(order)
+        .values_list(*lookups)[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    results = [dict(zip(fields, row)) for row in rows]
+    next_after = results[-1]['id'] if has_more else None
+    return results, next_after
+
+
+def _next_url(request, next_after):
+    if next_after is None:
+        return None
+    params = request.GET.copy()
+    params['after'] = next_after
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def _listing(request, queryset, available, attach=None, order='pk'):
+    try:
+        results, next_after = _page(request, queryset, available, order)
+    except ValueError as exc:
+        return _error(str(exc))
+    if attach:
+        attach(request, results)
+    return _json_response({
+        'results': results,
+        'next': _next_url(request, next_after),
+    })
+
+
+def _attach_specialties(request, hospitals):
+    if request.GET.get('specialties') == '0' or not hospitals:
+        return
+    by_hospital = {h['id']: [] for h in hospitals}
+    for hospital_id, name in (
+        HospitalSpecialty.objects.filter(hospital_id__in=list(by_hospital))
+        .order_by('hospital_id', 'specialty__name')
+        .values_list('hospital_id', 'specialty__name')
+    ):
+        by_hospital[hospital_id].append(name)
+    for hospital in hospitals:
+        hospital['specialties'] = by_hospital[hospital['id']]
+
+
+def _attach_languages(request, doctors):
+    if request.GET.get('languages') == '0' or not doctors:
+        return
+    by_doctor = {d['id']: [] for d in doctors}
+    for doctor_id, name in (
+        DoctorLanguage.objects.filter(doctor_id__in=list(by_doctor))
+        .order_by('doctor_id', 'language__name')
+        .values_list('doctor_id', 'language__name')
+    ):
+        by_doctor[doctor_id].append(name)
+    for doctor in doctors:
+        doctor['languages'] = by_doctor[doctor['id']]
+
+
+def _attach_beds(request, hospitals):
+    if request.GET.get('beds') == '0' or not hospitals:
+        return
+    by_hospital = {h['id']: [] for h in hospitals}
+    for row in (
+        HospitalBed.objects.filter(hospital_id__in=list(by_hospital))
+        .order_by('hospital_id', 'bed_type')
+        .values_list('hospital_id', *BED_FIELDS)
+    ):
+        by_hospital[row[0]].append(dict(zip(BED_FIELDS, row[1:])))
+    for hospital in hospitals:
+        hospital['beds'] = by_hospital[hospital['id']]
+
+
+def _attach_hospital_details(request, hospitals):
+    _attach_specialties(request, hospitals)
+    _attach_beds(request, hospitals)
+
+
+@require_GET
+@rate_limit('search')
+@conditional_on(lambda request: [HOSPITALS])
+def hospitals(request):
+    qs = Hospital.objects.all()
+    city = request.GET.get('city')
+    bed_type = request.GET.get('bed_type')
+    min_rating = request.GET.get('min_rating')
+    specialty = request.GET.get('specialty')
+    order = 'pk'
+    if city:
+        qs = qs.filter(city__iexact=city)
+    if min_rating:
+        try:
+            min_rating = decimal.Decimal(min_rating)
+        except decimal.InvalidOperation:
+            min_rating = None
+        if min_rating is None or not min_rating.is_finite():
+            return _error('min_rating must be a number')
+        qs = qs.filter(rating__gte=min_rating)
+    if specialty:
+        qs = qs.filter(specialty_links__specialty__key=Specialty.key_for(specialty))
+        # Walk the (specialty, hospital) index instead of sorting every match.
+        order = 'specialty_links__hospital_id'
+    if bed_type:
+        qs = qs.filter(beds__bed_type=bed_type).distinct()
+    return _listing(request, qs, HOSPITAL_FIELDS, attach=_attach_hospital_details, order=order)
+
+
+@require_GET
+@rate_limit('search')
+@conditional_on(lambda request: [DOCTORS])
+def doctors(request):
+    qs = Doctor.objects.filter(is_active=True)
+    speciality = request.GET.get('speciality')
+    city = request.GET.get('city')
+    hospital = request.GET.get('hospital')
+    languages = [language for language in request.GET.get('language', '').split(',') if language.strip()]
+    if speciality:
+        qs = qs.filter(speciality__iexact=speciality)
+    if city:
+        qs = qs.filter(city__iexact=city)
+    if hospital:
+        try:
+            qs = qs.filter(hospital_id=int(hospital))
+        except ValueError:
+            return _error('hospital must be an integer')
+    if languages:
+        qs = qs.filter(doctor_ranking.speaking(languages))
+    return _listing(request, qs, DOCTOR_FIELDS, attach=_attach_languages)
+
+
+@require_GET
+@rate_limit('search')
+@conditional_on(lambda request: [MEDICINES])
+def medicines(request):
+    qs = Medicine.objects.all()
+    name = request.GET.get('name')
+    city = request.GET.get('city')
+    product = request.GET.get('product')
+    if name:
+        qs = qs.filter(product__in=MedicineProduct.objects.filter(name__icontains=name).values('pk'))
+    if product:
+        # Every pharmacy's listing of one catalog product, for comparison.
+        qs = qs.filter(product_id=product) if product.isdigit() else qs.none()
+    if city:
+        qs = qs.filter(pharmacy__city__iexact=city)
+    if request.GET.get('in_stock') == '1':
+        qs = qs.filter(stock__gt=0)
+    return _listing(request, qs, MEDICINE_FIELDS)
+
+
+@require_GET
+@rate_limit('search')
+@conditional_on(lambda request: [OXYGEN])
+def oxygen_stock(request):
+    qs = OxygenCylinderStock.objects.all()
+    city = request.GET.get('city')
+    if city:
+        qs = qs.filter(supplier__city__iexact=city)
+    if request.GET.get('in_stock') == '1':
+        qs = qs.filter(available_cylinders__gt=0)
+    return _listing(request, qs, OXYGEN_FIELDS)
+
+
+AVAILABILITY_MAGIC = b'CURA'
+AVAILABILITY_FORMAT_VERSION = 2
+AVAILABILITY_CHUNK = 4096
+
+
+def _availability_rows(queryset):
+    return (
+        queryset.order_by('hospital_id', 'bed_type')
+        .values_list('hospital_id', 'bed_type', 'total_beds', 'available_beds')
+        .iterator(chunk_size=AVAILABILITY_CHUNK)
+    )
+
+
+def _availability_columns(rows, codes):
+    """
+    Read bed rows into parallel typed arrays, dictionary-encoding bed_type.
+
+    ``codes`` maps the bed types seen so far to their codes and is extended
+    in place; the bed types it gains are returned first. Each row becomes a
+    few bytes in the arrays rather than a Python object.
+    """
+    hospital_ids = array('I')
+    type_codes = array('B')
+    totals = array('I')
+    available = array('I')
+    bed_types = []
+    for hospital_id, bed_type, total, free in rows:
+        code = codes.get(bed_type)
+        if code is None:
+            code = codes[bed_type] = len(codes)
+            bed_types.append(bed_type)
+        hospital_ids.append(hospital_id)
+        type_codes.append(code)
+        totals.append(total)
+        available.append(free)
+    return bed_types, hospital_ids, type_codes, totals, available
+
+
+def _json_array_chunks(name, values):
+    yield f'"{name}":['.encode()
+    for start in range(0, len(values), AVAILABILITY_CHUNK):
+        prefix = ',' if start else ''
+        yield (prefix + ','.join(map(str, values[start:start + AVAILABILITY_CHUNK]))).encode()
+    yield b']'
+
+
+def _availability_json(state, columns):
+    bed_types, hospital_ids, type_codes, totals, available = columns
+    yield b'{' + dumps({'state': state, 'bed_types': bed_types})[1:-1] + b','
+    yield from _json_array_chunks('hospital_id', hospital_ids)
+    yield b','
+    yield from _json_array_chunks('bed_type', type_codes)
+    yield b','
+    yield from _json_array_chunks('total_beds', totals)
+    yield b','
+    yield from _json_array_chunks('available_beds', available)
+    yield b'}'
+
+
+def _availability_block(columns):
+    bed_types, hospital_ids, type_codes, totals, available = columns
+    parts = [struct.pack('<IB', len(hospital_ids), len(bed_types))]
+    for bed_type in bed_types:
+        name = bed_type.encode()
+        parts.append(struct.pack('<B', len(name)) + name)
+    for column in (hospital_ids, type_codes, totals, available):
+        if column.itemsize > 1 and sys.byteorder == 'big':
+            column.byteswap()
+        parts.append(column.tobytes())
+    return b''.join(parts)
+
+
+def _availability_binary(queryset):
+    """
+    Little-endian layout (before any gzip)::
+
+        b'CURA' | u8 version
+        blocks of up to AVAILABILITY_CHUNK rows, each:
+            u32 row count n | u8 count of bed types new in this block
+            per new bed type: u8 length + UTF-8 name
+            u32[n] hospital_id | u8[n] bed_type code | u32[n] total | u32[n] available
+        a block with n = 0 and no new bed types ends the feed
+
+    Bed type codes index the bed types in the order they were introduced.
+    Blocks are packed as rows come off the cursor, so at most one block is
+    held in memory.
+    """
+    yield AVAILABILITY_MAGIC + struct.pack('<B', AVAILABILITY_FORMAT_VERSION)
+    rows = _availability_rows(queryset)
+    codes = {}
+    while True:
+        columns = _availability_columns(islice(rows, AVAILABILITY_CHUNK), codes)
+        if not columns[1]:
+            break
+        yield _availability_block(columns)
+    yield struct.pack('<IB', 0, 0)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _accepts_gzip(request):
+    """
+    Whether ``Accept-Encoding`` lists gzip with a non-zero quality.
+    """
+    for coding in request.headers.get('accept-encoding', '').split(','):
+        name, *params = [part.strip().lower() for part in coding.split(';')]
+        if name not in ('gzip', 'x-gzip'):
+            continue
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    return float(param[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+@require_GET
+@conditional_on(lambda request: [HOSPITALS])
+def availability(request):
+    """
+    Bed availability for every hospital in ``state`` as parallel columns.
+
+    ``format=binary`` streams the same columns as packed binary blocks (see
+    ``_availability_binary``) for high-frequency pollers, gzip-compressed
+    when the client's ``Accept-Encoding`` allows it.
+    """
+    state = request.GET.get('state')
+    if not state:
+        return _error('state is required')
+    queryset = HospitalBed.objects.filter(hospital__state__iexact=state)
+    city = request.GET.get('city')
+    if city:
+        queryset = queryset.filter(hospital__city__iexact=city)
+
+    if request.GET.get('format') == 'binary':
+        body = _availability_binary(queryset)
+        gzipped = _accepts_gzip(request)
+        response = StreamingHttpResponse(_gzip(body) if gzipped else body, content_type='application/octet-stream')
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+    columns = _availability_columns(_availability_rows(queryset), {})
+    return StreamingHttpResponse(_availability_json(state, columns), content_type='application/json')
+
+
+FORECAST_MAX_HOSPITALS = 500
+
+
+@require_GET
+def occupancy_forecast(request):
+    """
+    Forecast occupied beds per hour for the next 24 hours.
+
+    Takes ``hospital=<id>`` or ``city=<name>``, and optionally ``bed_type``.
+    """
+    hospital = request.GET.get('hospital')
+    city = request.GET.get('city')
+    qs = Hospital.objects.order_by('pk')
+    if hospital:
+        qs = qs.filter(pk=hospital) if hospital.isdigit() else qs.none()
+    elif city:
+        qs = qs.filter(city__iexact=city)
+    else:
+        return _error('hospital or city is required')
+    hospital_ids = list(qs.values_list('pk', flat=True)[:FORECAST_MAX_HOSPITALS])
+    if not hospital_ids:
+        return _error('No matching hospitals', status=404)
+
+    bed_types = [choice[0] for choice in HospitalBed.BED_TYPE_CHOICES]
+    if request.GET.get('bed_type'):
+        if request.GET['bed_type'] not in bed_types:
+            return _error('Unknown bed_type')
+        bed_types = [request.GET['bed_type']]
+
+    now = timezone.now()
+    try:
+        matrices = {bed_type: occupancy.forecast(hospital_ids, bed_type, now=now) for bed_type in bed_types}
+    except RuntimeError as exc:
+        return _error(str(exc), status=503)
+
+    first_hour = now.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+    forecasts = []
+    for bed_type, matrix in matrices.items():
+        for hospital_id, row in zip(hospital_ids, matrix.tolist()):
+            forecasts.append({
+                'hospital_id': hospital_id,
+                'bed_type': bed_type,
+                'occupied': [None if value != value else round(value, 1) for value in row],
+            })
+    return _json_response({
+        'hours': [(first_hour + datetime.timedelta(hours=h)).isoformat() for h in range(24)],
+        'forecasts': forecasts,
+    })
+
+
+@require_GET
+def inventory_changes(request):
+    """
+    Inventory ledger entries after ``since=<seq>``, oldest first.
+
+    Poll with the returned ``last_seq``. ``resource`` (BED, OXYGEN or
+    MEDICINE) narrows the feed. A ``since`` older than the last compaction
+    gets 410 Gone: the client must reload current values and resume from
+    ``last_seq``.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = max(1, min(int(request.GET.get('limit', MAX_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        return _error('since and limit must be integers')
+    resource = request.GET.get('resource')
+    if resource and resource not in inventory.RESOURCE_MODELS:
+        return _error('Unknown resource')
+
+    compacted = inventory.compacted_through()
+    if since < compacted:
+        response = _error('Changes up to this sequence number have been compacted', status=410)
+        response['X-Compacted-Through'] = compacted
+        return response
+
+    changes = inventory.changes_since(since, limit=limit, resource=resource)
+    return _json_response({
+        'changes': changes,
+        'last_seq': changes[-1]['seq'] if changes else since,
+        'more': len(changes) == limit,
+    })
+
+
+RECOMMENDATION_LIMIT = 10
+
+
+@require_GET
+@rate_limit('search')
+def bed_recommendations(request):
+    """
+    Ranked shortlist of hospitals with free beds of ``bed_type`` in ``city``,
+    favouring those offering ``specialty`` when given.
+    """
+    city = (request.GET.get('city') or '').strip()
+    bed_type = request.GET.get('bed_type') or 'ICU'
+    if not city:
+        return _error('city is required')
+    if bed_type not in {choice[0] for choice in HospitalBed.BED_TYPE_CHOICES}:
+        return _error('Unknown bed_type')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', RECOMMENDATION_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        return _error('limit must be an integer')
+
+    shortlist = placement.recommend(city, bed_type, request.GET.get('specialty'), limit)
+    return _json_response({
+        'city': city,
+        'bed_type': bed_type,
+        'results': [
+            {
+                'hospital_id': candidate.hospital_id,
+                'name': candidate.name,
+                'address': candidate.address,
+                'emergency_contact': candidate.emergency_contact,
+                'available_beds': candidate.available_beds,
+                'total_beds': candidate.total_beds,
+                'rating': candidate.rating,
+                'support_24_7': candidate.support_24_7,
+                'specialty_match': matched,
+                'score': round(candidate.score + (settings.PLACEMENT_WEIGHTS['specialty'] if matched else 0), 4),
+            }
+            for candidate, matched in shortlist
+        ],
+    })
@@ -0,0 +1,236 @@
+"""
+Async versions of the public search pages, routed instead of the ones in
+``core.views`` when ``CURA_ASYNC_VIEWS=1`` (see
+``settings.ASYNC_SEARCH_VIEWS``). They are opt-in, also under
+``cura/asgi.py``, until they beat the sync views in
+``manage.py bench_search_views``.
+
+Each view returns the same page as its sync twin, behind the same rate
+limit, ``Vary`` and conditional GET handling. Where a page needs
+several queries (hospitals and their beds, suppliers and their stock) they
+are started together: ``_fetch`` evaluates a queryset on a thread of its own,
+with its own connection, instead of the one thread the async ORM gives a
+request, so the queries overlap rather than queue. Related rows are attached
+as if by ``prefetch_related``, so the templates are unchanged.
+
+Templates still render in a worker thread, because the context processors
+read the database.
+"""
+import asyncio
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import F
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.views.decorators.vary import vary_on_headers
+
+from . import doctor_ranking
+from .caching import DOCTORS, HOSPITALS, MEDICINES, OXYGEN, aviewer_bucket, conditional_on, fragment_context
+from .forms import CartAddItemForm
+from .models import (
+    Hospital,
+    HospitalBed,
+    Language,
+    Medicine,
+    MedicineProduct,
+    OxygenCylinderStock,
+    OxygenSupplier,
+    Specialty,
+)
+from .ratelimit import rate_limit
+
+
+def _evaluate(build):
+    try:
+        return list(build())
+    finally:
+        # This thread is not a request thread, so nothing else would close
+        # the connection it opened.
+        close_old_connections()
+
+
+async def _fetch(queryset):
+    return await _fetch_built(queryset.all)
+
+
+async def _fetch_built(build):
+    # For querysets that read the database while being built, too.
+    return await sync_to_async(_evaluate, thread_sensitive=False)(build)
+
+
+def _attach(instances, name, related, key):
+    """
+    Store ``related`` rows as the prefetched ``name`` of each instance.
+    """
+    grouped = defaultdict(list)
+    for row in related:
+        grouped[getattr(row, key)].append(row)
+    for instance in instances:
+        queryset = getattr(instance, name).all()
+        queryset._result_cache = grouped.get(instance.pk, [])
+        queryset._prefetch_done = True
+        instance.__dict__.setdefault('_prefetched_objects_cache', {})[name] = queryset
+
+
+async def _render(request, template, context):
+    return await sync_to_async(render)(request, template, context)
+
+
+def _viewer_resolved(view):
+    # Must run before @conditional_on, whose ETag depends on the viewer.
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        await aviewer_bucket(request)
+        return await view(request, *args, **kwargs)
+    return wrapped
+
+
+@rate_limit('search')
+@vary_on_headers('X-Requested-With')
+@_viewer_resolved
+@conditional_on(lambda request: [HOSPITALS])
+async def hospital_list(request):
+    city = request.GET.get('city')
+    bed_type = request.GET.get('bed_type')
+    min_rating = request.GET.get('min_rating')
+    specialty = request.GET.get('specialty')
+
+    hospitals = Hospital.objects.all()
+
+    if city:
+        hospitals = hospitals.filter(city__icontains=city)
+    if min_rating:
+        hospitals = hospitals.filter(rating__gte=min_rating)
+    if specialty:
+        hospitals = hospitals.filter(specialty_links__specialty__key=Specialty.key_for(specialty))
+    if bed_type:
+        hospitals = hospitals.filter(beds__bed_type=bed_type).distinct()
+
+    hospitals, beds, offered, specialties = await asyncio.gather(
+        _fetch(hospitals),
+        _fetch(HospitalBed.objects.filter(hospital__in=hospitals.values('pk'))),
+        _fetch(
+            Specialty.objects.filter(hospitals__in=hospitals.values('pk'))
+            .annotate(offered_by=F('hospitals'))
+        ),
+        _fetch(Specialty.objects.order_by('name')),
+    )
+    _attach(hospitals, 'beds', beds, 'hospital_id')
+    _attach(hospitals, 'specialties', offered, 'offered_by')
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        data = []
+        for hospital in hospitals:
+            data.append({
+                'id': hospital.id,
+                'name': hospital.name,
+                'city': hospital.city,
+                'rating': float(hospital.rating),
+                'specialties': [s.name for s in hospital.specialties.all()],
+                'beds': [
+                    {'bed_type': b.bed_type, 'total_beds': b.total_beds, 'available_beds': b.available_beds}
+                    for b in hospital.beds.all()
+                ],
+            })
+        return JsonResponse({'hospitals': data})
+    return await _render(request, 'core/hospitals/hospital_list.html', {
+        'hospitals': hospitals,
+        'specialties': specialties,
+        'selected_city': city or '',
+        'selected_bed_type': bed_type or '',
+        'selected_min_rating': min_rating or '',
+        'selected_specialty': specialty or '',
+    })
+
+
+@rate_limit('search')
+@_viewer_resolved
+@conditional_on(lambda request: [DOCTORS])
+async def doctor_search(request):
+    speciality = request.GET.get('speciality')
+    city = request.GET.get('city')
+    languages = sorted({language for language in request.GET.getlist('language') if language.strip()})
+    sort = doctor_ranking.sort_key(request.GET.get('sort'))
+    after = request.GET.get('after')
+
+    context = fragment_context(
+        request, 'doctor_search', [DOCTORS], speciality or '', city or '', ','.join(languages), sort, after or '',
+    )
+    language_options = _fetch(Language.objects.order_by('name'))
+    doctors, next_cursor = [], None
+    # The cached fragment needs no rows at all.
+    if context['fragment_cached']:
+        language_options = await language_options
+    else:
+        rows, language_options = await asyncio.gather(
+            _fetch_built(lambda: doctor_ranking.search(
+                speciality, city, sort, after, languages=languages,
+            ).select_related('hospital')),
+            language_options,
+        )
+        doctors, next_cursor = doctor_ranking.page(rows, sort)
+        _attach(doctors, 'languages', await _fetch(
+            Language.objects.filter(doctor_links__doctor__in=[doctor.pk for doctor in doctors])
+            .annotate(spoken_by=F('doctor_links__doctor'))
+        ), 'spoken_by')
+    context.update({
+        'doctors': doctors,
+        'next_cursor': next_cursor,
+        'sorts': doctor_ranking.SORTS,
+        'selected_sort': sort,
+        'language_options': language_options,
+        'selected_languages': languages,
+        'selected_speciality': speciality or '',
+        'selected_city': city or '',
+    })
+    return await _render(request, 'core/doctors/doctor_search.html', context)
+
+
+@rate_limit('search')
+@_viewer_resolved
+@conditional_on(lambda request: [OXYGEN])
+async def oxygen_list(request):
+    city = request.GET.get('city')
+    suppliers = OxygenSupplier.objects.all().select_related('user')
+    if city:
+        suppliers = suppliers.filter(city__icontains=city)
+    context = fragment_context(request, 'oxygen_list', [OXYGEN], city or '')
+    if context['fragment_cached']:
+        suppliers = []
+    else:
+        suppliers, stocks = await asyncio.gather(
+            _fetch(suppliers),
+            _fetch(OxygenCylinderStock.objects.filter(supplier__in=suppliers.values('pk'))),
+        )
+        _attach(suppliers, 'stocks', stocks, 'supplier_id')
+    context.update({
+        'suppliers': suppliers,
+        'selected_city': city or '',
+    })
+    return await _render(request, 'core/oxygen/oxygen_list.html', context)
+
+
+@rate_limit('search')
+@_viewer_resolved
+@conditional_on(lambda request: [MEDICINES])
+async def medicine_search(request):
+    name = request.GET.get('name')
+    city = request.GET.get('city')
+    medicines = Medicine.objects.select_related('pharmacy', 'product').all()
+
+    if name:
+        # Match against the catalog, then fetch listings for the hits only.
+        products = MedicineProduct.objects.filter(name__icontains=name).values('pk')
+        medicines = medicines.filter(product__in=products)
+    if city:
+        medicines = medicines.filter(pharmacy__city__icontains=city)
+
+    return await _render(request, 'core/medicines/medicine_search.html', {
+        'medicines': await _fetch(medicines),
+        'selected_name': name or '',
+        'selected_city': city or '',
+        'cart_add_form': CartAddItemForm(),
+    })
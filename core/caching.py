@@ -0,0 +1,184 @@
+"""
+Versioned caching and change markers for the public resource pages.
+
+Cached fragments and ETags are keyed on one or more *scopes* such as
+``hospital:12`` or ``doctors``. Each scope has a version in the shared cache
+which the model signals in ``core.signals`` bump on save/delete, so any change
+to the underlying rows moves the key and the old fragment is never read again.
+
+Versions are nanosecond timestamps of the last bump. Conditional GETs are
+answered from ETags only: ``Last-Modified`` has one-second granularity, so a
+change within the same second as the response would be missed.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from .models import UserProfile
+
+HOSPITALS = 'hospitals'
+DOCTORS = 'doctors'
+OXYGEN = 'oxygen'
+MEDICINES = 'medicines'
+
+
+def hospital_scope(hospital_id):
+    return f'hospital:{hospital_id}'
+
+
+def user_scope(user_id):
+    # Per-user state rendered in the page chrome (e.g. the cart badge).
+    return f'user:{user_id}'
+
+
+def _version_key(scope):
+    return f'cura:scope-version:{scope}'
+
+
+def _fresh_version():
+    # Seed from the clock rather than 1 so a version evicted from the cache can
+    # never be recreated with a value that old fragments were stored under.
+    return time.time_ns()
+
+
+def scope_versions(*scopes):
+    """
+    Return the current version of each scope, initialising missing ones.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            cache.add(key, _fresh_version(), timeout=None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def bump_scopes(*scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    now = _fresh_version()
+    cache.set_many(
+        {key: max(now, found.get(key, 0) + 1) for key in keys},
+        timeout=None,
+    )
+
+
+def _request_versions(request, scopes):
+    # Conditional GET handling and fragment caching both need the versions;
+    # remember them on the request so each scope is read once.
+    memo = request.__dict__.setdefault('_cura_scope_versions', {})
+    missing = [scope for scope in scopes if scope not in memo]
+    if missing:
+        memo.update(zip(missing, scope_versions(*missing)))
+    return [memo[scope] for scope in scopes]
+
+
+def viewer_bucket(request):
+    """
+    Coarse description of who is looking at the page.
+
+    The cached templates only branch on authentication and role, so this is
+    all a fragment needs to vary on besides the data versions.
+    """
+    if '_cura_viewer' in request.__dict__:
+        return request._cura_viewer
+    if not request.user.is_authenticated:
+        return 'anonymous'
+    try:
+        return request.user.userprofile.role
+    except UserProfile.DoesNotExist:
+        return 'authenticated'
+
+
+async def aviewer_bucket(request):
+    """
+    ``viewer_bucket`` for async views.
+
+    Resolves the user without blocking the event loop and remembers the
+    bucket on the request, so the sync helpers (ETags, fragment keys) called
+    afterwards do not query the database from async code.
+    """
+    if '_cura_viewer' not in request.__dict__:
+        request.user = user = await request.auser()
+        if not user.is_authenticated:
+            bucket = 'anonymous'
+        else:
+            role = await UserProfile.objects.filter(user=user).values_list('role', flat=True).afirst()
+            bucket = role or 'authenticated'
+        request._cura_viewer = bucket
+    return request._cura_viewer
+
+
+def fragment_context(request, fragment_name, scopes, *vary_on):
+    """
+    Build the template context used by ``{% cache %}`` blocks.
+
+    Returns a dict with ``fragment_timeout`` and ``fragment_vary``, plus the
+    cached ``fragment`` itself on a hit, with a ``fragment_cached`` flag so
+    views can skip their eager queries. Templates output ``fragment`` when it
+    is set rather than leave it to ``{% cache %}``, whose own lookup could
+    miss if the entry expired or was culled since, and would then render
+    and cache a page without the rows.
+    """
+    parts = [str(v) for v in _request_versions(request, scopes)]
+    parts.extend(str(v) for v in vary_on)
+    parts.append(viewer_bucket(request))
+    vary = ':'.join(parts)
+    key = make_template_fragment_key(fragment_name, [vary])
+    fragment = cache.get(key)
+    return {
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'fragment_vary': vary,
+        'fragment': None if fragment is None else mark_safe(fragment),
+        'fragment_cached': fragment is not None,
+    }
+
+
+def _page_scopes(request, scopes):
+    scopes = list(scopes)
+    if request.user.is_authenticated:
+        scopes.append(user_scope(request.user.pk))
+    return scopes
+
+
+def _has_pending_messages(request):
+    # len() loads the stored messages without marking them as displayed.
+    return len(messages.get_messages(request)) > 0
+
+
+def conditional_on(get_scopes):
+    """
+    Answer ``If-None-Match`` from scope versions.
+
+    ``get_scopes(request, *args, **kwargs)`` returns the scopes the page is
+    built from. The ETag also covers the URL, the ``X-Requested-With`` header,
+    the viewer and the CSRF secret, so a 304 is only sent when the page would
+    be unchanged, down to the CSRF token in its forms, which changes on login
+    and logout. The check runs before the view, so a matching request skips
+    every query and render.
+    """
+    def etag(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        scopes = _page_scopes(request, get_scopes(request, *args, **kwargs))
+        parts = [str(v) for v in _request_versions(request, scopes)]
+        parts.extend([
+            request.get_full_path(),
+            request.headers.get('x-requested-with', ''),
+            viewer_bucket(request),
+            # Set by CsrfViewMiddleware from the cookie (or session).
+            request.META.get('CSRF_COOKIE', ''),
+        ])
+        return hashlib.md5(':'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+    return condition(etag_func=etag)
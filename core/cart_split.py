@@ -0,0 +1,306 @@
+"""
+Choose which pharmacy supplies each line of a cart.
+
+Listings of the same catalog product with the same pack size are
+interchangeable, so every cart line can be bought from any pharmacy in the
+patient's city that has the packs in stock. The plan minimises
+
+    sum(price x packs) + CART_ORDER_PENALTY x (number of pharmacy orders)
+
+Choosing the pharmacies is a facility-location problem, so this is a local
+search over the set of pharmacies used (drop one, swap one, add one),
+started from the cheapest-per-line assignment, the best single pharmacy and
+the cart as it is; each line is then bought from the cheapest pharmacy in
+the set. With a per-pharmacy cost column for every line, trying a move is
+one ``sum(map(min, ...))`` over the lines. The search stops at a local
+optimum or when the time budget runs out. Since the cart as it is is one of
+the starting points, the plan never costs more than the cart.
+
+Because the search is time-bounded its result can vary between runs, so the
+cart page and the POST accepting its suggestion both go through
+``cart_plan``, which caches the plan per cart and listing version: the cart
+page only searches again after something changed, and the form carries the
+``signature`` of the plan it showed, which the POST applies only if the
+cached plan still matches.
+"""
+import hashlib
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+from .caching import MEDICINES, scope_versions, user_scope
+from .models import CartItem, Medicine, Pharmacy, UserProfile
+
+# Seconds of search, leaving room for the query within a 50 ms request budget.
+SEARCH_BUDGET = 0.025
+
+# Cost of a line at a pharmacy that does not stock it; ints keep min() fast.
+INF = 10 ** 15
+
+Offer = namedtuple('Offer', 'cost pharmacy_id listing_id')
+Plan = namedtuple('Plan', 'lines total orders current_total current_orders improves')
+PlanLine = namedtuple('PlanLine', 'items listing_id pharmacy packs cost')
+
+
+def _paise(amount):
+    return int(Decimal(amount) * 100)
+
+
+def _cart_lines(items):
+    """
+    Group cart items by (product, pack size); each group is one line.
+    """
+    lines = {}
+    for item in items:
+        key = (item.medicine.product_id, item.medicine.pack_size)
+        lines.setdefault(key, []).append(item)
+    return lines
+
+
+def _cart_cities(user, items):
+    # The patient's city, or else wherever the cart's pharmacies are.
+    profile = UserProfile.objects.filter(user=user).values_list('city', flat=True).first()
+    if profile:
+        return [profile]
+    return sorted({item.medicine.pharmacy.city for item in items})
+
+
+def load_offers(user, items):
+    """
+    Return ``(lines, offers)``: the grouped cart lines and, per line, a dict
+    of the cheapest feasible ``Offer`` from each pharmacy.
+    """
+    lines = _cart_lines(items)
+    cities = _cart_cities(user, items)
+    rows = Medicine.objects.filter(
+        product_id__in={product_id for product_id, _ in lines},
+        stock__gt=0,
+    ).annotate(
+        # Integer paise from the database keeps Decimal out of the hot loop.
+        paise=Cast(Round(F('price') * 100), IntegerField()),
+    )
+    if len(cities) == 1:
+        rows = rows.filter(pharmacy__city__iexact=cities[0])
+    else:
+        rows = rows.filter(pharmacy__city__in=cities)
+    by_key = {}
+    for listing_id, pharmacy_id, product_id, pack_size, price, stock in rows.values_list(
+        'pk', 'pharmacy_id', 'product_id', 'pack_size', 'paise', 'stock',
+    ):
+        by_key.setdefault((product_id, pack_size), []).append((listing_id, pharmacy_id, price, stock))
+
+    offers = []
+    for key, line_items in lines.items():
+        packs = sum(item.quantity for item in line_items)
+        # Whatever is in the cart stays an option, even if it is out of town.
+        candidates = by_key.get(key, []) + [
+            (item.medicine.pk, item.medicine.pharmacy_id, _paise(item.medicine.price), item.medicine.stock)
+            for item in line_items
+        ]
+        line_offers = {}
+        for listing_id, pharmacy_id, price, stock in candidates:
+            if stock < packs:
+                continue
+            offer = Offer(price * packs, pharmacy_id, listing_id)
+            if pharmacy_id not in line_offers or offer < line_offers[pharmacy_id]:
+                line_offers[pharmacy_id] = offer
+        offers.append(line_offers)
+    return list(lines.values()), offers
+
+
+def _columns(offers):
+    """
+    Per pharmacy, the cost of each line there (``INF`` where not stocked).
+    """
+    columns = {}
+    for index, line_offers in enumerate(offers):
+        for pharmacy_id, offer in line_offers.items():
+            columns.setdefault(pharmacy_id, [INF] * len(offers))[index] = offer.cost
+    return columns
+
+
+def _drop_bases(columns, chosen, size):
+    """
+    For each pharmacy in ``chosen``, the per-line minimum over the others,
+    from one pass that keeps the best and second-best cost of every line.
+    """
+    best, second, owner = [INF] * size, [INF] * size, [None] * size
+    for pharmacy_id in chosen:
+        for index, cost in enumerate(columns[pharmacy_id]):
+            if cost < best[index]:
+                best[index], second[index], owner[index] = cost, best[index], pharmacy_id
+            elif cost < second[index]:
+                second[index] = cost
+    return best, {
+        q: [s if o == q else b for b, s, o in zip(best, second, owner)]
+        for q in chosen
+    }
+
+
+def _settle(columns, chosen, penalty, size):
+    """
+    Exact objective of buying each line at the cheapest of ``chosen``, and
+    the pharmacies that actually receive an order.
+    """
+    used = set()
+    total = 0
+    for index in range(size):
+        cost, pharmacy_id = min((columns[p][index], p) for p in chosen)
+        if cost >= INF:
+            return INF, frozenset(chosen)
+        total += cost
+        used.add(pharmacy_id)
+    return total + penalty * len(used), frozenset(used)
+
+
+def _best_move(columns, current, penalty, size, deadline):
+    """
+    An improving move from ``current``: the best of the cheap drop and add
+    moves, or else the first improving swap. Returns ``(value, chosen)`` or
+    None; values assume every chosen pharmacy gets an order, an upper bound
+    on the real objective, so a move that looks better is better.
+    """
+    best, move = _settle(columns, current, penalty, size)[0], None
+    full, bases = _drop_bases(columns, current, size)
+    outside = [p for p in columns if p not in current]
+    for q, base in bases.items():
+        value = sum(base) + penalty * (len(current) - 1)
+        if value < best:
+            best, move = value, current - {q}
+    for p in outside:
+        value = sum(map(min, full, columns[p])) + penalty * (len(current) + 1)
+        if value < best:
+            best, move = value, current | {p}
+    if move is not None:
+        return best, move
+
+    # Swaps are the bulk of the work, so take the first that improves.
+    orders = penalty * len(current)
+    for q, base in bases.items():
+        if time.perf_counter() > deadline:
+            break
+        for p in outside:
+            value = sum(map(min, base, columns[p])) + orders
+            if value < best:
+                return value, (current - {q}) | {p}
+    return None
+
+
+def _local_search(columns, penalty, start, deadline, size):
+    best, current = _settle(columns, start, penalty, size)
+    if best >= INF:
+        return INF, current
+    while time.perf_counter() < deadline:
+        move = _best_move(columns, current, penalty, size, deadline)
+        if move is None:
+            break
+        best, current = _settle(columns, move[1], penalty, size)
+    return best, current
+
+
+def optimise(offers, penalty, current, budget=SEARCH_BUDGET):
+    """
+    Best ``(objective, pharmacies)`` found for ``offers``.
+    """
+    started = time.perf_counter()
+    size = len(offers)
+    columns = _columns(offers)
+    starts = [
+        frozenset(min(line_offers.values()).pharmacy_id for line_offers in offers),
+        frozenset(current),
+    ]
+    covering = [p for p, column in columns.items() if INF not in column]
+    if covering:
+        starts.insert(0, frozenset([min(covering, key=lambda p: sum(columns[p]))]))
+
+    best, best_set = INF, None
+    for i, start in enumerate(starts, 1):
+        # Share the budget so every start gets a turn.
+        deadline = started + budget * i / len(starts)
+        value, chosen = _local_search(columns, penalty, start, deadline, size)
+        if value < best:
+            best, best_set = value, chosen
+    return best, best_set
+
+
+def plan_cart(user, items, penalty=None, budget=SEARCH_BUDGET):
+    """
+    Build the cheapest plan found for ``items``. Returns a ``Plan``, or None
+    if the cart is empty or a line cannot be supplied at all.
+    """
+    items = list(items)
+    if not items:
+        return None
+    penalty = _paise(settings.CART_ORDER_PENALTY if penalty is None else penalty)
+    lines, offers = load_offers(user, items)
+    if any(not line_offers for line_offers in offers):
+        return None
+
+    current = frozenset(item.medicine.pharmacy_id for item in items)
+    current_total = sum(_paise(item.medicine.price) * item.quantity for item in items)
+    objective, chosen = optimise(offers, penalty, current, budget)
+    if chosen is None:
+        return None
+
+    pharmacies = Pharmacy.objects.in_bulk(chosen)
+    plan_lines = []
+    for line_items, line_offers in zip(lines, offers):
+        offer = min(line_offers[p] for p in chosen if p in line_offers)
+        packs = sum(item.quantity for item in line_items)
+        plan_lines.append(PlanLine(
+            line_items, offer.listing_id, pharmacies[offer.pharmacy_id], packs, Decimal(offer.cost) / 100,
+        ))
+    return Plan(
+        lines=plan_lines,
+        total=sum(line.cost for line in plan_lines),
+        orders=len({line.pharmacy.pk for line in plan_lines}),
+        current_total=Decimal(current_total) / 100,
+        current_orders=len(current),
+        improves=objective < current_total + penalty * len(current),
+    )
+
+
+def cart_plan(user, cart):
+    """
+    ``plan_cart`` for ``user``'s ``cart``, cached until the cart or any
+    listing changes.
+    """
+    versions = scope_versions(user_scope(user.pk), MEDICINES)
+    key = f'cura:cart-plan:{cart.pk}:' + ':'.join(map(str, versions))
+    plan = cache.get(key)
+    if plan is None:
+        # False stands for "no plan", which the cache cannot tell from a miss.
+        plan = plan_cart(user, cart.items.all()) or False
+        cache.set(key, plan, settings.FRAGMENT_CACHE_TIMEOUT)
+    return plan or None
+
+
+def signature(plan):
+    """
+    Digest of which listing and how many packs ``plan`` gives each cart item.
+    """
+    digest = hashlib.sha256()
+    for line in plan.lines:
+        items = ','.join(str(item.pk) for item in line.items)
+        digest.update(f'{items}>{line.listing_id}x{line.packs};'.encode())
+    return digest.hexdigest()
+
+
+@transaction.atomic
+def apply_plan(cart, plan):
+    """
+    Point the cart's items at the planned listings, merging lines that now
+    share a listing.
+    """
+    for line in plan.lines:
+        keep, *rest = line.items
+        CartItem.objects.filter(pk__in=[item.pk for item in rest]).delete()
+        keep.medicine_id = line.listing_id
+        keep.quantity = line.packs
+        keep.save(update_fields=['medicine', 'quantity'])
@@ -0,0 +1,197 @@
+"""
+Delivery batching and route planning for oxygen bookings.
+
+A supplier's confirmed bookings for a day are grouped into batches by time
+slot, ``settings.DELIVERY_SLOT_MINUTES`` wide (bookings without a slot form
+a batch of their own). Each batch is cut into vehicle loads with the sweep
+heuristic: stops sorted by bearing from the depot, starting after the widest
+gap, with a new load whenever the next stop would overfill the vehicle.
+Each load is routed nearest-neighbour from the depot and then improved with
+2-opt. Loads are handed to the vehicle with the least driving so far, which
+gives every vehicle a manifest of trips in slot order.
+
+Coordinates come from the local ``GeocodedAddress`` table. Bookings whose
+address is not in it are returned as unrouted rather than dropped.
+"""
+import hashlib
+import math
+import re
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import GeocodedAddress, OxygenBooking
+
+EARTH_RADIUS_KM = 6371.0
+
+# 2-opt passes per trip; each pass is O(stops^2) and trips are short.
+MAX_TWO_OPT_PASSES = 20
+
+Stop = namedtuple('Stop', 'booking latitude longitude quantity')
+Trip = namedtuple('Trip', 'batch stops cylinders distance_km')
+Manifest = namedtuple('Manifest', 'vehicle trips cylinders distance_km')
+DeliveryPlan = namedtuple('DeliveryPlan', 'date depot manifests unrouted')
+
+
+def address_key(address):
+    """
+    Lookup key for an address: case, punctuation and spacing are ignored.
+    """
+    normalised = ' '.join(re.sub(r'[^\w\s]', ' ', address.casefold()).split())
+    return hashlib.sha256(normalised.encode()).hexdigest()
+
+
+def distance_km(a, b):
+    """
+    Great-circle distance between two ``(latitude, longitude)`` points.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def batch_label(time_slot, slot_minutes):
+    if time_slot is None:
+        return None
+    start = (time_slot.hour * 60 + time_slot.minute) // slot_minutes * slot_minutes
+    end = min(start + slot_minutes, 24 * 60)
+    return f'{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}'
+
+
+def _sweep(stops, depot, capacity):
+    """
+    Cut ``stops`` into loads of at most ``capacity`` cylinders by bearing.
+    """
+    loads = []
+    pending = []
+    for stop in stops:
+        # A stop bigger than a vehicle gets whole trips of its own first.
+        while stop.quantity > capacity:
+            loads.append([stop._replace(quantity=capacity)])
+            stop = stop._replace(quantity=stop.quantity - capacity)
+        pending.append(stop)
+    if not pending:
+        return loads
+
+    def bearing(stop):
+        return math.atan2(stop.latitude - depot[0], stop.longitude - depot[1])
+
+    pending.sort(key=bearing)
+    angles = [bearing(stop) for stop in pending]
+    gaps = [(angles[i] - angles[i - 1]) % (2 * math.pi) for i in range(len(angles))]
+    first = max(range(len(gaps)), key=gaps.__getitem__)
+    pending = pending[first:] + pending[:first]
+
+    load, carried = [], 0
+    for stop in pending:
+        if carried + stop.quantity > capacity:
+            loads.append(load)
+            load, carried = [], 0
+        load.append(stop)
+        carried += stop.quantity
+    loads.append(load)
+    return loads
+
+
+def _route(load, depot):
+    """
+    Order a load's stops: nearest neighbour from the depot, then 2-opt.
+    Returns ``(stops, distance_km)`` for the round trip.
+    """
+    points = [depot] + [(stop.latitude, stop.longitude) for stop in load]
+    n = len(points)
+    dist = [[distance_km(points[i], points[j]) for j in range(n)] for i in range(n)]
+
+    path, left = [0], set(range(1, n))
+    while left:
+        here = path[-1]
+        nearest = min(left, key=lambda j: dist[here][j])
+        path.append(nearest)
+        left.remove(nearest)
+    path.append(0)
+
+    for _ in range(MAX_TWO_OPT_PASSES):
+        improved = False
+        for i in range(1, len(path) - 2):
+            for j in range(i + 1, len(path) - 1):
+                a, b, c, d = path[i - 1], path[i], path[j], path[j + 1]
+                if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d] - 1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+        if not improved:
+            break
+
+    total = sum(dist[path[k]][path[k + 1]] for k in range(len(path) - 1))
+    return [load[k - 1] for k in path[1:-1]], total
+
+
+def plan_routes(batches, depot, vehicles, capacity):
+    """
+    Build one ``Manifest`` per vehicle from ``batches``, a list of
+    ``(label, stops)`` in delivery order.
+    """
+    vehicles = max(vehicles, 1)
+    capacity = max(capacity, 1)
+    trips = [[] for _ in range(vehicles)]
+    driven = [0.0] * vehicles
+    for label, stops in batches:
+        routed = [_route(load, depot) for load in _sweep(stops, depot, capacity)]
+        # Longest trips first, each to the vehicle that has driven least.
+        for ordered, km in sorted(routed, key=lambda trip: -trip[1]):
+            vehicle = min(range(vehicles), key=driven.__getitem__)
+            trips[vehicle].append(Trip(label, ordered, sum(stop.quantity for stop in ordered), km))
+            driven[vehicle] += km
+    return [
+        Manifest(
+            vehicle=number,
+            trips=vehicle_trips,
+            cylinders=sum(trip.cylinders for trip in vehicle_trips),
+            distance_km=driven[number - 1],
+        )
+        for number, vehicle_trips in enumerate(trips, 1)
+    ]
+
+
+def plan_deliveries(supplier, date):
+    """
+    Plan ``supplier``'s confirmed deliveries for ``date``.
+    """
+    bookings = list(
+        OxygenBooking.objects.filter(stock__supplier=supplier, scheduled_date=date, status='CONFIRMED')
+        .select_related('patient', 'stock')
+        .order_by('time_slot', 'pk')
+    )
+    keys = {booking.pk: address_key(booking.delivery_address) for booking in bookings}
+    located = {
+        key: (latitude, longitude)
+        for key, latitude, longitude in GeocodedAddress.objects.filter(key__in=set(keys.values()))
+        .values_list('key', 'latitude', 'longitude')
+    }
+
+    slot_minutes = settings.DELIVERY_SLOT_MINUTES
+    batches, unrouted = {}, []
+    for booking in bookings:
+        point = located.get(keys[booking.pk])
+        if point is None:
+            unrouted.append(booking)
+            continue
+        label = batch_label(booking.time_slot, slot_minutes)
+        batches.setdefault(label, []).append(Stop(booking, point[0], point[1], booking.quantity))
+
+    points = [(stop.latitude, stop.longitude) for stops in batches.values() for stop in stops]
+    if supplier.latitude is not None and supplier.longitude is not None:
+        depot = (supplier.latitude, supplier.longitude)
+    elif points:
+        # No depot on file: start from the middle of the day's stops.
+        depot = (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+    else:
+        depot = None
+
+    ordered = sorted(batches.items(), key=lambda item: (item[0] is None, item[0] or ''))
+    manifests = plan_routes(
+        [(label or 'Any time', stops) for label, stops in ordered],
+        depot,
+        supplier.delivery_vehicles,
+        supplier.vehicle_capacity,
+    ) if ordered else []
+    return DeliveryPlan(date, depot, manifests, unrouted)
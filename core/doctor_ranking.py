@@ -0,0 +1,221 @@
+"""
+Precomputed ranking for the doctor search.
+
+Every doctor stores ``rank_score``, a weighted sum (``DOCTOR_RANK_WEIGHTS``)
+of terms scaled to 0..1:
+
+* ``rating`` out of 5;
+* ``experience``: years, capped at ``DOCTOR_RANK_EXPERIENCE_CAP``;
+* ``fee``: how far the consultation fee is below ``DOCTOR_RANK_FEE_CAP``;
+* ``availability``: the share of the doctor's appointment slots
+  (``DOCTOR_SLOT_MINUTES`` long, within their daily hours) still free over
+  the next ``DOCTOR_RANK_HORIZON_DAYS`` days, kept in ``open_slots``.
+
+The score is refreshed when a doctor is saved and when one of their
+appointments changes (see ``core.signals``), and for everyone by
+``manage.py rank_doctors`` as the horizon moves on.
+
+``search`` reads a page of doctors for an exact speciality and city (case
+insensitive), optionally speaking any of some languages, in one of
+``SORTS``. Each sort has a partial index over
+``(speciality, lower(city), key, id)`` on active doctors, and pages are
+keyset cursors over ``(key, id)``, so every page, however deep, is a bounded
+index scan. Sorting by rank without both filters uses the
+``(rank_score, id)`` index instead. A language filter probes each candidate's
+``(doctor, language)`` links by index as the scan goes, or for rarely spoken
+languages checks candidates against the short list of speakers.
+"""
+import datetime
+import math
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .caching import DOCTORS, bump_scopes
+from .models import Appointment, Doctor, DoctorLanguage, Language
+
+BATCH_SIZE = 2000
+
+ACTIVE_APPOINTMENTS = ('PENDING', 'CONFIRMED')
+
+# Below this many doctor-language links, a language filter lists the
+# speakers up front instead of checking each candidate.
+RARE_LANGUAGE_LINKS = 2000
+
+Sort = namedtuple('Sort', 'label field descending parse')
+
+SORTS = {
+    'rank': Sort('Best match', 'rank_score', True, float),
+    'rating': Sort('Highest rated', 'rating', True, Decimal),
+    'experience': Sort('Most experienced', 'experience_years', True, int),
+    'fee': Sort('Lowest fee', 'consultation_fee', False, Decimal),
+}
+DEFAULT_SORT = 'rank'
+
+Page = namedtuple('Page', 'doctors next_cursor')
+
+
+def daily_slots(doctor):
+    """
+    Appointment slots in one day of the doctor's hours (which may run past
+    midnight).
+    """
+    start = doctor.available_from.hour * 60 + doctor.available_from.minute
+    end = doctor.available_to.hour * 60 + doctor.available_to.minute
+    if end <= start:
+        end += 24 * 60
+    return (end - start) // settings.DOCTOR_SLOT_MINUTES
+
+
+def score(doctor, open_slots):
+    weights = settings.DOCTOR_RANK_WEIGHTS
+    experience_cap = settings.DOCTOR_RANK_EXPERIENCE_CAP
+    fee_cap = settings.DOCTOR_RANK_FEE_CAP
+    capacity = daily_slots(doctor) * settings.DOCTOR_RANK_HORIZON_DAYS
+    return round(
+        weights['rating'] * float(doctor.rating) / 5
+        + weights['experience'] * min(doctor.experience_years, experience_cap) / experience_cap
+        + weights['fee'] * (1 - min(float(doctor.consultation_fee), fee_cap) / fee_cap)
+        + weights['availability'] * (open_slots / capacity if capacity else 0),
+        6,
+    )
+
+
+def _booked(doctor_ids, today):
+    horizon = today + datetime.timedelta(days=settings.DOCTOR_RANK_HORIZON_DAYS)
+    return dict(
+        Appointment.objects.filter(
+            doctor_id__in=doctor_ids, date__gte=today, date__lt=horizon, status__in=ACTIVE_APPOINTMENTS,
+        )
+        .values('doctor_id')
+        .annotate(n=Count('pk'))
+        .values_list('doctor_id', 'n')
+    )
+
+
+def _open_slots(doctor, booked):
+    return max(0, daily_slots(doctor) * settings.DOCTOR_RANK_HORIZON_DAYS - booked)
+
+
+def refresh(doctor, today=None):
+    """
+    Set ``open_slots`` and ``rank_score`` on an unsaved ``doctor``.
+    """
+    booked = _booked([doctor.pk], today or timezone.localdate()).get(doctor.pk, 0) if doctor.pk else 0
+    doctor.open_slots = _open_slots(doctor, booked)
+    doctor.rank_score = score(doctor, doctor.open_slots)
+
+
+def rescore(doctor_ids=None, today=None, batch_size=BATCH_SIZE):
+    """
+    Recompute the stored scores of ``doctor_ids`` (default: everyone) and
+    return how many changed.
+    """
+    today = today or timezone.localdate()
+    doctors = Doctor.objects.only(
+        'rating', 'experience_years', 'consultation_fee', 'available_from', 'available_to',
+        'open_slots', 'rank_score',
+    ).order_by('pk')
+    if doctor_ids is not None:
+        doctors = doctors.filter(pk__in=doctor_ids)
+
+    changed = 0
+    after = 0
+    while True:
+        batch = list(doctors.filter(pk__gt=after)[:batch_size])
+        if not batch:
+            break
+        booked = _booked([doctor.pk for doctor in batch], today)
+        updated = []
+        for doctor in batch:
+            open_slots = _open_slots(doctor, booked.get(doctor.pk, 0))
+            rank_score = score(doctor, open_slots)
+            if (open_slots, rank_score) != (doctor.open_slots, doctor.rank_score):
+                doctor.open_slots, doctor.rank_score = open_slots, rank_score
+                updated.append(doctor)
+        Doctor.objects.bulk_update(updated, ['open_slots', 'rank_score'], batch_size=1000)
+        changed += len(updated)
+        after = batch[-1].pk
+    if changed:
+        bump_scopes(DOCTORS)
+    return changed
+
+
+def sort_key(sort):
+    return sort if sort in SORTS else DEFAULT_SORT
+
+
+def _parse_cursor(spec, cursor):
+    try:
+        value, pk = cursor.rsplit('_', 1)
+        value, pk = spec.parse(value), int(pk)
+        # inf and nan parse, but no column holds them and they break the
+        # filter (a signalling nan raises here).
+        if not math.isfinite(value):
+            return None
+    except (ArithmeticError, ValueError):
+        return None
+    return value, pk
+
+
+def speaking(languages):
+    """
+    Filter for doctors speaking any of ``languages`` (names, any case).
+
+    Reads how many doctors speak them, at most ``RARE_LANGUAGE_LINKS`` index
+    entries, to pick the cheaper plan.
+    """
+    keys = {Language.key_for(language) for language in languages}
+    links = DoctorLanguage.objects.filter(language__in=Language.objects.filter(key__in=keys))
+    if links[:RARE_LANGUAGE_LINKS].count() < RARE_LANGUAGE_LINKS:
+        # Few speakers: list them from the (language, doctor) index rather
+        # than probe every candidate the sort index yields.
+        return Q(pk__in=links.values('doctor_id'))
+    return Exists(links.filter(doctor=OuterRef('pk')))
+
+
+def search(speciality=None, city=None, sort=DEFAULT_SORT, cursor=None, limit=None, languages=()):
+    """
+    Active doctors matching the filters, in ``sort`` order, starting after
+    ``cursor``. Returns a queryset of up to ``limit + 1`` rows; pass the rows
+    to ``page`` to split off the cursor of the next page.
+    """
+    spec = SORTS[sort_key(sort)]
+    limit = limit or settings.DOCTOR_SEARCH_PAGE_SIZE
+    doctors = Doctor.objects.filter(is_active=True)
+    if speciality:
+        doctors = doctors.filter(speciality=speciality)
+    if city:
+        doctors = doctors.annotate(city_key=Lower('city')).filter(city_key=city.strip().lower())
+    if languages:
+        doctors = doctors.filter(speaking(languages))
+
+    position = _parse_cursor(spec, cursor) if cursor else None
+    if position is not None:
+        value, pk = position
+        before, beyond = ('lte', 'lt') if spec.descending else ('gte', 'gt')
+        # The first condition alone bounds the index range; the rest skips
+        # the ties already shown.
+        doctors = doctors.filter(**{f'{spec.field}__{before}': value}).filter(
+            Q(**{f'{spec.field}__{beyond}': value}) | Q(pk__gt=pk)
+        )
+
+    order = f'-{spec.field}' if spec.descending else spec.field
+    return doctors.order_by(order, 'pk')[:limit + 1]
+
+
+def page(rows, sort=DEFAULT_SORT, limit=None):
+    """
+    Split the rows ``search`` returned into a ``Page``.
+    """
+    limit = limit or settings.DOCTOR_SEARCH_PAGE_SIZE
+    rows = list(rows)
+    if len(rows) <= limit:
+        return Page(rows, None)
+    last = rows[limit - 1]
+    field = SORTS[sort_key(sort)].field
+    return Page(rows[:limit], f'{getattr(last, field)}_{last.pk}')
@@ -8,6 +8,7 @@ from .models import (
     MedicineOrder,
     MedicineOrderItem,
     OxygenBooking,
+    Review,
     SupportRequest,
     UserProfile,
     Doctor
@@ -23,7 +24,7 @@ class DoctorForm(forms.ModelForm):
             'experience_years',
             'hospital',
             'city',
-            'languages_spoken',
+            'languages',
             'consultation_fee',
             'available_from',
             'available_to',
@@ -34,6 +35,7 @@ class DoctorForm(forms.ModelForm):
         widgets = {
             'available_from': forms.TimeInput(attrs={'type': 'time'}),
             'available_to': forms.TimeInput(attrs={'type': 'time'}),
+            'languages': forms.CheckboxSelectMultiple,
         }
 class PatientRegistrationForm(UserCreationForm):
     phone = forms.CharField(required=False)
@@ -109,3 +111,13 @@ class BedBookingForm(forms.ModelForm):
             'booking_date': forms.DateInput(attrs={'type': 'date'}),
             'time_slot': forms.TimeInput(attrs={'type': 'time'}),
         }
+
+
+class ReviewForm(forms.ModelForm):
+    class Meta:
+        model = Review
+        fields = ['rating', 'comment']
+        widgets = {
+            'rating': forms.RadioSelect,
+            'comment': forms.Textarea(attrs={'rows': 4}),
+        }
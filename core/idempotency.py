@@ -0,0 +1,204 @@
+"""
+Idempotency keys for the booking and ordering POSTs, so a form submitted
+twice (a double tap, a retry on a flaky connection) books or orders once.
+
+Forms rendered with ``{% idempotency_field %}`` carry a fresh key in a hidden
+input; API clients may send an ``Idempotency-Key`` header instead. The first
+POST with a key claims it by inserting an ``IdempotencyKey`` row (unique per
+user and key), runs the view and stores its response on the row. Repeats get
+that response back without running the view again:
+
+* while the first request is still running, 409 with ``Retry-After``. A
+  browser form submitted twice shows only the response to the second
+  submission, so page requests instead wait up to
+  ``settings.IDEMPOTENCY_WAIT_SECONDS`` for the first response and replay
+  it, or are sent to the dashboard with a message if it takes longer;
+* with a different form body, 422, since the key was reused for something
+  else;
+* otherwise the stored status, ``Location`` and body, marked
+  ``Idempotent-Replayed``.
+
+A view that raises or answers 5xx releases its key so the client may retry.
+So does a claim older than ``settings.IDEMPOTENCY_LOCK_SECONDS`` that never
+got a response, left by a worker that died mid-request. A re-rendered form
+(invalid input) embeds a new key, so correcting it is a new submission. Keys
+are kept ``settings.IDEMPOTENCY_KEY_TTL_SECONDS`` and then deleted in
+``created_at`` order by ``manage.py sweep_idempotency_keys``; an expired key
+is simply claimed afresh.
+
+POSTs without a key behave as before.
+"""
+import hashlib
+import re
+import time
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+FIELD = 'idempotency_key'
+HEADER = 'Idempotency-Key'
+
+BATCH_SIZE = 5000
+
+_KEY = re.compile(r'[A-Za-z0-9_.:-]{8,64}')
+
+# Fields that differ between two submissions of the same form.
+_UNSIGNED_FIELDS = {'csrfmiddlewaretoken', FIELD}
+
+# Seconds between checks while a page request waits for the first response.
+POLL_INTERVAL = 0.1
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256(request.path.encode())
+    for name in sorted(set(request.POST) - _UNSIGNED_FIELDS):
+        for value in request.POST.getlist(name):
+            digest.update(f'\0{name}\0{value}'.encode())
+    return digest.hexdigest()
+
+
+def _is_page(request):
+    # A browser navigation, as opposed to an XHR or API call.
+    return request.headers.get('x-requested-with') != 'XMLHttpRequest' and '/api/' not in request.path
+
+
+def _error(request, status, message, retry_after=None):
+    if not _is_page(request):
+        response = JsonResponse({'error': message}, status=status)
+    else:
+        response = HttpResponse(message, status=status, content_type='text/plain; charset=utf-8')
+    if retry_after:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _claim(user, key, fingerprint, now):
+    """
+    Insert the row for ``key``, or return the one already there. Returns
+    ``(record, claimed)``.
+    """
+    expired = now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    abandoned = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    while True:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            # Released or swept in the meantime.
+            continue
+        if record.created_at < expired or (record.status_code is None and record.created_at < abandoned):
+            # Compare-and-delete, so only one of several waiting requests
+            # takes the key over.
+            IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+            continue
+        return record, False
+
+
+def _await(user, key, fingerprint, record):
+    """
+    Wait up to ``settings.IDEMPOTENCY_WAIT_SECONDS`` for the request holding
+    ``record`` to store its response. Returns ``(record, claimed)`` like
+    ``_claim``, which it calls again if that request released the key.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        current = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if current is None:
+            return _claim(user, key, fingerprint, timezone.now())
+        record = current
+        if record.status_code is not None:
+            break
+    return record, False
+
+
+def _replay(request, record):
+    response = HttpResponse(record.body, status=record.status_code, content_type=record.content_type)
+    if record.location:
+        response['Location'] = record.location
+    response['Idempotent-Replayed'] = 'true'
+    if record.content_type.startswith('text/html') or record.location:
+        messages.info(request, 'This was already submitted, so it was not done again.')
+    return response
+
+
+def _store(record, response):
+    record.status_code = response.status_code
+    record.content_type = response.get('Content-Type', '')
+    record.location = response.get('Location', '')
+    record.body = response.content
+    record.save(update_fields=['status_code', 'content_type', 'location', 'body'])
+
+
+def idempotent(view):
+    """
+    Run a POST to ``view`` at most once per idempotency key and user, and
+    answer repeats with the first response. Must run after authentication.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view(request, *args, **kwargs)
+        key = request.headers.get(HEADER) or request.POST.get(FIELD)
+        if not key:
+            return view(request, *args, **kwargs)
+        if not _KEY.fullmatch(key):
+            return _error(request, 400, 'Idempotency keys are 8 to 64 letters, digits or "_.:-".')
+
+        fingerprint = _fingerprint(request)
+        record, claimed = _claim(request.user, key, fingerprint, timezone.now())
+        if not claimed and record.fingerprint == fingerprint and record.status_code is None and _is_page(request):
+            record, claimed = _await(request.user, key, fingerprint, record)
+        if not claimed:
+            if record.fingerprint != fingerprint:
+                return _error(request, 422, 'This idempotency key was already used for a different request.')
+            if record.status_code is None:
+                if _is_page(request):
+                    messages.info(request, 'This was already submitted and is still being processed.')
+                    return redirect('dashboard')
+                return _error(request, 409, 'This request is still being processed.', retry_after=1)
+            return _replay(request, record)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.streaming:
+            record.delete()
+        else:
+            _store(record, response)
+        return response
+    return wrapped
+
+
+def sweep(ttl=None, batch_size=BATCH_SIZE, now=None):
+    """
+    Delete keys older than ``ttl`` seconds (default
+    ``settings.IDEMPOTENCY_KEY_TTL_SECONDS``), oldest first, one batch per
+    statement. Returns how many were deleted.
+    """
+    ttl = settings.IDEMPOTENCY_KEY_TTL_SECONDS if ttl is None else ttl
+    cutoff = (now or timezone.now()) - timedelta(seconds=ttl)
+    expired = IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by('created_at')
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,158 @@
+"""
+Wake-ups for the long-poll notification inbox (``views.notification_inbox``).
+
+A waiting request registers a ``Waiter`` for its user and sleeps on it, so
+an idle inbox costs a parked coroutine and no queries. Whatever writes
+notifications calls ``wake(user_ids)``; once its transaction commits, the
+ids go to the waiters of this process directly and, as one datagram, to
+every other process with waiters.
+
+Each process that has ever waited binds a Unix datagram socket in
+``settings.INBOX_SOCKET_DIR`` and runs a daemon thread that wakes its local
+waiters from whatever arrives there. Senders (web processes and job workers
+alike) write to every socket in the directory and remove the ones nobody is
+listening on any more. Where Unix sockets are not available only waiters in
+the writing process are woken; the rest see their notifications when their
+poll times out and they ask again.
+"""
+import asyncio
+import os
+import socket
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+# User ids per datagram, well under the default socket buffer.
+DATAGRAM_IDS = 4096
+
+_lock = threading.Lock()
+_waiters = {}
+_listener = None
+
+
+class Waiter:
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def wake(self):
+        # Called from the listener or a writer's thread.
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout):
+        """
+        Sleep until woken or ``timeout`` seconds pass; True if woken.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+@contextmanager
+def waiting(user_id):
+    """
+    Register a ``Waiter`` for ``user_id`` for the duration of the block.
+
+    Enter it before checking for notifications, so one written between the
+    check and the wait still wakes it.
+    """
+    _ensure_listener()
+    waiter = Waiter()
+    with _lock:
+        _waiters.setdefault(user_id, set()).add(waiter)
+    try:
+        yield waiter
+    finally:
+        with _lock:
+            user_waiters = _waiters.get(user_id)
+            user_waiters.discard(waiter)
+            if not user_waiters:
+                del _waiters[user_id]
+
+
+def _wake_local(user_ids):
+    with _lock:
+        woken = [waiter for user_id in user_ids for waiter in _waiters.get(user_id, ())]
+    for waiter in woken:
+        waiter.wake()
+
+
+def _directory():
+    return Path(settings.INBOX_SOCKET_DIR)
+
+
+def _listen(sock):
+    while True:
+        data = sock.recv(DATAGRAM_IDS * 8)
+        _wake_local(array('q', data))
+
+
+def _ensure_listener():
+    global _listener
+    if _listener is not None or not hasattr(socket, 'AF_UNIX'):
+        return
+    with _lock:
+        if _listener is not None:
+            return
+        directory = _directory()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock'
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(path))
+        threading.Thread(target=_listen, args=(sock,), name='inbox-listener', daemon=True).start()
+        _listener = path
+
+
+def _broadcast(user_ids):
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+    try:
+        paths = [path for path in _directory().glob('*.sock') if path != _listener]
+    except OSError:
+        return
+    if not paths:
+        return
+    payloads = [
+        array('q', user_ids[i:i + DATAGRAM_IDS]).tobytes()
+        for i in range(0, len(user_ids), DATAGRAM_IDS)
+    ]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for path in paths:
+            for payload in payloads:
+                try:
+                    sock.sendto(payload, str(path))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The process that bound it is gone.
+                    path.unlink(missing_ok=True)
+                    break
+                except BlockingIOError:
+                    # Its queue is full; those waiters will time out and poll.
+                    break
+
+
+def notify_users(user_ids):
+    """
+    Wake every waiter of ``user_ids``, in this process and the others.
+    """
+    user_ids = sorted(set(user_ids))
+    if user_ids:
+        _wake_local(user_ids)
+        _broadcast(user_ids)
+
+
+def wake(user_ids):
+    """
+    ``notify_users`` once the current transaction commits, so a woken
+    request can see the new rows.
+    """
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: notify_users(user_ids))
@@ -0,0 +1,196 @@
+"""
+Inventory counters and their append-only change ledger.
+
+Every change to ``HospitalBed``, ``OxygenCylinderStock`` and ``Medicine``
+counters leaves an ``InventoryLedgerEntry``. Views change stock through
+``adjust``, which applies the delta with a single conditional ``UPDATE`` (so
+concurrent bookings cannot drive a counter negative) and appends the entry in
+the same transaction. Direct saves and deletes, e.g. from the admin, are
+recorded by the hooks in ``core.signals`` via ``record_save``/``record_delete``.
+
+``changes_since`` reads the ledger by sequence number for change feeds;
+``compact`` folds old entries into ``InventoryCheckpoint`` rows.
+"""
+from django.db import transaction
+from django.db.models import F, Max
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import (
+    HospitalBed,
+    InventoryCheckpoint,
+    InventoryLedgerEntry,
+    Medicine,
+    OxygenCylinderStock,
+)
+
+# Model -> (ledger resource, counter fields).
+TRACKED = {
+    HospitalBed: ('BED', ('total_beds', 'available_beds')),
+    OxygenCylinderStock: ('OXYGEN', ('available_cylinders',)),
+    Medicine: ('MEDICINE', ('stock',)),
+}
+RESOURCE_MODELS = {resource: model for model, (resource, _) in TRACKED.items()}
+
+# Sent by ``adjust`` after a change, inside its transaction, which may still
+# roll back: receivers that act outside the database (cache invalidation) must
+# defer that work with ``transaction.on_commit``. ``adjust`` uses queryset
+# updates, so post_save receivers would not otherwise hear about it.
+inventory_changed = Signal()
+
+COMPACT_BATCH = 1000
+
+
+class InsufficientStock(Exception):
+    def __init__(self, instance, field):
+        super().__init__(f'Not enough {field} on {instance}')
+        self.instance = instance
+        self.field = field
+
+
+def _entry(resource, object_id, field, delta, value_after, reason, user=None):
+    return InventoryLedgerEntry(
+        resource=resource,
+        object_id=object_id,
+        field=field,
+        delta=delta,
+        value_after=value_after,
+        reason=reason,
+        user=user if user is not None and user.is_authenticated else None,
+    )
+
+
+@transaction.atomic
+def adjust(instance, field, delta, reason, user=None):
+    """
+    Add ``delta`` to ``instance.<field>`` and record it in the ledger.
+
+    Decrements only apply if enough is left; returns False (and writes
+    nothing) otherwise. On success ``instance.<field>`` holds the new value.
+    """
+    model = type(instance)
+    resource, fields = TRACKED[model]
+    if field not in fields:
+        raise ValueError(f'{model.__name__}.{field} is not an inventory counter')
+
+    rows = model.objects.filter(pk=instance.pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    if not rows.update(**{field: F(field) + delta}):
+        return False
+
+    value = model.objects.filter(pk=instance.pk).values_list(field, flat=True).get()
+    setattr(instance, field, value)
+    _entry(resource, instance.pk, field, delta, value, reason, user).save()
+    inventory_changed.send(sender=model, instance=instance)
+    return True
+
+
+def take(instance, field, amount, reason, user=None):
+    """
+    Like ``adjust(..., -amount, ...)`` but raise ``InsufficientStock``.
+
+    Meant for use inside ``transaction.atomic()`` so the whole operation is
+    rolled back when one line cannot be fulfilled.
+    """
+    if not adjust(instance, field, -amount, reason, user=user):
+        raise InsufficientStock(instance, field)
+
+
+def counters(model, pk):
+    """
+    Current counter values of a row, or None if it does not exist.
+    """
+    _, fields = TRACKED[model]
+    return model.objects.filter(pk=pk).values(*fields).first()
+
+
+def record_save(instance, before, created):
+    """
+    Ledger entries for a direct save, given the counters ``before`` it.
+    """
+    resource, fields = TRACKED[type(instance)]
+    before = before or {}
+    entries = []
+    for field in fields:
+        value = getattr(instance, field)
+        delta = value - before.get(field, 0)
+        if delta or created:
+            entries.append(
+                _entry(resource, instance.pk, field, delta, value, 'CREATED' if created else 'EDITED')
+            )
+    InventoryLedgerEntry.objects.bulk_create(entries)
+
+
+def record_delete(instance):
+    resource, fields = TRACKED[type(instance)]
+    InventoryLedgerEntry.objects.bulk_create([
+        _entry(resource, instance.pk, field, -getattr(instance, field), 0, 'DELETED')
+        for field in fields
+    ])
+
+
+def compacted_through():
+    """
+    Highest sequence number folded into checkpoints (0 if none).
+    """
+    return InventoryCheckpoint.objects.aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def changes_since(seq, limit=500, resource=None):
+    """
+    Up to ``limit`` ledger entries with sequence number above ``seq``.
+
+    A primary-key range scan, so the cost depends on ``limit`` only. Callers
+    holding a ``seq`` below ``compacted_through()`` have missed folded
+    entries and must reload from current values instead.
+    """
+    entries = InventoryLedgerEntry.objects.filter(seq__gt=seq)
+    if resource:
+        entries = entries.filter(resource=resource)
+    return list(
+        entries.order_by('seq').values(
+            'seq', 'resource', 'object_id', 'field', 'delta', 'value_after', 'reason', 'created_at',
+        )[:limit]
+    )
+
+
+def compact(before=None):
+    """
+    Fold ledger entries created before ``before`` into checkpoints.
+
+    Each (resource, object, field) checkpoint keeps the value after the last
+    folded entry; folded entries are then deleted. Returns the number of
+    entries removed.
+    """
+    before = before or timezone.now()
+    cutoff = (
+        InventoryLedgerEntry.objects.filter(created_at__lt=before)
+        .aggregate(seq=Max('seq'))['seq']
+    )
+    if cutoff is None:
+        return 0
+
+    with transaction.atomic():
+        latest = (
+            InventoryLedgerEntry.objects.filter(seq__lte=cutoff)
+            .values('resource', 'object_id', 'field')
+            .annotate(last=Max('seq'))
+            .values_list('last', flat=True)
+        )
+        last_seqs = list(latest)
+        for i in range(0, len(last_seqs), COMPACT_BATCH):
+            rows = InventoryLedgerEntry.objects.filter(seq__in=last_seqs[i:i + COMPACT_BATCH]).values_list(
+                'seq', 'resource', 'object_id', 'field', 'value_after',
+            )
+            InventoryCheckpoint.objects.bulk_create(
+                [
+                    InventoryCheckpoint(resource=resource, object_id=object_id, field=field, value=value, seq=seq)
+                    for seq, resource, object_id, field, value in rows
+                ],
+                update_conflicts=True,
+                unique_fields=['resource', 'object_id', 'field'],
+                update_fields=['value', 'seq'],
+            )
+        removed, _ = InventoryLedgerEntry.objects.filter(seq__lte=cutoff).delete()
+    return removed
@@ -0,0 +1,216 @@
+"""
+Background job queue stored in the main database.
+
+Handlers are registered with ``@task`` (see ``core.tasks``) and queued with
+``enqueue``/``enqueue_many``. Because jobs are ordinary rows, a job queued
+inside a request's transaction only becomes visible if that transaction
+commits.
+
+Workers (``manage.py run_worker``) claim jobs in batches: one ``UPDATE``
+marks up to ``batch_size`` ready jobs as RUNNING under a random lease token
+with an expiry. A worker that dies leaves its lease to expire, after which
+``requeue_expired`` makes the jobs claimable again.
+
+Each job runs in its own transaction. Foreign keys are checked at commit, so
+a savepoint per job inside one big transaction would let one bad job sink
+the batch. Tasks registered with ``batch=True`` instead receive every
+payload of the batch in a single call and transaction, which is what makes
+high-volume work such as notifications cheap.
+
+Failed jobs are retried with exponential backoff until ``max_attempts``.
+
+A worker is a separate process that has to be deployed. Until it is
+(``CURA_JOB_WORKER=1``, see ``settings.JOBS_INLINE``), ``enqueue`` runs a
+job that is due now straight away in the caller's transaction instead.
+``enqueue_many`` always queues.
+"""
+import random
+import traceback
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+# Lower runs first.
+EMERGENCY = 0
+HIGH = 10
+NORMAL = 50
+LOW = 90
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+
+Task = namedtuple('Task', 'func priority max_attempts batch')
+TASKS = {}
+
+
+def task(name=None, priority=NORMAL, max_attempts=5, batch=False):
+    """
+    Register a job handler.
+
+    The handler is called with the job payload, or with a list of payloads
+    when ``batch`` is True.
+    """
+    def register(func):
+        TASKS[name or func.__name__] = Task(func, priority, max_attempts, batch)
+        return func
+    return register
+
+
+def _job(name, payload, priority, run_at, max_attempts):
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    spec = TASKS[name]
+    return Job(
+        name=name,
+        payload=payload or {},
+        priority=spec.priority if priority is None else priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or spec.max_attempts,
+    )
+
+
+def enqueue(name, payload=None, priority=None, run_at=None, max_attempts=None):
+    """
+    Queue a job and return it, or with ``settings.JOBS_INLINE`` run a job
+    that is due now in place and return None.
+    """
+    job = _job(name, payload, priority, run_at, max_attempts)
+    if settings.JOBS_INLINE and job.run_at <= timezone.now():
+        _run_one(TASKS[name], job)
+        return None
+    job.save()
+    return job
+
+
+def enqueue_many(name, payloads, priority=None, run_at=None, max_attempts=None):
+    return Job.objects.bulk_create(
+        [_job(name, payload, priority, run_at, max_attempts) for payload in payloads],
+        batch_size=1000,
+    )
+
+
+def claim(batch_size=100, lease_seconds=60, names=None):
+    """
+    Lease up to ``batch_size`` ready jobs, highest priority first, only of
+    the tasks in ``names`` if given.
+
+    Returns ``(lease, jobs)``. The claim is a single ``UPDATE ... WHERE pk IN
+    (SELECT ... LIMIT n)``, and re-checks the status so two workers can never
+    hold the same job.
+    """
+    now = timezone.now()
+    lease = uuid.uuid4().hex
+    ready = (
+        Job.objects.filter(status='QUEUED', run_at__lte=now)
+        .order_by('priority', 'run_at', 'pk')
+        .values('pk')
+    )
+    if names is not None:
+        ready = ready.filter(name__in=names)
+    ready = ready[:batch_size]
+    claimed = Job.objects.filter(pk__in=ready, status='QUEUED').update(
+        status='RUNNING',
+        lease=lease,
+        locked_until=now + timedelta(seconds=lease_seconds),
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return lease, []
+    jobs = list(Job.objects.filter(lease=lease, status='RUNNING').order_by('priority', 'run_at', 'pk'))
+    return lease, jobs
+
+
+def requeue_expired():
+    """
+    Release jobs whose worker let the lease expire. Returns the count.
+    """
+    now = timezone.now()
+    expired = Job.objects.filter(status='RUNNING', locked_until__lt=now)
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status='FAILED', lease='', locked_until=None, last_error='Lease expired',
+    )
+    return failed + expired.update(status='QUEUED', lease='', locked_until=None)
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(1, 1.25))
+
+
+def _run_one(spec, job):
+    with transaction.atomic():
+        if spec.batch:
+            spec.func([job.payload])
+        else:
+            spec.func(job.payload)
+
+
+def _run_group(spec, jobs, errors):
+    if spec.batch and len(jobs) > 1:
+        try:
+            with transaction.atomic():
+                spec.func([job.payload for job in jobs])
+            return
+        except Exception:
+            # Run them one by one to find the payload at fault.
+            pass
+    for job in jobs:
+        try:
+            _run_one(spec, job)
+        except Exception:
+            errors[job.pk] = traceback.format_exc()
+
+
+def run_batch(lease, jobs):
+    """
+    Run claimed jobs, delete the ones that succeeded and reschedule the rest.
+
+    Returns ``(succeeded, failed)``.
+    """
+    errors = {}
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.name, []).append(job)
+
+    for name, group in groups.items():
+        spec = TASKS.get(name)
+        if spec is None:
+            for job in group:
+                errors[job.pk] = f'Unknown task: {name}'
+            continue
+        _run_group(spec, group, errors)
+
+    with transaction.atomic():
+        done = [job.pk for job in jobs if job.pk not in errors]
+        Job.objects.filter(pk__in=done, lease=lease).delete()
+
+        now = timezone.now()
+        for job in jobs:
+            if job.pk not in errors:
+                continue
+            update = {'lease': '', 'locked_until': None, 'last_error': errors[job.pk][-4000:]}
+            if job.attempts >= job.max_attempts:
+                update['status'] = 'FAILED'
+            else:
+                update['status'] = 'QUEUED'
+                update['run_at'] = now + backoff(job.attempts)
+            Job.objects.filter(pk=job.pk, lease=lease).update(**update)
+    return len(done), len(errors)
+
+
+def work(batch_size=100, lease_seconds=60, names=None):
+    """
+    Claim and run one batch (of the tasks in ``names`` if given). Returns
+    ``(succeeded, failed)``.
+    """
+    lease, jobs = claim(batch_size, lease_seconds, names)
+    if not jobs:
+        return 0, 0
+    return run_batch(lease, jobs)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import BATCH_SIZE, archive_notifications
+
+
+class Command(BaseCommand):
+    help = 'Move old read notifications to the archive table (run daily).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Defaults to settings.NOTIFICATION_RETENTION_DAYS.')
+        parser.add_argument(
+            '--digest', action='store_true', default=None,
+            help='Collapse archived notifications to one row per user, type and day.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        moved = archive_notifications(
+            days=options['days'], digest=options['digest'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(f'Archived {moved} notification(s).')
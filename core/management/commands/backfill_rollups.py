@@ -0,0 +1,44 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailyRollup rows for a date range from the raw booking and order tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='from', help='First day (YYYY-MM-DD). Defaults to --days ago.')
+        parser.add_argument('--to', help='Last day (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument(
+            '--batch-days', type=int, default=31,
+            help='Days rebuilt per transaction, to keep locks short on big ranges.',
+        )
+
+    def _date(self, options, name, default):
+        raw = options[name]
+        if not raw:
+            return default
+        value = parse_date(raw)
+        if value is None:
+            raise CommandError(f'--{name} must be a date (YYYY-MM-DD)')
+        return value
+
+    def handle(self, *args, **options):
+        end = self._date(options, 'to', timezone.localdate())
+        start = self._date(options, 'from', end - datetime.timedelta(days=options['days'] - 1))
+        if start > end:
+            raise CommandError('--from must not be after --to')
+
+        step = datetime.timedelta(days=max(1, options['batch_days']))
+        written = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + step - datetime.timedelta(days=1), end)
+            written += backfill(chunk_start, chunk_end)
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup rows for {start} .. {end}.'))
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of the JSON API hospital listing against the XHR '
+        'branch of hospital_list, using the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--city', default='')
+        parser.add_argument('--limit', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Measure the views, not the 429s of the search rate limit.
+        settings.RATE_LIMITS = {}
+        client = Client(SERVER_NAME='localhost')
+        n = options['requests']
+        params = {'city': options['city']} if options['city'] else {}
+
+        cases = [
+            (
+                'hospital_list (XHR)',
+                reverse('hospital_list'),
+                params,
+                {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'},
+            ),
+            (
+                'api/v1/hospitals',
+                reverse('api_hospitals'),
+                {**params, 'limit': options['limit']},
+                {},
+            ),
+        ]
+        for label, url, query, headers in cases:
+            client.get(url, query, **headers)  # warm up
+            start = time.perf_counter()
+            size = 0
+            for _ in range(n):
+                response = client.get(url, query, **headers)
+                size = len(response.content)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{label:<22} {n / elapsed:9.1f} req/s  '
+                f'{elapsed / n * 1000:7.2f} ms/req  {size} bytes'
+            )
@@ -0,0 +1,55 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import cart_split
+
+
+class Command(BaseCommand):
+    help = 'Time the cart split optimiser on random carts against cheapest-per-line buying.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=30)
+        parser.add_argument('--pharmacies', type=int, default=300)
+        parser.add_argument('--coverage', type=float, default=0.6, help='Share of pharmacies stocking each line.')
+        parser.add_argument('--penalty', type=int, default=40, help='Rupees per order.')
+        parser.add_argument('--carts', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        penalty = options['penalty'] * 100
+        timings, savings = [], []
+        for _ in range(options['carts']):
+            offers = []
+            for line in range(options['lines']):
+                base = rng.randint(2000, 50000)
+                line_offers = {}
+                for pharmacy_id in range(options['pharmacies']):
+                    if rng.random() < options['coverage']:
+                        cost = int(base * rng.uniform(0.8, 1.3))
+                        line_offers[pharmacy_id] = cart_split.Offer(cost, pharmacy_id, line * 10000 + pharmacy_id)
+                if not line_offers:
+                    line_offers[0] = cart_split.Offer(base, 0, line * 10000)
+                offers.append(line_offers)
+
+            greedy = [min(line_offers.values()) for line_offers in offers]
+            greedy_value = sum(o.cost for o in greedy) + penalty * len({o.pharmacy_id for o in greedy})
+            current = {rng.choice(list(line_offers)) for line_offers in offers}
+
+            start = time.perf_counter()
+            value, _ = cart_split.optimise(offers, penalty, current)
+            timings.append((time.perf_counter() - start) * 1000)
+            savings.append((greedy_value - value) / 100)
+
+        timings.sort()
+        self.stdout.write(
+            f'{options["lines"]} lines x {options["pharmacies"]} pharmacies, {options["carts"]} carts'
+        )
+        self.stdout.write(
+            f'optimise  p50 {statistics.median(timings):6.1f} ms   '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:6.1f} ms   max {timings[-1]:6.1f} ms'
+        )
+        self.stdout.write(f'saving vs cheapest-per-line  mean ₹{statistics.mean(savings):.2f}')
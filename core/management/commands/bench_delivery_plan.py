@@ -0,0 +1,66 @@
+import random
+import statistics
+import time
+from datetime import time as clock
+
+from django.core.management.base import BaseCommand
+
+from core import delivery
+
+
+class Command(BaseCommand):
+    help = 'Time delivery route planning on random stops and compare distance with routing in booking order.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=500)
+        parser.add_argument('--vehicles', type=int, default=6)
+        parser.add_argument('--capacity', type=int, default=20)
+        parser.add_argument('--slot-minutes', type=int, default=120)
+        parser.add_argument('--radius-km', type=float, default=15)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        depot = (18.52, 73.85)
+        spread = options['radius_km'] / 111
+        batches = {}
+        for i in range(options['deliveries']):
+            slot = clock(rng.randint(8, 19), rng.choice([0, 15, 30, 45]))
+            stop = delivery.Stop(
+                i,
+                depot[0] + rng.uniform(-spread, spread),
+                depot[1] + rng.uniform(-spread, spread),
+                rng.choice([1, 1, 1, 2, 2, 3, 5]),
+            )
+            batches.setdefault(delivery.batch_label(slot, options['slot_minutes']), []).append(stop)
+        batches = sorted(batches.items())
+
+        timings = []
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            manifests = delivery.plan_routes(batches, depot, options['vehicles'], options['capacity'])
+            timings.append((time.perf_counter() - start) * 1000)
+
+        naive = 0.0
+        for _, stops in batches:
+            load, carried = [], 0
+            for stop in stops + [None]:
+                if stop is None or carried + stop.quantity > options['capacity']:
+                    points = [depot] + [(s.latitude, s.longitude) for s in load] + [depot]
+                    naive += sum(delivery.distance_km(points[k], points[k + 1]) for k in range(len(points) - 1))
+                    load, carried = [], 0
+                if stop is not None:
+                    load.append(stop)
+                    carried += stop.quantity
+
+        planned = sum(manifest.distance_km for manifest in manifests)
+        trips = sum(len(manifest.trips) for manifest in manifests)
+        self.stdout.write(
+            f'{options["deliveries"]} deliveries in {len(batches)} slots, '
+            f'{options["vehicles"]} vehicles x {options["capacity"]} cylinders: {trips} trips'
+        )
+        self.stdout.write(f'plan      median {statistics.median(timings):7.1f} ms   max {max(timings):7.1f} ms')
+        self.stdout.write(f'distance  {planned:9.1f} km planned   {naive:9.1f} km in booking order')
+        busiest = max(manifest.distance_km for manifest in manifests)
+        self.stdout.write(f'busiest vehicle {busiest:.1f} km')
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from core import doctor_ranking
+from core.models import Doctor
+
+
+def _plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the ranked doctor search (first and deep pages, every sort, optionally by '
+        'language) against loading every match as the search used to, and show the query plans.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--speciality', help='Defaults to the busiest speciality and city.')
+        parser.add_argument('--city')
+        parser.add_argument(
+            '--language', action='append', default=[],
+            help='Only doctors speaking any of these (repeatable).',
+        )
+        parser.add_argument('--pages', type=int, default=20, help='Pages to walk for the deep page.')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        speciality, city = options['speciality'], options['city']
+        if not (speciality and city):
+            busiest = (
+                Doctor.objects.filter(is_active=True).values('speciality', 'city')
+                .annotate(n=Count('pk')).order_by('-n').first()
+            )
+            if busiest is None:
+                raise CommandError('No doctors to search.')
+            speciality, city = busiest['speciality'], busiest['city']
+        languages = options['language']
+        matches = Doctor.objects.filter(is_active=True, speciality=speciality, city__iexact=city)
+        if languages:
+            matches = matches.filter(doctor_ranking.speaking(languages))
+        self.stdout.write(
+            f'{speciality} in {city}{" speaking " + " or ".join(languages) if languages else ""}: '
+            f'{matches.count()} active doctor(s)'
+        )
+
+        repeat = options['repeat']
+        unranked = Doctor.objects.filter(is_active=True, speciality__iexact=speciality, city__icontains=city)
+        if languages:
+            unranked = unranked.filter(doctor_ranking.speaking(languages))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(unranked.select_related('hospital'))
+        elapsed = (time.perf_counter() - start) / repeat
+        self.stdout.write(f'{"every match":18} {elapsed * 1000:8.2f} ms  {_plan(unranked)}')
+
+        for sort in doctor_ranking.SORTS:
+            cursor = None
+            for _ in range(options['pages']):
+                rows = doctor_ranking.page(doctor_ranking.search(speciality, city, sort, cursor, languages=languages), sort)
+                if rows.next_cursor is None:
+                    break
+                cursor = rows.next_cursor
+            for label, after in ((f'{sort}, page 1', None), (f'{sort}, deep', cursor)):
+                queryset = doctor_ranking.search(speciality, city, sort, after, languages=languages).select_related('hospital')
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    doctor_ranking.page(queryset.all(), sort)
+                elapsed = (time.perf_counter() - start) / repeat
+                self.stdout.write(f'{label:18} {elapsed * 1000:8.2f} ms  {_plan(queryset)}')
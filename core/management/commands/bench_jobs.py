@@ -0,0 +1,51 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core import jobs, tasks
+from core.models import Job
+
+# The notify handler under a name of its own, so the bench works only the jobs
+# it queued and never the real notifications waiting in the queue.
+NAME = 'bench_notify'
+jobs.task(name=NAME, priority=jobs.LOW, batch=True)(tasks.notify)
+
+
+class Command(BaseCommand):
+    help = 'Measure enqueue and worker throughput of the job queue with its own notification jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # A throwaway recipient; deleting it takes its notifications along.
+        user = get_user_model().objects.create(username=f'jobbench-{uuid.uuid4().hex[:8]}')
+        n = options['jobs']
+        payloads = [
+            {'user_id': user.pk, 'message': f'Queue benchmark {i}', 'notification_type': 'SUPPORT'}
+            for i in range(n)
+        ]
+        try:
+            start = time.perf_counter()
+            jobs.enqueue_many(NAME, payloads)
+            enqueue_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            done = 0
+            while True:
+                ok, bad = jobs.work(options['batch_size'], names=[NAME])
+                if not ok and not bad:
+                    break
+                done += ok
+            work_elapsed = time.perf_counter() - start
+
+            self.stdout.write(f'enqueue  {n / enqueue_elapsed:10.0f} jobs/s')
+            self.stdout.write(f'process  {done / work_elapsed:10.0f} jobs/s  ({done} jobs)')
+        finally:
+            left, _ = Job.objects.filter(name=NAME, payload__user_id=user.pk).delete()
+            user.delete()
+        if left:
+            self.stderr.write(f'{left} benchmark job(s) were left in the queue and deleted.')
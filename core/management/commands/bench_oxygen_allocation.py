@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+
+from core import oxygen_allocation
+from core.models import OxygenAllocation, OxygenCylinderStock, OxygenSupplier
+
+CAPACITY = 47
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent split oxygen bookings against many suppliers in a '
+        'throwaway city, check no cylinder is lost or oversold, then clean up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--max-quantity', type=int, default=40)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        city = f'Bench {tag}'
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f'o2bench-{tag}-{i}') for i in range(options['suppliers'] + 1)]
+            )
+            users = list(User.objects.filter(username__startswith=f'o2bench-{tag}-').order_by('pk'))
+            patient = users.pop()
+            OxygenSupplier.objects.bulk_create([
+                OxygenSupplier(
+                    user=user, name=f'Bench supplier {i}', city=city, contact_phone='0',
+                    delivery_available=rng.random() < 0.7,
+                )
+                for i, user in enumerate(users)
+            ])
+            suppliers = OxygenSupplier.objects.filter(city=city)
+            OxygenCylinderStock.objects.bulk_create([
+                OxygenCylinderStock(
+                    supplier=supplier,
+                    capacity_litres=CAPACITY,
+                    price_per_cylinder=rng.randint(300, 900),
+                    available_cylinders=rng.randint(0, 12),
+                )
+                for supplier in suppliers
+            ])
+        stocks = OxygenCylinderStock.objects.filter(supplier__city=city)
+        before = stocks.aggregate(total=Sum('available_cylinders'))['total']
+
+        details = {
+            'delivery_address': 'Benchmark',
+            'scheduled_date': date.today(),
+            'time_slot': None,
+            'payment_option': 'CASH',
+        }
+        quantities = [rng.randint(1, options['max_quantity']) for _ in range(options['requests'])]
+
+        def run(quantity):
+            start = time.perf_counter()
+            try:
+                allocation = oxygen_allocation.allocate(
+                    patient, city, CAPACITY, quantity, details, delivery=quantity % 2 == 0,
+                )
+                outcome = 'booked' if allocation else 'short'
+            except DatabaseError:
+                outcome = 'busy'
+            finally:
+                connection.close()
+            return outcome, (time.perf_counter() - start) * 1000
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as pool:
+                results = list(pool.map(run, quantities))
+            elapsed = time.perf_counter() - start
+
+            after = stocks.aggregate(total=Sum('available_cylinders'))['total']
+            booked = OxygenAllocation.objects.filter(city=city).aggregate(total=Sum('quantity'))['total'] or 0
+            timings = sorted(ms for _, ms in results)
+            outcomes = [outcome for outcome, _ in results]
+            self.stdout.write(
+                f'{options["suppliers"]} suppliers, {len(quantities)} requests on {options["threads"]} threads: '
+                f'{len(quantities) / elapsed:.0f} req/s'
+            )
+            self.stdout.write(
+                f'latency  p50 {statistics.median(timings):6.1f} ms   '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:6.1f} ms   max {timings[-1]:6.1f} ms'
+            )
+            self.stdout.write(
+                f'booked {outcomes.count("booked")}  short {outcomes.count("short")}  '
+                f'busy {outcomes.count("busy")}  cylinders {booked}'
+            )
+            if before - after != booked or stocks.filter(available_cylinders__lt=0).exists():
+                self.stderr.write(f'Stock mismatch: {before - after} taken, {booked} booked.')
+            else:
+                self.stdout.write('Stock consistent.')
+        finally:
+            OxygenAllocation.objects.filter(city=city).delete()
+            User.objects.filter(username__startswith=f'o2bench-{tag}-').delete()
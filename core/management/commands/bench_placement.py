@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from core import api, placement
+from core.models import Hospital
+
+
+class Command(BaseCommand):
+    help = 'Measure bed recommendation throughput from the in-memory index and through the API endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', help='Defaults to the city with the most hospitals.')
+        parser.add_argument('--bed-type', default='ICU')
+        parser.add_argument('--specialty', default='Cardiology')
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        city = options['city']
+        if not city:
+            busiest = Hospital.objects.values('city').annotate(n=Count('pk')).order_by('-n').first()
+            if busiest is None:
+                raise CommandError('No hospitals to rank.')
+            city = busiest['city']
+        n = options['requests']
+        args = (city, options['bed_type'], options['specialty'])
+
+        start = time.perf_counter()
+        placement.recommend(*args)
+        self.stdout.write(f'{city}: index built in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+        start = time.perf_counter()
+        for _ in range(n):
+            placement.recommend(*args)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'recommend()        {n / elapsed:10.0f} req/s  {elapsed / n * 1e6:8.1f} us/req')
+
+        url = reverse('api_bed_recommendations')
+        query = {'city': city, 'bed_type': options['bed_type'], 'specialty': options['specialty']}
+        request = RequestFactory().get(url, query)
+        start = time.perf_counter()
+        for _ in range(n):
+            api.bed_recommendations(request)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'view, no middleware {n / elapsed:9.0f} req/s  {elapsed / n * 1e6:8.1f} us/req')
+
+        client = Client(SERVER_NAME='localhost')
+        client.get(url, query)
+        start = time.perf_counter()
+        for _ in range(n):
+            response = client.get(url, query)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'full stack          {n / elapsed:9.0f} req/s  {elapsed / n * 1e6:8.1f} us/req  '
+            f'{len(response.content)} bytes'
+        )
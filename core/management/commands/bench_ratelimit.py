@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.ratelimit import BucketTable
+
+
+def _hammer(path, slots, keys, requests, results):
+    table = BucketTable(path, slots)
+    allowed = 0
+    for i in range(requests):
+        allowed += not table.take(keys[i % len(keys)], 1, 50)
+    results.put(allowed)
+
+
+class Command(BaseCommand):
+    help = 'Measure the cost of a rate-limit check and that processes share the buckets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--keys', type=int, default=10000)
+        parser.add_argument('--processes', type=int, default=4)
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        keys = [f'search:ip:10.0.{i // 256}.{i % 256}' for i in range(options['keys'])]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'buckets')
+            table = BucketTable(path, 65536)
+            start = time.perf_counter()
+            for i in range(n):
+                table.take(keys[i % len(keys)], 5, 30)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'take()  {n / elapsed:10.0f} checks/s  {elapsed / n * 1e6:6.2f} us/check')
+
+            # Every process hits the same few keys; together they may only
+            # spend each bucket's burst (plus a little refill), not one each.
+            path = os.path.join(directory, 'shared')
+            shared_keys = keys[:10]
+            results = multiprocessing.Queue()
+            workers = [
+                multiprocessing.Process(target=_hammer, args=(path, 65536, shared_keys, 2000, results))
+                for _ in range(options['processes'])
+            ]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            allowed = sum(results.get() for _ in workers)
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{options["processes"]} processes: {allowed} of {2000 * len(workers)} allowed for '
+                f'{len(shared_keys)} keys with burst 50 in {elapsed:.2f}s'
+            )
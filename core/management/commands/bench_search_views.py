@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from core.models import Hospital
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _targets():
+    city = Hospital.objects.values_list('city', flat=True).first() or ''
+    return [
+        (reverse('hospital_list'), urlencode({'city': city})),
+        (reverse('hospital_list'), urlencode({'bed_type': 'ICU'})),
+        (reverse('doctor_search'), urlencode({'city': city})),
+        (reverse('oxygen_list'), urlencode({'city': city})),
+        (reverse('medicine_search'), urlencode({'name': 'a', 'city': city})),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the public search pages with many concurrent clients through the WSGI '
+        'handler (sync views, one thread per client) and the ASGI handler (async views), '
+        'each in a fresh process, and compare requests/s, latency and peak memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=5, help='Requests per client.')
+        parser.add_argument('--worker', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self._work(options['worker'], options['clients'], options['requests'])
+
+        self.stdout.write(
+            f'{options["clients"]} clients x {options["requests"]} requests\n'
+            f'{"":6} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7} {"threads":>8} {"peak MB":>8} {"+MB":>7}'
+        )
+        for mode in ('wsgi', 'asgi'):
+            env = dict(os.environ, CURA_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+            completed = subprocess.run(
+                [
+                    sys.executable, sys.argv[0], 'bench_search_views', '--worker', mode,
+                    '--clients', str(options['clients']), '--requests', str(options['requests']),
+                ],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f'{mode:6} {result["rps"]:8.0f} {result["p50"]:8.1f} {result["p99"]:8.1f} '
+                f'{result["errors"]:7} {result["threads"]:8} {result["peak_mb"]:8.0f} {result["grown_mb"]:7.0f}'
+            )
+
+    def _work(self, mode, clients, per_client):
+        # Measure the views, not the guards in front of them.
+        settings.RATE_LIMITS = {}
+        settings.EMERGENCY_DB_LATENCY_MS = float('inf')
+        settings.EMERGENCY_ERROR_RATE = 2
+        # Every client may hold a database connection at once.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        targets = _targets()
+        threads = [threading.active_count()]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.05):
+                threads.append(threading.active_count())
+
+        run = self._run_wsgi if mode == 'wsgi' else self._run_asgi
+        run(targets, 1, len(targets))
+        baseline = _peak_rss_mb()
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        timings, errors = run(targets, clients, per_client)
+        elapsed = time.perf_counter() - start
+        done.set()
+        timings.sort()
+        self.stdout.write(json.dumps({
+            'rps': len(timings) / elapsed,
+            'p50': statistics.median(timings) * 1000,
+            'p99': timings[int(len(timings) * 0.99) - 1] * 1000,
+            'errors': errors,
+            'threads': max(threads),
+            'peak_mb': _peak_rss_mb(),
+            'grown_mb': _peak_rss_mb() - baseline,
+        }))
+
+    def _run_wsgi(self, targets, clients, per_client):
+        handler = WSGIHandler()
+        timings, statuses = [], []
+
+        def request(path, query):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                'HTTP_HOST': 'localhost', 'SERVER_NAME': 'localhost', 'wsgi.input': io.BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            started = time.perf_counter()
+            body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(body)
+            body.close()
+            timings.append(time.perf_counter() - started)
+
+        def client(i):
+            for j in range(per_client):
+                request(*targets[(i + j) % len(targets)])
+
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(client, range(clients)))
+        return timings, sum(1 for status in statuses if not status.startswith('200'))
+
+    def _run_asgi(self, targets, clients, per_client):
+        application = ASGIHandler()
+        timings, statuses = [], []
+
+        async def request(path, query):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '', 'headers': [(b'host', b'localhost')],
+                'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Nobody disconnects; Django cancels this once it has answered.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            timings.append(time.perf_counter() - started)
+
+        async def client(i):
+            for j in range(per_client):
+                await request(*targets[(i + j) % len(targets)])
+
+        async def main():
+            await asyncio.gather(*(client(i) for i in range(clients)))
+
+        asyncio.run(main())
+        return timings, sum(1 for status in statuses if status != 200)
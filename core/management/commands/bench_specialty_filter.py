@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.models import Hospital, Specialty
+
+
+def _plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the specialty filter of the hospital API (first page, deep page, count) for the '
+        'most and least offered specialties, and show the query plan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=50)
+
+    def handle(self, *args, **options):
+        settings.RATE_LIMITS = {}
+        specialties = list(Specialty.objects.annotate(n=Count('hospital_links')).order_by('-n'))
+        if not specialties:
+            raise CommandError('No specialties to filter by.')
+        self.stdout.write(f'{Hospital.objects.count()} hospitals, {len(specialties)} specialties')
+
+        client = Client(SERVER_NAME='localhost')
+        url = reverse('api_hospitals')
+        n = options['requests']
+        last_pk = Hospital.objects.order_by('-pk').values_list('pk', flat=True).first()
+        for specialty in (specialties[0], specialties[-1]):
+            matches = Hospital.objects.filter(specialty_links__specialty__key=specialty.key)
+            start = time.perf_counter()
+            for _ in range(n):
+                matches.count()
+            self.stdout.write(
+                f'{specialty.name} ({specialty.n} hospitals)\n'
+                f'  {"count":12} {(time.perf_counter() - start) / n * 1000:8.2f} ms'
+            )
+            for label, after in (('first page', 0), ('deep page', int(last_pk * 0.9))):
+                query = {'specialty': specialty.name, 'limit': options['limit'], 'after': after, 'beds': 0}
+                client.get(url, query)
+                start = time.perf_counter()
+                for _ in range(n):
+                    response = client.get(url, query)
+                self.stdout.write(
+                    f'  {label:12} {(time.perf_counter() - start) / n * 1000:8.2f} ms  '
+                    f'{len(response.json()["results"])} rows'
+                )
+            page = matches.filter(pk__gt=0).order_by('specialty_links__hospital_id')[:options['limit']]
+            self.stdout.write(f'  plan: {_plan(page)}')
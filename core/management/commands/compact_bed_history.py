@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.occupancy import compact
+
+
+class Command(BaseCommand):
+    help = 'Downsample aged bed occupancy chunks and delete expired ones (run daily).'
+
+    def handle(self, *args, **options):
+        for resolution, count in compact().items():
+            self.stdout.write(f'{resolution}s chunks processed: {count}')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORTS, FORMATS, export_queryset, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings, orders or appointments to CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--from', dest='from', help='Start date (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--to', help='End date (YYYY-MM-DD, inclusive)')
+        parser.add_argument('--status')
+        parser.add_argument('--pharmacy', help='Pharmacy id (medicine-orders)')
+        parser.add_argument('--hospital', help='Hospital id (appointments, bed-bookings)')
+        parser.add_argument('--supplier', help='Oxygen supplier id (oxygen-bookings)')
+        parser.add_argument('--output', '-o', help='File to write to (default: stdout)')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        try:
+            queryset = export_queryset(kind, options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        chunks = iter_export(kind, queryset, options['format'])
+        binary = options['format'] == 'ndjson'
+        if options['output']:
+            if binary:
+                fh = open(options['output'], 'wb')
+            else:
+                fh = open(options['output'], 'w', newline='', encoding='utf-8')
+            with fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+        else:
+            # Bytes go to the binary buffer of a real stdout; a text stream
+            # (call_command(stdout=StringIO())) gets them decoded.
+            buffer = getattr(self.stdout._out, 'buffer', None) if binary else None
+            if buffer is not None:
+                self.stdout.flush()
+                for chunk in chunks:
+                    buffer.write(chunk)
+                buffer.flush()
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk.decode() if binary else chunk, ending='')
+                self.stdout.flush()
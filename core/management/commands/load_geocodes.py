@@ -0,0 +1,51 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.delivery import address_key
+from core.models import GeocodedAddress
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Load or update the delivery geocoding table from a CSV with address, latitude and longitude columns.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def _flush(self, rows):
+        GeocodedAddress.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['address', 'latitude', 'longitude', 'updated_at'],
+        )
+
+    def handle(self, *args, **options):
+        loaded = 0
+        rows = []
+        with open(options['path'], newline='', encoding='utf-8') as fh:
+            reader = csv.DictReader(fh)
+            missing = {'address', 'latitude', 'longitude'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f'Missing column(s): {", ".join(sorted(missing))}')
+            for line, row in enumerate(reader, 2):
+                try:
+                    latitude, longitude = float(row['latitude']), float(row['longitude'])
+                except ValueError:
+                    raise CommandError(f'Line {line}: bad coordinates')
+                rows.append(GeocodedAddress(
+                    key=address_key(row['address']),
+                    address=row['address'].strip(),
+                    latitude=latitude,
+                    longitude=longitude,
+                ))
+                if len(rows) == BATCH_SIZE:
+                    self._flush(rows)
+                    loaded += len(rows)
+                    rows = []
+        if rows:
+            self._flush(rows)
+            loaded += len(rows)
+        self.stdout.write(f'Loaded {loaded} address(es).')
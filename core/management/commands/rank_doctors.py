@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.doctor_ranking import BATCH_SIZE, rescore
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every doctor's open slots and search score (run hourly, so the "
+        'availability horizon follows the clock).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        changed = rescore(batch_size=options['batch_size'])
+        self.stdout.write(f'Rescored {changed} doctor(s).')
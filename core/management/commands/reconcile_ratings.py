@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.ratings import BATCH_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount every doctor's and hospital's patient reviews and repair rating totals "
+        'that drifted from them (run nightly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        changed = reconcile(batch_size=options['batch_size'])
+        self.stdout.write(f'Repaired the ratings of {changed} doctor(s) and hospital(s).')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.occupancy import record_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Append the current bed availability to the occupancy history (run every minute).'
+
+    def handle(self, *args, **options):
+        sampled = record_snapshot()
+        self.stdout.write(f'Sampled {sampled} hospital bed series.')
@@ -0,0 +1,49 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs until stopped (or until the queue is empty with --once). '
+        'Set CURA_JOB_WORKER=1 for the web processes so they queue jobs for it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--lease', type=int, default=60, help='Seconds a claimed batch stays leased.')
+        parser.add_argument('--idle-sleep', type=float, default=0.5, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no job is ready.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        succeeded = failed = 0
+        last_requeue = 0
+        while not self.stopping:
+            if time.monotonic() - last_requeue > options['lease'] / 2:
+                requeued = jobs.requeue_expired()
+                if requeued:
+                    self.stdout.write(f'Released {requeued} job(s) with expired leases.')
+                last_requeue = time.monotonic()
+
+            ok, bad = jobs.work(options['batch_size'], options['lease'])
+            succeeded += ok
+            failed += bad
+            if bad:
+                self.stderr.write(f'{bad} job(s) failed and were rescheduled or marked FAILED.')
+            if not ok and not bad:
+                if options['once']:
+                    break
+                time.sleep(options['idle_sleep'])
+
+        self.stdout.write(f'Worker stopped: {succeeded} succeeded, {failed} failed.')
+
+    def stop(self, signum, frame):
+        # Finish the current batch, then exit.
+        self.stopping = True
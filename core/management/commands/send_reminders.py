@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send reminder notifications for upcoming appointments and bookings (run every minute).'
+
+    def handle(self, *args, **options):
+        for (kind, offset), count in send_reminders().items():
+            if count:
+                self.stdout.write(f'{kind} ({offset} min before): {count} reminder(s)')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than settings.IDEMPOTENCY_KEY_TTL_SECONDS (run hourly).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, help='Seconds to keep keys. Defaults to the setting.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = sweep(ttl=options['ttl'], batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} idempotency key(s).')
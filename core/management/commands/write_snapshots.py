@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.snapshots import write_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Write the static copies of the availability pages served in emergency mode (run every few minutes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0, help='Keep rewriting every this many seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            written = write_snapshots()
+            self.stdout.write(f'Wrote {written} snapshots in {time.perf_counter() - started:.2f}s.')
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,191 @@
+"""
+Read-only emergency mode.
+
+``EmergencyFallbackMiddleware`` times the database work of every GET for a
+page in ``core.snapshots`` and notes whether a query failed. Other paths
+(the admin, exports, dashboards) are not sampled, so one slow report cannot
+push the public pages into emergency mode. Over the last
+``EMERGENCY_WINDOW`` such requests that used the database, if the average
+database time passes ``EMERGENCY_DB_LATENCY_MS`` or the share of failed
+requests reaches ``EMERGENCY_ERROR_RATE``, the process enters emergency
+mode for ``EMERGENCY_COOLDOWN_SECONDS``: those pages are answered from their
+snapshots, with a "data as of" banner, without a single query. Once the
+cooldown is over, requests reach the views again and the window starts
+afresh, so a database that is still struggling trips it again within a few
+requests.
+
+A snapshot page whose view fails with a ``DatabaseError`` is answered from
+its snapshot at once, whatever the window says.
+
+The window is per process; every worker makes up its own mind from the
+requests it serves.
+"""
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import NoReverseMatch, reverse
+
+from . import snapshots
+
+
+class DatabaseHealth:
+    """
+    Rolling window of ``(seconds, failed)`` samples, one per request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = deque()
+        self._degraded_until = 0.0
+
+    def degraded(self):
+        return time.monotonic() < self._degraded_until
+
+    def record(self, seconds, failed):
+        window = settings.EMERGENCY_WINDOW
+        with self._lock:
+            self._samples.append((seconds, failed))
+            while len(self._samples) > window:
+                self._samples.popleft()
+            if len(self._samples) < min(window, settings.EMERGENCY_MIN_SAMPLES):
+                return
+            latency = sum(s for s, _ in self._samples) / len(self._samples)
+            errors = sum(1 for _, f in self._samples if f) / len(self._samples)
+            if latency * 1000 > settings.EMERGENCY_DB_LATENCY_MS or errors >= settings.EMERGENCY_ERROR_RATE:
+                self._degraded_until = time.monotonic() + settings.EMERGENCY_COOLDOWN_SECONDS
+                self._samples.clear()
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._degraded_until = 0.0
+
+
+health = DatabaseHealth()
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+        self.failed = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except DatabaseError:
+            self.failed = True
+            raise
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+# The timer of the request being served. A context variable rather than a
+# per-connection wrapper, because async views run their queries on other
+# threads, each with its own connection, and sync_to_async carries the
+# context across.
+_current_timer = ContextVar('emergency_query_timer', default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def _install_timer(sender, connection, **kwargs):
+    # The wrapper list outlives reconnects of the same connection object.
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+class EmergencyFallbackMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._paths = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _page(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if self._paths is None:
+            paths = {}
+            for page in snapshots.PAGES:
+                try:
+                    paths[reverse(page.name)] = page.name
+                except NoReverseMatch:
+                    pass
+            self._paths = paths
+        return self._paths.get(request.path)
+
+    def _before(self, request):
+        page = self._page(request)
+        request._emergency_page = page
+        if page and health.degraded():
+            return snapshots.snapshot_response(page, request)
+        return None
+
+    def _after(self, request, timer):
+        # A failed connect never reaches the wrapper, so the view's
+        # exception counts too.
+        failed = timer.failed or getattr(request, '_emergency_db_error', False)
+        if timer.queries or failed:
+            health.record(timer.seconds, failed)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self._before(request)
+        if response is not None:
+            return response
+        if request._emergency_page is None:
+            return self.get_response(request)
+        # A connection opened before this module was imported has no wrapper.
+        _install_timer(None, connection)
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        self._after(request, timer)
+        return response
+
+    async def __acall__(self, request):
+        response = self._before(request)
+        if response is not None:
+            return response
+        if request._emergency_page is None:
+            return await self.get_response(request)
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        self._after(request, timer)
+        return response
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, DatabaseError):
+            return None
+        request._emergency_db_error = True
+        page = getattr(request, '_emergency_page', None)
+        if page:
+            return snapshots.snapshot_response(page, request)
+        return None
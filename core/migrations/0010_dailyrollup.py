@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_oxygenbooking_payment_option_oxygenbooking_time_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(choices=[('APPOINTMENT', 'Appointments by status'), ('BED_BOOKING', 'Bed bookings by status'), ('OXYGEN_BOOKING', 'Oxygen bookings by status'), ('MEDICINE_ORDER', 'Medicine orders by status'), ('BED_CONFIRMED', 'Confirmed beds per hospital'), ('PHARMACY_REVENUE', 'Orders and revenue per pharmacy'), ('OXYGEN_DELIVERED', 'Cylinders delivered per supplier')], max_length=20)),
+                ('key', models.PositiveBigIntegerField(default=0)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'key', 'day'], name='core_rollup_metric_key_day')],
+                'unique_together': {('metric', 'key', 'status', 'day')},
+            },
+        ),
+    ]
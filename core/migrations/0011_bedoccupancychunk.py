@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BedOccupancyChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bed_type', models.CharField(choices=[('ICU', 'ICU'), ('GENERAL', 'General'), ('EMERGENCY', 'Emergency')], max_length=20)),
+                ('resolution', models.PositiveIntegerField(help_text='Seconds per sample slot')),
+                ('start', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_chunks', to='core.hospital')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hospital', 'bed_type', 'start'], name='core_occupancy_series')],
+                'unique_together': {('resolution', 'start', 'hospital', 'bed_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_bedoccupancychunk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('BED', 'Hospital beds'), ('OXYGEN', 'Oxygen cylinders'), ('MEDICINE', 'Medicine stock')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('field', models.CharField(max_length=30)),
+                ('value', models.PositiveIntegerField()),
+                ('seq', models.BigIntegerField()),
+            ],
+            options={
+                'unique_together': {('resource', 'object_id', 'field')},
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryLedgerEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource', models.CharField(choices=[('BED', 'Hospital beds'), ('OXYGEN', 'Oxygen cylinders'), ('MEDICINE', 'Medicine stock')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('field', models.CharField(max_length=30)),
+                ('delta', models.IntegerField()),
+                ('value_after', models.PositiveIntegerField()),
+                ('reason', models.CharField(choices=[('CREATED', 'Created'), ('EDITED', 'Edited directly'), ('DELETED', 'Deleted'), ('BED_BOOKING', 'Bed booking confirmed'), ('OXYGEN_BOOKING', 'Oxygen booking confirmed'), ('MEDICINE_ORDER', 'Medicine ordered')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'object_id', 'seq'], name='core_ledger_object_seq'), models.Index(fields=['created_at'], name='core_ledger_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-19 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('offset_minutes', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('time_slot', models.TimeField()),
+                ('last_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time_slot'], name='core_appointment_start'),
+        ),
+        migrations.AddIndex(
+            model_name='bedbooking',
+            index=models.Index(fields=['booking_date', 'time_slot'], name='core_bedbooking_start'),
+        ),
+        migrations.AddIndex(
+            model_name='oxygenbooking',
+            index=models.Index(fields=['scheduled_date', 'time_slot'], name='core_oxygenbooking_start'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='remindercursor',
+            unique_together={('kind', 'offset_minutes')},
+        ),
+    ]
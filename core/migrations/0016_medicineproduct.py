@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_notification_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('brand', models.CharField(blank=True, max_length=255)),
+                ('form', models.CharField(blank=True, help_text='e.g. Tablet, Syrup, Injection', max_length=50)),
+                ('strength', models.CharField(blank=True, help_text='e.g. 500 mg, 5 mg/ml', max_length=50)),
+                ('image_url', models.URLField(blank=True, help_text='Optional image for advanced medicine cards')),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(
+                        django.db.models.functions.text.Lower('name'),
+                        django.db.models.functions.text.Lower('brand'),
+                        django.db.models.functions.text.Lower('form'),
+                        django.db.models.functions.text.Lower('strength'),
+                        name='core_medicineproduct_unique',
+                    ),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='medicine',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='listings', to='core.medicineproduct'),
+        ),
+    ]
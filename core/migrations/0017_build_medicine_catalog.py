@@ -0,0 +1,60 @@
+from django.db import migrations
+
+DETAILS = ('name', 'brand', 'form', 'strength')
+BATCH_SIZE = 2000
+
+
+def _clean(value):
+    return ' '.join((value or '').split())
+
+
+def build_catalog(apps, schema_editor):
+    """
+    Create one MedicineProduct per distinct (name, brand, form, strength),
+    ignoring case and extra whitespace, and point every listing at it.
+    """
+    Medicine = apps.get_model('core', 'Medicine')
+    MedicineProduct = apps.get_model('core', 'MedicineProduct')
+
+    products = {}
+    after = 0
+    while True:
+        batch = list(Medicine.objects.filter(pk__gt=after).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        for medicine in batch:
+            key = tuple(_clean(getattr(medicine, field)).casefold() for field in DETAILS)
+            product = products.get(key)
+            if product is None:
+                product = MedicineProduct.objects.create(
+                    description=medicine.description,
+                    image_url=medicine.image_url,
+                    **{field: _clean(getattr(medicine, field)) for field in DETAILS},
+                )
+                products[key] = product
+            elif (not product.description and medicine.description) or (not product.image_url and medicine.image_url):
+                product.description = product.description or medicine.description
+                product.image_url = product.image_url or medicine.image_url
+                product.save(update_fields=['description', 'image_url'])
+            medicine.product_id = product.pk
+        Medicine.objects.bulk_update(batch, ['product'])
+        after = batch[-1].pk
+
+
+def restore_details(apps, schema_editor):
+    Medicine = apps.get_model('core', 'Medicine')
+    for medicine in Medicine.objects.select_related('product').iterator(chunk_size=BATCH_SIZE):
+        for field in DETAILS + ('description', 'image_url'):
+            setattr(medicine, field, getattr(medicine.product, field))
+        medicine.save(update_fields=list(DETAILS) + ['description', 'image_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_medicineproduct'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_catalog, restore_details),
+    ]
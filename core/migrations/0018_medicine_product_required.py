@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_build_medicine_catalog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='medicine',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='listings', to='core.medicineproduct'),
+        ),
+        # Blank first so that reversing can re-add the column before the
+        # data migration refills it.
+        migrations.AlterField(
+            model_name='medicine',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name='medicine',
+            name='brand',
+        ),
+        migrations.RemoveField(
+            model_name='medicine',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='medicine',
+            name='form',
+        ),
+        migrations.RemoveField(
+            model_name='medicine',
+            name='image_url',
+        ),
+        migrations.RemoveField(
+            model_name='medicine',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='medicine',
+            name='strength',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_medicine_product_required'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OxygenAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('capacity_litres', models.PositiveIntegerField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='oxygenbooking',
+            name='reserved',
+            field=models.BooleanField(default=False, help_text='Cylinders were taken from stock when booked'),
+        ),
+        migrations.AddIndex(
+            model_name='oxygencylinderstock',
+            index=models.Index(fields=['capacity_litres', 'price_per_cylinder'], name='core_oxygenstock_capacity'),
+        ),
+        migrations.AddField(
+            model_name='oxygenallocation',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='oxygen_allocations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='oxygenbooking',
+            name='allocation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='core.oxygenallocation'),
+        ),
+    ]
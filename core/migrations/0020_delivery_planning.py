@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_oxygen_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodedAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('address', models.TextField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='oxygensupplier',
+            name='delivery_vehicles',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='oxygensupplier',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text='Depot location for delivery routes', null=True),
+        ),
+        migrations.AddField(
+            model_name='oxygensupplier',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='oxygensupplier',
+            name='vehicle_capacity',
+            field=models.PositiveIntegerField(default=20, help_text='Cylinders one vehicle carries per trip'),
+        ),
+    ]
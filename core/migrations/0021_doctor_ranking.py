@@ -0,0 +1,107 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:05
+
+import datetime
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+# A frozen copy of core.doctor_ranking and its settings as of this
+# migration, so later changes to either cannot alter it. manage.py
+# rank_doctors rescores everyone with the current formula.
+ACTIVE_APPOINTMENTS = ('PENDING', 'CONFIRMED')
+WEIGHTS = {'rating': 0.4, 'experience': 0.2, 'fee': 0.15, 'availability': 0.25}
+EXPERIENCE_CAP = 30
+FEE_CAP = 2000
+HORIZON_DAYS = 3
+SLOT_MINUTES = 30
+
+
+def daily_slots(doctor):
+    start = doctor.available_from.hour * 60 + doctor.available_from.minute
+    end = doctor.available_to.hour * 60 + doctor.available_to.minute
+    if end <= start:
+        end += 24 * 60
+    return (end - start) // SLOT_MINUTES
+
+
+def score(doctor, open_slots):
+    capacity = daily_slots(doctor) * HORIZON_DAYS
+    return round(
+        WEIGHTS['rating'] * float(doctor.rating) / 5
+        + WEIGHTS['experience'] * min(doctor.experience_years, EXPERIENCE_CAP) / EXPERIENCE_CAP
+        + WEIGHTS['fee'] * (1 - min(float(doctor.consultation_fee), FEE_CAP) / FEE_CAP)
+        + WEIGHTS['availability'] * (open_slots / capacity if capacity else 0),
+        6,
+    )
+
+
+def rank_doctors(apps, schema_editor):
+    Doctor = apps.get_model('core', 'Doctor')
+    Appointment = apps.get_model('core', 'Appointment')
+    today = timezone.localdate()
+    horizon = today + datetime.timedelta(days=HORIZON_DAYS)
+
+    after = 0
+    while True:
+        batch = list(Doctor.objects.filter(pk__gt=after).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        booked = dict(
+            Appointment.objects.filter(
+                doctor_id__in=[doctor.pk for doctor in batch],
+                date__gte=today, date__lt=horizon, status__in=ACTIVE_APPOINTMENTS,
+            )
+            .values('doctor_id')
+            .annotate(n=models.Count('pk'))
+            .values_list('doctor_id', 'n')
+        )
+        for doctor in batch:
+            capacity = daily_slots(doctor) * HORIZON_DAYS
+            doctor.open_slots = max(0, capacity - booked.get(doctor.pk, 0))
+            doctor.rank_score = score(doctor, doctor.open_slots)
+        Doctor.objects.bulk_update(batch, ['open_slots', 'rank_score'])
+        after = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_delivery_planning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='open_slots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rank_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(models.F('speciality'), django.db.models.functions.text.Lower('city'), models.OrderBy(models.F('rank_score'), descending=True), models.F('id'), condition=models.Q(('is_active', True)), name='core_doctor_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(models.OrderBy(models.F('rank_score'), descending=True), models.F('id'), condition=models.Q(('is_active', True)), name='core_doctor_rank_all'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(models.F('speciality'), django.db.models.functions.text.Lower('city'), models.OrderBy(models.F('rating'), descending=True), models.F('id'), condition=models.Q(('is_active', True)), name='core_doctor_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(models.F('speciality'), django.db.models.functions.text.Lower('city'), models.OrderBy(models.F('experience_years'), descending=True), models.F('id'), condition=models.Q(('is_active', True)), name='core_doctor_experience'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(models.F('speciality'), django.db.models.functions.text.Lower('city'), models.F('consultation_fee'), models.F('id'), condition=models.Q(('is_active', True)), name='core_doctor_fee'),
+        ),
+        migrations.RunPython(rank_doctors, migrations.RunPython.noop),
+    ]
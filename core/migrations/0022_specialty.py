@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_doctor_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Specialty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'specialties',
+            },
+        ),
+        migrations.CreateModel(
+            name='HospitalSpecialty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hospital', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='specialty_links', to='core.hospital')),
+                ('specialty', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='hospital_links', to='core.specialty')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='specialties',
+            field=models.ManyToManyField(blank=True, related_name='hospitals', through='core.HospitalSpecialty', to='core.specialty'),
+        ),
+        migrations.AddIndex(
+            model_name='hospitalspecialty',
+            index=models.Index(fields=['specialty', 'hospital'], name='core_hospitalspecialty_lookup'),
+        ),
+        migrations.AddConstraint(
+            model_name='hospitalspecialty',
+            constraint=models.UniqueConstraint(fields=('hospital', 'specialty'), name='core_hospitalspecialty_unique'),
+        ),
+    ]
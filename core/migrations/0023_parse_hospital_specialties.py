@@ -0,0 +1,59 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def _key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def parse_specialties(apps, schema_editor):
+    """
+    Split every hospital's comma-separated ``specialties_offered`` into
+    Specialty rows, one per distinct name ignoring case and extra whitespace,
+    and link them.
+    """
+    Hospital = apps.get_model('core', 'Hospital')
+    Specialty = apps.get_model('core', 'Specialty')
+    HospitalSpecialty = apps.get_model('core', 'HospitalSpecialty')
+
+    specialties = {}
+    after = 0
+    while True:
+        batch = list(
+            Hospital.objects.filter(pk__gt=after).order_by('pk').values_list('pk', 'specialties_offered')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        links = []
+        for hospital_id, text in batch:
+            linked = set()
+            for part in (text or '').split(','):
+                name = ' '.join(part.split())[:100]
+                key = _key(name)[:100]
+                if not key or key in linked:
+                    continue
+                if key not in specialties:
+                    specialties[key] = Specialty.objects.create(name=name, key=key).pk
+                linked.add(key)
+                links.append(HospitalSpecialty(hospital_id=hospital_id, specialty_id=specialties[key]))
+        HospitalSpecialty.objects.bulk_create(links, batch_size=1000)
+        after = batch[-1][0]
+
+
+def join_specialties(apps, schema_editor):
+    Hospital = apps.get_model('core', 'Hospital')
+    for hospital in Hospital.objects.prefetch_related('specialties').iterator(chunk_size=BATCH_SIZE):
+        hospital.specialties_offered = ', '.join(sorted(s.name for s in hospital.specialties.all()))[:255]
+        hospital.save(update_fields=['specialties_offered'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_specialty'),
+    ]
+
+    operations = [
+        migrations.RunPython(parse_specialties, join_specialties),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:32
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_parse_hospital_specialties'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='hospital',
+            name='specialties_offered',
+        ),
+    ]
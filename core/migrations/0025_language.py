@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_remove_hospital_specialties_offered'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Language',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DoctorLanguage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doctor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='language_links', to='core.doctor')),
+                ('language', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='doctor_links', to='core.language')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='languages',
+            field=models.ManyToManyField(related_name='doctors', through='core.DoctorLanguage', to='core.language'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorlanguage',
+            index=models.Index(fields=['language', 'doctor'], name='core_doctorlanguage_lookup'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorlanguage',
+            constraint=models.UniqueConstraint(fields=('doctor', 'language'), name='core_doctorlanguage_unique'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+# "English, Hindi", "English/Hindi" and "English; Hindi" all occur.
+SEPARATORS = re.compile(r'[,;/]')
+
+
+def _key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def parse_languages(apps, schema_editor):
+    """
+    Split every doctor's free-text ``languages_spoken`` into Language rows,
+    one per distinct name ignoring case and extra whitespace, and link them.
+    """
+    Doctor = apps.get_model('core', 'Doctor')
+    Language = apps.get_model('core', 'Language')
+    DoctorLanguage = apps.get_model('core', 'DoctorLanguage')
+
+    languages = {}
+    after = 0
+    while True:
+        batch = list(
+            Doctor.objects.filter(pk__gt=after).order_by('pk').values_list('pk', 'languages_spoken')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        links = []
+        for doctor_id, text in batch:
+            linked = set()
+            for part in SEPARATORS.split(text or ''):
+                name = ' '.join(part.split())[:100]
+                key = _key(name)[:100]
+                if not key or key in linked:
+                    continue
+                if key not in languages:
+                    languages[key] = Language.objects.create(name=name, key=key).pk
+                linked.add(key)
+                links.append(DoctorLanguage(doctor_id=doctor_id, language_id=languages[key]))
+        DoctorLanguage.objects.bulk_create(links, batch_size=1000)
+        after = batch[-1][0]
+
+
+def join_languages(apps, schema_editor):
+    Doctor = apps.get_model('core', 'Doctor')
+    for doctor in Doctor.objects.prefetch_related('languages').iterator(chunk_size=BATCH_SIZE):
+        doctor.languages_spoken = ', '.join(sorted(l.name for l in doctor.languages.all()))[:255]
+        doctor.save(update_fields=['languages_spoken'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_language'),
+    ]
+
+    operations = [
+        migrations.RunPython(parse_languages, join_languages),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_parse_doctor_languages'),
+    ]
+
+    operations = [
+        # Blank first so that reversing can re-add the column before the
+        # data migration refills it.
+        migrations.AlterField(
+            model_name='doctor',
+            name='languages_spoken',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name='doctor',
+            name='languages_spoken',
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_remove_doctor_languages_spoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.PositiveSmallIntegerField(choices=[(1, '1 / 5'), (2, '2 / 5'), (3, '3 / 5'), (4, '4 / 5'), (5, '5 / 5')])),
+                ('comment', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='rating',
+            field=models.DecimalField(decimal_places=1, default=4.5, help_text='Average patient rating out of 5; set by hand until the first review', max_digits=2),
+        ),
+        migrations.AlterField(
+            model_name='hospital',
+            name='rating',
+            field=models.DecimalField(decimal_places=1, default=3.0, help_text='Average patient rating out of 5; set by hand until the first review', max_digits=2),
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(fields=['rating', 'id'], name='core_hospital_rating'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='appointment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='review', to='core.appointment'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='bed_booking',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='review', to='core.bedbooking'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='doctor',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.doctor'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='hospital',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.hospital'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('appointment__isnull', False), ('bed_booking__isnull', True)), models.Q(('appointment__isnull', True), ('bed_booking__isnull', False)), _connector='OR'), name='core_review_one_booking'),
+        ),
+    ]
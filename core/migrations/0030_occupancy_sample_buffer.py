@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BedOccupancySample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bed_type', models.CharField(choices=[('ICU', 'ICU'), ('GENERAL', 'General'), ('EMERGENCY', 'Emergency')], max_length=20)),
+                ('start', models.DateTimeField(help_text='Start of the chunk the sample belongs to')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('available_beds', models.PositiveIntegerField()),
+                ('total_beds', models.PositiveIntegerField()),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_samples', to='core.hospital')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start', 'hospital', 'bed_type'], name='core_occupancy_buffer')],
+            },
+        ),
+    ]
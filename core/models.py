@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
@@ -20,6 +21,30 @@ class UserProfile(models.Model):
         return f'{self.user.username} ({self.role})'
 
 
+class Specialty(models.Model):
+    """
+    A medical specialty hospitals offer, looked up by ``key`` (the name
+    casefolded, with whitespace collapsed).
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'specialties'
+
+    @staticmethod
+    def key_for(name):
+        return ' '.join(name.split()).casefold()
+
+    def save(self, *args, **kwargs):
+        self.name = ' '.join(self.name.split())
+        self.key = self.key_for(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
 class Hospital(models.Model):
     name = models.CharField(max_length=255)
     address = models.TextField()
@@ -40,19 +65,49 @@ class Hospital(models.Model):
         blank=True,
         help_text="Optional hero/cover image shown on the hospital detail page",
     )
-    rating = models.DecimalField(max_digits=2, decimal_places=1, default=3.0)
+    rating = models.DecimalField(
+        max_digits=2,
+        decimal_places=1,
+        default=3.0,
+        help_text="Average patient rating out of 5; set by hand until the first review",
+    )
+    # Running totals of patient reviews, maintained by core.ratings.
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
     contact_phone = models.CharField(max_length=20)
     emergency_contact = models.CharField(max_length=20)
     support_24_7 = models.BooleanField(default=True)
-    specialties_offered = models.CharField(
-        max_length=255,
-        blank=True,
-        help_text="Comma-separated list of key specialties (Cardiology, Neurology, etc.)",
-    )
+    specialties = models.ManyToManyField(Specialty, through='HospitalSpecialty', blank=True, related_name='hospitals')
+
+    class Meta:
+        # Backs the min_rating filters of the hospital listings.
+        indexes = [models.Index(fields=['rating', 'id'], name='core_hospital_rating')]
 
     def __str__(self):
         return self.name
 
+    @property
+    def specialties_offered(self):
+        # Prefetch ``specialties`` when listing many hospitals.
+        return ', '.join(sorted(specialty.name for specialty in self.specialties.all()))
+
+
+class HospitalSpecialty(models.Model):
+    # Both composite keys are indexed: a hospital's specialties, and the
+    # hospitals offering a specialty in id order, so a filtered page of
+    # hospitals reads just that many index entries.
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='specialty_links', db_index=False)
+    specialty = models.ForeignKey(Specialty, on_delete=models.CASCADE, related_name='hospital_links', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hospital', 'specialty'], name='core_hospitalspecialty_unique'),
+        ]
+        indexes = [models.Index(fields=['specialty', 'hospital'], name='core_hospitalspecialty_lookup')]
+
+    def __str__(self):
+        return f'{self.hospital} - {self.specialty}'
+
 
 class HospitalBed(models.Model):
     BED_TYPE_CHOICES = [
@@ -69,6 +124,24 @@ class HospitalBed(models.Model):
         return f'{self.hospital.name} - {self.bed_type}'
 
 
+class Language(models.Model):
+    """
+    A language doctors consult in, looked up by ``key`` like ``Specialty``.
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    key_for = staticmethod(Specialty.key_for)
+
+    def save(self, *args, **kwargs):
+        self.name = ' '.join(self.name.split())
+        self.key = self.key_for(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
 class Doctor(models.Model):
     SPECIALITY_CHOICES = [
         ('Cardiology', 'Cardiology'),
@@ -90,17 +163,71 @@ class Doctor(models.Model):
         max_digits=2,
         decimal_places=1,
         default=4.5,
-        help_text="Average patient rating out of 5",
+        help_text="Average patient rating out of 5; set by hand until the first review",
     )
     available_from = models.TimeField()
     available_to = models.TimeField()
-    languages_spoken = models.CharField(max_length=255)
+    languages = models.ManyToManyField(Language, through='DoctorLanguage', related_name='doctors')
     city = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
+    # Maintained by core.doctor_ranking: free slots in the ranking horizon
+    # and the search score built from them and the fields above.
+    open_slots = models.PositiveIntegerField(default=0, editable=False)
+    rank_score = models.FloatField(default=0, editable=False)
+    # Running totals of patient reviews, maintained by core.ratings.
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # One index per search sort, each over the exact speciality + city
+        # filter, so a page of results is a bounded index scan.
+        indexes = [
+            models.Index(
+                'speciality', Lower('city'), models.F('rank_score').desc(), 'id',
+                condition=models.Q(is_active=True), name='core_doctor_rank',
+            ),
+            models.Index(
+                models.F('rank_score').desc(), 'id',
+                condition=models.Q(is_active=True), name='core_doctor_rank_all',
+            ),
+            models.Index(
+                'speciality', Lower('city'), models.F('rating').desc(), 'id',
+                condition=models.Q(is_active=True), name='core_doctor_rating',
+            ),
+            models.Index(
+                'speciality', Lower('city'), models.F('experience_years').desc(), 'id',
+                condition=models.Q(is_active=True), name='core_doctor_experience',
+            ),
+            models.Index(
+                'speciality', Lower('city'), 'consultation_fee', 'id',
+                condition=models.Q(is_active=True), name='core_doctor_fee',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.speciality}'
 
+    @property
+    def languages_spoken(self):
+        # Prefetch ``languages`` when listing many doctors.
+        return ', '.join(sorted(language.name for language in self.languages.all()))
+
+
+class DoctorLanguage(models.Model):
+    # Indexed both ways like HospitalSpecialty: a doctor's languages (which
+    # the ranked search probes per candidate) and a language's doctors.
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='language_links', db_index=False)
+    language = models.ForeignKey(Language, on_delete=models.CASCADE, related_name='doctor_links', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'language'], name='core_doctorlanguage_unique'),
+        ]
+        indexes = [models.Index(fields=['language', 'doctor'], name='core_doctorlanguage_lookup')]
+
+    def __str__(self):
+        return f'{self.doctor} - {self.language}'
+
 
 class Appointment(models.Model):
     STATUS_CHOICES = [
@@ -115,6 +242,9 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['date', 'time_slot'], name='core_appointment_start')]
+
     def __str__(self):
         return f'Appointment with {self.doctor} on {self.date}'
 
@@ -125,6 +255,10 @@ class OxygenSupplier(models.Model):
     city = models.CharField(max_length=100)
     contact_phone = models.CharField(max_length=20)
     delivery_available = models.BooleanField(default=True)
+    latitude = models.FloatField(null=True, blank=True, help_text="Depot location for delivery routes")
+    longitude = models.FloatField(null=True, blank=True)
+    delivery_vehicles = models.PositiveIntegerField(default=1)
+    vehicle_capacity = models.PositiveIntegerField(default=20, help_text="Cylinders one vehicle carries per trip")
 
     def __str__(self):
         return self.name
@@ -136,10 +270,30 @@ class OxygenCylinderStock(models.Model):
     price_per_cylinder = models.DecimalField(max_digits=8, decimal_places=2)
     available_cylinders = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['capacity_litres', 'price_per_cylinder'], name='core_oxygenstock_capacity'),
+        ]
+
     def __str__(self):
         return f'{self.supplier.name} - {self.capacity_litres}L'
 
 
+class OxygenAllocation(models.Model):
+    """
+    A request for more cylinders than one supplier had, booked as one
+    ``OxygenBooking`` per supplier stock (see core.oxygen_allocation).
+    """
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='oxygen_allocations')
+    city = models.CharField(max_length=100)
+    capacity_litres = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.capacity_litres}L for {self.patient} in {self.city}'
+
+
 class OxygenBooking(models.Model):
     PAYMENT_CHOICES = [
         ('CASH', 'Cash on Delivery / Pickup'),
@@ -160,8 +314,15 @@ class OxygenBooking(models.Model):
     time_slot = models.TimeField(help_text="Expected delivery/pickup time", null=True, blank=True)
     payment_option = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='CASH')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    allocation = models.ForeignKey(
+        OxygenAllocation, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings',
+    )
+    reserved = models.BooleanField(default=False, help_text="Cylinders were taken from stock when booked")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['scheduled_date', 'time_slot'], name='core_oxygenbooking_start')]
+
     def __str__(self):
         return f'Oxygen Booking #{self.id} for {self.patient.username} - {self.stock.capacity_litres}L from {self.stock.supplier.name}'
 
@@ -177,9 +338,11 @@ class Pharmacy(models.Model):
         return self.name
 
 
-class Medicine(models.Model):
-    pharmacy = models.ForeignKey(Pharmacy, on_delete=models.CASCADE, related_name='medicines')
-    name = models.CharField(max_length=255)
+class MedicineProduct(models.Model):
+    """
+    Canonical catalog entry for a medicine, shared by every pharmacy stocking it.
+    """
+    name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True)
     brand = models.CharField(max_length=255, blank=True)
     form = models.CharField(
@@ -192,6 +355,33 @@ class Medicine(models.Model):
         blank=True,
         help_text="e.g. 500 mg, 5 mg/ml",
     )
+    image_url = models.URLField(
+        blank=True,
+        help_text="Optional image for advanced medicine cards",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                Lower('name'), Lower('brand'), Lower('form'), Lower('strength'),
+                name='core_medicineproduct_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return ' '.join(part for part in (self.name, self.strength, self.form) if part)
+
+
+def _product_detail(field):
+    return property(lambda self: getattr(self.product, field))
+
+
+class Medicine(models.Model):
+    """
+    One pharmacy's listing of a catalog product: its own price, pack and stock.
+    """
+    pharmacy = models.ForeignKey(Pharmacy, on_delete=models.CASCADE, related_name='medicines')
+    product = models.ForeignKey(MedicineProduct, on_delete=models.PROTECT, related_name='listings')
     pack_size = models.PositiveIntegerField(
         default=1,
         help_text="Number of units (e.g. tablets) per pack",
@@ -199,10 +389,14 @@ class Medicine(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     stock = models.PositiveIntegerField()
     is_essential = models.BooleanField(default=True)
-    image_url = models.URLField(
-        blank=True,
-        help_text="Optional image for advanced medicine cards",
-    )
+
+    # Catalog details, read through ``product`` (select_related it in lists).
+    name = _product_detail('name')
+    description = _product_detail('description')
+    brand = _product_detail('brand')
+    form = _product_detail('form')
+    strength = _product_detail('strength')
+    image_url = _product_detail('image_url')
 
     def __str__(self):
         return f'{self.name} ({self.pharmacy.name})'
@@ -315,10 +509,36 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='core_notification_recent'),
+            models.Index(fields=['is_read', 'created_at'], name='core_notification_retention'),
+        ]
+
     def __str__(self):
         return f'Notification for {self.user.username}'
 
 
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of ``Notification`` by ``core.retention``.
+
+    With digests enabled one row stands for ``count`` notifications of one
+    type received by a user on one day, and keeps the latest message.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_notifications')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPE_CHOICES)
+    message = models.TextField()
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at'], name='core_notification_archive')]
+
+    def __str__(self):
+        return f'Archived notification for {self.user.username}'
+
+
 class BedBooking(models.Model):
     PAYMENT_CHOICES = [
         ('CASH', 'Cash at Hospital'),
@@ -338,5 +558,294 @@ class BedBooking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['booking_date', 'time_slot'], name='core_bedbooking_start')]
+
     def __str__(self):
         return f'Bed Booking #{self.id} for {self.patient.username} at {self.hospital_bed.hospital.name}'
+
+
+class Review(models.Model):
+    """
+    A patient's rating of the doctor they saw (``appointment``) or the
+    hospital they stayed at (``bed_booking``), once that has taken place.
+
+    ``doctor`` and ``hospital`` are copied from the booking on save, so the
+    running totals in ``core.ratings`` can be recounted per doctor or
+    hospital from an index.
+    """
+    RATING_CHOICES = [(stars, f'{stars} / 5') for stars in range(1, 6)]
+
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')
+    appointment = models.OneToOneField(
+        Appointment, null=True, blank=True, on_delete=models.CASCADE, related_name='review',
+    )
+    bed_booking = models.OneToOneField(
+        BedBooking, null=True, blank=True, on_delete=models.CASCADE, related_name='review',
+    )
+    doctor = models.ForeignKey(
+        Doctor, null=True, blank=True, editable=False, on_delete=models.CASCADE, related_name='reviews',
+    )
+    hospital = models.ForeignKey(
+        Hospital, null=True, blank=True, editable=False, on_delete=models.CASCADE, related_name='reviews',
+    )
+    rating = models.PositiveSmallIntegerField(choices=RATING_CHOICES)
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(appointment__isnull=False, bed_booking__isnull=True)
+                | models.Q(appointment__isnull=True, bed_booking__isnull=False),
+                name='core_review_one_booking',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.appointment_id:
+            self.doctor_id = Appointment.objects.values_list('doctor_id', flat=True).get(pk=self.appointment_id)
+            self.hospital_id = None
+        elif self.bed_booking_id:
+            self.hospital_id = BedBooking.objects.values_list('hospital_bed__hospital_id', flat=True).get(
+                pk=self.bed_booking_id,
+            )
+            self.doctor_id = None
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.rating}/5 from {self.patient} for {self.doctor or self.hospital}'
+
+
+class DailyRollup(models.Model):
+    """
+    Pre-aggregated per-day counters for operational reports.
+
+    Rows are kept current by the status-change hooks in ``core.rollups`` and
+    can be rebuilt with ``manage.py backfill_rollups``. ``key`` is the
+    hospital/pharmacy/supplier id for per-entity metrics and 0 otherwise.
+    """
+    METRIC_CHOICES = [
+        ('APPOINTMENT', 'Appointments by status'),
+        ('BED_BOOKING', 'Bed bookings by status'),
+        ('OXYGEN_BOOKING', 'Oxygen bookings by status'),
+        ('MEDICINE_ORDER', 'Medicine orders by status'),
+        ('BED_CONFIRMED', 'Confirmed beds per hospital'),
+        ('PHARMACY_REVENUE', 'Orders and revenue per pharmacy'),
+        ('OXYGEN_DELIVERED', 'Cylinders delivered per supplier'),
+    ]
+    day = models.DateField()
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    key = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, blank=True)
+    count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('metric', 'key', 'status', 'day')
+        indexes = [
+            models.Index(fields=['metric', 'key', 'day'], name='core_rollup_metric_key_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.metric} {self.day} #{self.key} {self.status}'.strip()
+
+
+class BedOccupancyChunk(models.Model):
+    """
+    A fixed-length block of bed availability samples for one hospital bed type.
+
+    ``data`` is a zlib-compressed pair of little-endian uint16 arrays
+    (available beds, then total beds) with one slot per ``resolution``
+    seconds; see ``core.occupancy`` for the layout and downsampling rules.
+    """
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='occupancy_chunks')
+    bed_type = models.CharField(max_length=20, choices=HospitalBed.BED_TYPE_CHOICES)
+    resolution = models.PositiveIntegerField(help_text="Seconds per sample slot")
+    start = models.DateTimeField()
+    samples = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ('resolution', 'start', 'hospital', 'bed_type')
+        indexes = [
+            models.Index(fields=['hospital', 'bed_type', 'start'], name='core_occupancy_series'),
+        ]
+
+    def __str__(self):
+        return f'{self.hospital_id} {self.bed_type} @{self.resolution}s from {self.start}'
+
+
+class BedOccupancySample(models.Model):
+    """
+    One minute-level availability sample of a chunk that is still open.
+
+    Samples are only ever inserted; ``core.occupancy.seal`` packs them into
+    their ``BedOccupancyChunk`` once its day is over and deletes them.
+    """
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='occupancy_samples')
+    bed_type = models.CharField(max_length=20, choices=HospitalBed.BED_TYPE_CHOICES)
+    start = models.DateTimeField(help_text="Start of the chunk the sample belongs to")
+    slot = models.PositiveSmallIntegerField()
+    available_beds = models.PositiveIntegerField()
+    total_beds = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start', 'hospital', 'bed_type'], name='core_occupancy_buffer'),
+        ]
+
+    def __str__(self):
+        return f'{self.hospital_id} {self.bed_type} slot {self.slot} of {self.start}'
+
+
+class InventoryLedgerEntry(models.Model):
+    """
+    Append-only record of every change to an inventory counter.
+
+    ``seq`` only ever grows, so consumers can poll for "changes since N".
+    Old entries are folded into ``InventoryCheckpoint`` by
+    ``manage.py compact_inventory_ledger``; nothing else deletes or edits them.
+    """
+    RESOURCE_CHOICES = [
+        ('BED', 'Hospital beds'),
+        ('OXYGEN', 'Oxygen cylinders'),
+        ('MEDICINE', 'Medicine stock'),
+    ]
+    REASON_CHOICES = [
+        ('CREATED', 'Created'),
+        ('EDITED', 'Edited directly'),
+        ('DELETED', 'Deleted'),
+        ('BED_BOOKING', 'Bed booking confirmed'),
+        ('OXYGEN_BOOKING', 'Oxygen booking confirmed'),
+        ('MEDICINE_ORDER', 'Medicine ordered'),
+    ]
+    seq = models.BigAutoField(primary_key=True)
+    resource = models.CharField(max_length=10, choices=RESOURCE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=30)
+    delta = models.IntegerField()
+    value_after = models.PositiveIntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'object_id', 'seq'], name='core_ledger_object_seq'),
+            models.Index(fields=['created_at'], name='core_ledger_created'),
+        ]
+
+    def __str__(self):
+        return f'#{self.seq} {self.resource} {self.object_id}.{self.field} {self.delta:+d}'
+
+
+class InventoryCheckpoint(models.Model):
+    """
+    Value of an inventory counter as of ledger entry ``seq`` (inclusive).
+    """
+    resource = models.CharField(max_length=10, choices=InventoryLedgerEntry.RESOURCE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=30)
+    value = models.PositiveIntegerField()
+    seq = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('resource', 'object_id', 'field')
+
+    def __str__(self):
+        return f'{self.resource} {self.object_id}.{self.field} = {self.value} @#{self.seq}'
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by ``manage.py run_worker`` (see ``core.jobs``).
+
+    Lower ``priority`` runs first. Finished jobs are deleted; jobs that run
+    out of attempts stay behind as FAILED.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('FAILED', 'Failed'),
+    ]
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    lease = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at'], name='core_job_ready'),
+            models.Index(fields=['lease'], name='core_job_lease'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class ReminderCursor(models.Model):
+    """
+    How far ``core.reminders`` has got for one kind of booking and offset.
+
+    ``(date, time_slot, last_id)`` is the start time and id of the last row
+    reminded; the next run continues strictly after it.
+    """
+    kind = models.CharField(max_length=20)
+    offset_minutes = models.PositiveIntegerField()
+    date = models.DateField()
+    time_slot = models.TimeField()
+    last_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'offset_minutes')
+
+    def __str__(self):
+        return f'{self.kind} -{self.offset_minutes}m at {self.date} {self.time_slot} #{self.last_id}'
+
+
+class GeocodedAddress(models.Model):
+    """
+    Local geocoding table for delivery planning, keyed by the normalised
+    address (see ``core.delivery.address_key``).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    address = models.TextField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.address} ({self.latitude:.5f}, {self.longitude:.5f})'
+
+
+class IdempotencyKey(models.Model):
+    """
+    A booking or ordering POST run once per key (see ``core.idempotency``).
+
+    ``status_code`` is null while the first request with the key is running;
+    then the row holds its response, replayed to repeats until swept.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', db_index=False)
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.TextField(blank=True)
+    body = models.BinaryField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='core_idempotencykey_unique')]
+        indexes = [models.Index(fields=['created_at'], name='core_idempotencykey_created')]
+
+    def __str__(self):
+        return f'{self.key} for user #{self.user_id} ({self.status_code or "running"})'
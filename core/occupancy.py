@@ -0,0 +1,366 @@
+"""
+Bed occupancy history and short-term forecasting.
+
+History is kept in ``BedOccupancyChunk`` rows, each holding ``SLOTS``
+fixed-interval slots for one hospital/bed type. A chunk's ``data`` is
+``zlib(available[SLOTS] + total[SLOTS])`` as little-endian uint16 with
+``MISSING`` marking empty slots. A minute-resolution day is 5.6 KB raw and
+compresses well because bed counts change rarely between samples.
+
+Samples of ``HospitalBed`` are not written into the chunk of the current day
+as they come, which would decompress and recompress every open chunk each
+minute. They are inserted as ``BedOccupancySample`` rows, and ``seal`` packs
+a day's samples into its chunks once, after the day is over; readers merge
+the open day's samples with the chunks.
+
+Older chunks are downsampled by averaging into coarser chunks (see
+``RETENTION``), which keeps a year of minute-level sampling for thousands of
+hospitals to a manageable SQLite file.
+
+The forecaster needs NumPy; the storage side does not.
+"""
+import sys
+import warnings
+import zlib
+from array import array
+from collections import defaultdict
+from itertools import groupby
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .models import BedOccupancyChunk, BedOccupancySample, HospitalBed
+
+SLOTS = 1440
+MISSING = 0xFFFF
+
+# (resolution in seconds, how long chunks at that resolution are kept). When a
+# chunk ages out it is averaged into the next resolution; the last level is
+# deleted outright.
+RETENTION = [
+    (60, timedelta(days=7)),
+    (900, timedelta(days=90)),
+    (3600, timedelta(days=400)),
+]
+RESOLUTIONS = [resolution for resolution, _ in RETENTION]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _empty():
+    return array('H', [MISSING]) * SLOTS
+
+
+def unpack(chunk):
+    """
+    Return ``(available, total)`` uint16 arrays for a chunk (new or stored).
+    """
+    if not chunk.data:
+        return _empty(), _empty()
+    values = array('H')
+    values.frombytes(zlib.decompress(bytes(chunk.data)))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values[:SLOTS], values[SLOTS:]
+
+
+def pack(chunk, available, total):
+    values = available + total
+    if sys.byteorder == 'big':
+        values.byteswap()
+    chunk.data = zlib.compress(values.tobytes(), 6)
+    chunk.samples = sum(1 for v in available if v != MISSING)
+
+
+def locate(moment, resolution):
+    """
+    Return ``(chunk_start, slot)`` for ``moment`` at ``resolution`` seconds.
+    """
+    seconds = int((moment - _EPOCH).total_seconds())
+    span = resolution * SLOTS
+    start = seconds - seconds % span
+    return _EPOCH + timedelta(seconds=start), (seconds - start) // resolution
+
+
+def _floor(moment, seconds):
+    elapsed = int((moment - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+def _clip(value):
+    return max(0, min(int(value), MISSING - 1))
+
+
+SEAL_BATCH = 500
+
+
+def record_snapshot(moment=None):
+    """
+    Append the current availability of every hospital bed type.
+
+    One read of ``HospitalBed`` and one bulk insert into the sample buffer,
+    after sealing the previous day if this is the first snapshot since it
+    closed. Returns the number of series sampled.
+    """
+    moment = moment or timezone.now()
+    start, slot = locate(moment, RESOLUTIONS[0])
+
+    current = defaultdict(lambda: [0, 0])
+    for hospital_id, bed_type, available, total in HospitalBed.objects.values_list(
+        'hospital_id', 'bed_type', 'available_beds', 'total_beds'
+    ).iterator(chunk_size=5000):
+        entry = current[(hospital_id, bed_type)]
+        entry[0] += available
+        entry[1] += total
+
+    if BedOccupancySample.objects.filter(start__lt=start).exists():
+        seal(start)
+    BedOccupancySample.objects.bulk_create(
+        [
+            BedOccupancySample(
+                hospital_id=hospital_id, bed_type=bed_type, start=start, slot=slot,
+                available_beds=_clip(available), total_beds=_clip(total),
+            )
+            for (hospital_id, bed_type), (available, total) in current.items()
+        ],
+        batch_size=1000,
+    )
+    return len(current)
+
+
+def _seal_batch(start, series):
+    """
+    Write ``{(hospital_id, bed_type): [(slot, available, total)]}`` into the
+    chunks starting at ``start``, merging into chunks that already exist.
+    """
+    resolution = RESOLUTIONS[0]
+    existing = {
+        (c.hospital_id, c.bed_type): c
+        for c in BedOccupancyChunk.objects.filter(
+            resolution=resolution, start=start, hospital_id__in={hospital_id for hospital_id, _ in series},
+        )
+    }
+    created, updated = [], []
+    for (hospital_id, bed_type), samples in series.items():
+        chunk = existing.get((hospital_id, bed_type))
+        if chunk is None:
+            chunk = BedOccupancyChunk(
+                hospital_id=hospital_id, bed_type=bed_type, resolution=resolution, start=start,
+            )
+            created.append(chunk)
+        else:
+            updated.append(chunk)
+        avail_slots, total_slots = unpack(chunk)
+        for slot, available, total in samples:
+            avail_slots[slot] = available
+            total_slots[slot] = total
+        pack(chunk, avail_slots, total_slots)
+    BedOccupancyChunk.objects.bulk_create(created, batch_size=500)
+    BedOccupancyChunk.objects.bulk_update(updated, ['data', 'samples'], batch_size=500)
+
+
+def seal(before):
+    """
+    Pack the buffered samples of chunks starting before ``before`` into
+    their chunks, compressing each chunk once, and delete them from the
+    buffer. One transaction per chunk start; returns the samples packed.
+    """
+    packed = 0
+    starts = (
+        BedOccupancySample.objects.filter(start__lt=before)
+        .order_by('start').values_list('start', flat=True).distinct()
+    )
+    for start in list(starts):
+        with transaction.atomic():
+            rows = (
+                BedOccupancySample.objects.filter(start=start)
+                # A slot sampled twice keeps the later sample.
+                .order_by('hospital_id', 'bed_type', 'pk')
+                .values_list('hospital_id', 'bed_type', 'slot', 'available_beds', 'total_beds')
+                .iterator(chunk_size=5000)
+            )
+            series = {}
+            for key, samples in groupby(rows, key=lambda row: row[:2]):
+                series[key] = [row[2:] for row in samples]
+                if len(series) >= SEAL_BATCH:
+                    _seal_batch(start, series)
+                    series = {}
+            if series:
+                _seal_batch(start, series)
+            packed += BedOccupancySample.objects.filter(start=start).delete()[0]
+    return packed
+
+
+def _average_into(source, target):
+    """
+    Average ``source`` slots into the matching slots of coarser ``target``.
+    """
+    factor = target.resolution // source.resolution
+    offset = int((source.start - target.start).total_seconds()) // target.resolution
+    src_avail, src_total = unpack(source)
+    dst_avail, dst_total = unpack(target)
+    for i in range(SLOTS // factor):
+        block = [j for j in range(i * factor, (i + 1) * factor) if src_avail[j] != MISSING]
+        if not block:
+            continue
+        dst_avail[offset + i] = _clip(round(sum(src_avail[j] for j in block) / len(block)))
+        dst_total[offset + i] = _clip(round(sum(src_total[j] for j in block) / len(block)))
+    pack(target, dst_avail, dst_total)
+
+
+def compact(now=None):
+    """
+    Downsample aged chunks one resolution level and drop expired ones.
+
+    Works one source chunk at a time, so memory is bounded by a chunk or two.
+    Returns ``{resolution: chunks_processed}``.
+    """
+    now = now or timezone.now()
+    # Days left in the buffer when snapshots stopped.
+    seal(locate(now, RESOLUTIONS[0])[0])
+    processed = {}
+    for level, (resolution, keep) in enumerate(RETENTION):
+        span = timedelta(seconds=resolution * SLOTS)
+        aged = BedOccupancyChunk.objects.filter(
+            resolution=resolution, start__lt=now - keep - span,
+        ).order_by('hospital_id', 'bed_type', 'start')
+        if level + 1 == len(RETENTION):
+            processed[resolution], _ = aged.delete()
+            continue
+
+        coarser = RESOLUTIONS[level + 1]
+        count = 0
+        for source in aged.iterator(chunk_size=200):
+            target_start, _ = locate(source.start, coarser)
+            with transaction.atomic():
+                target, _ = BedOccupancyChunk.objects.select_for_update().get_or_create(
+                    hospital_id=source.hospital_id,
+                    bed_type=source.bed_type,
+                    resolution=coarser,
+                    start=target_start,
+                    defaults={'data': b''},
+                )
+                _average_into(source, target)
+                target.save(update_fields=['data', 'samples'])
+                source.delete()
+            count += 1
+        processed[resolution] = count
+    return processed
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError('Occupancy forecasting requires NumPy (pip install numpy).')
+    return numpy
+
+
+def hourly_history(hospital_ids, bed_type, start, end):
+    """
+    Hourly mean occupied beds and latest totals for each hospital.
+
+    Returns ``(hours, occupied, totals)`` where ``occupied`` is an
+    ``len(hospital_ids) x hours`` float matrix with NaN for gaps.
+    """
+    np = _numpy()
+    start = _floor(start, 3600)
+    hours = int((end - start).total_seconds() // 3600)
+    row_of = {hospital_id: i for i, hospital_id in enumerate(hospital_ids)}
+    sums = np.zeros((len(hospital_ids), hours))
+    counts = np.zeros((len(hospital_ids), hours))
+    totals = np.full(len(hospital_ids), np.nan)
+
+    chunks = BedOccupancyChunk.objects.filter(
+        hospital_id__in=hospital_ids,
+        bed_type=bed_type,
+        start__lt=end,
+        start__gte=start - timedelta(seconds=RESOLUTIONS[-1] * SLOTS),
+    ).order_by('start').iterator(chunk_size=200)
+    for chunk in chunks:
+        available, total = unpack(chunk)
+        avail = np.frombuffer(available, dtype=np.uint16).astype(float)
+        tot = np.frombuffer(total, dtype=np.uint16).astype(float)
+        present = avail != MISSING
+        occupied = np.where(present, tot - avail, 0.0)
+
+        slot_hours = (
+            (chunk.start - start).total_seconds() + np.arange(SLOTS) * chunk.resolution
+        ) // 3600
+        keep = present & (slot_hours >= 0) & (slot_hours < hours)
+        if not keep.any():
+            continue
+        row = row_of[chunk.hospital_id]
+        idx = slot_hours[keep].astype(int)
+        np.add.at(sums[row], idx, occupied[keep])
+        np.add.at(counts[row], idx, 1)
+        totals[row] = tot[keep][-1]
+
+    # Days not sealed yet are still in the buffer; the database sums them per hour.
+    buffered = (
+        BedOccupancySample.objects.filter(
+            hospital_id__in=hospital_ids,
+            bed_type=bed_type,
+            start__lt=end,
+            start__gte=start - timedelta(seconds=RESOLUTIONS[0] * SLOTS),
+        )
+        .values('hospital_id', 'start', hour=F('slot') / (3600 // RESOLUTIONS[0]))
+        .annotate(occupied=Sum(F('total_beds') - F('available_beds')), samples=Count('pk'), total=Max('total_beds'))
+        .order_by('start', 'hour')
+    )
+    for entry in buffered:
+        hour = int((entry['start'] - start).total_seconds() // 3600) + entry['hour']
+        if not 0 <= hour < hours:
+            continue
+        row = row_of[entry['hospital_id']]
+        sums[row, hour] += entry['occupied']
+        counts[row, hour] += entry['samples']
+        totals[row] = entry['total']
+
+    with np.errstate(invalid='ignore'):
+        return hours, sums / counts, totals
+
+
+def forecast(hospital_ids, bed_type, now=None, horizon=24, days=7, smoothing=0.85):
+    """
+    Forecast occupied beds for the next ``horizon`` hours.
+
+    All hospitals are forecast at once: an hour-of-day profile averaged over
+    the last ``days`` days, plus the current deviation from that profile
+    decaying by ``smoothing`` per hour. Results are clipped to ``[0, total]``.
+    Returns a ``len(hospital_ids) x horizon`` array (NaN where no history).
+    """
+    np = _numpy()
+    now = now or timezone.now()
+    # Include the current, partial hour as the last column of history.
+    end = _floor(now, 3600) + timedelta(hours=1)
+    hours, occupied, totals = hourly_history(hospital_ids, bed_type, end - timedelta(days=days), end)
+    series = occupied.reshape(len(hospital_ids), days, 24)
+
+    with warnings.catch_warnings():
+        # nanmean warns on all-NaN rows, which is expected for new hospitals.
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        profile = np.nanmean(series, axis=1)
+        recent = occupied[:, -6:]
+        deviation = np.nanmean(recent - profile[:, -6:], axis=1)
+        last_seen = _last_valid(np, occupied)
+    profile = np.where(np.isnan(profile), last_seen[:, None], profile)
+    deviation = np.nan_to_num(deviation)
+
+    # The window is a whole number of days ending where the forecast starts,
+    # so forecast hour h has the hour-of-day of profile column h % 24.
+    decay = smoothing ** np.arange(1, horizon + 1)
+    cols = np.arange(horizon) % 24
+    result = profile[:, cols] + deviation[:, None] * decay[None, :]
+    upper = np.where(np.isnan(totals), np.inf, totals)
+    return np.clip(result, 0, upper[:, None])
+
+
+def _last_valid(np, matrix):
+    mask = ~np.isnan(matrix)
+    idx = np.where(mask.any(axis=1), matrix.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1), 0)
+    values = matrix[np.arange(matrix.shape[0]), idx]
+    return np.where(mask.any(axis=1), values, np.nan)
+
@@ -0,0 +1,125 @@
+"""
+Split an oxygen request across suppliers when one stock cannot cover it.
+
+Candidates are stocks of the requested cylinder size from suppliers in the
+same city (only those that deliver, when delivery is needed), taken
+cheapest first and, at equal price, largest first so the request is split
+as few ways as possible. Buying cylinders at a per-cylinder price, filling
+from the cheapest stock up is the cheapest split. A stock the patient
+picked is used first.
+
+``plan`` previews a split without touching stock. ``allocate`` plans,
+then books every part in one transaction that starts by writing, so
+SQLite takes its write lock up front. Cylinders are taken with the
+conditional update in ``inventory.adjust``: when another booking got to a
+stock first, what is left there is taken and the shortfall is made up from
+the next candidates, so concurrent requests neither oversell nor give up
+while cylinders remain. If the city runs out, nothing is booked.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+
+from . import inventory
+from .models import OxygenAllocation, OxygenBooking, OxygenCylinderStock
+
+Part = namedtuple('Part', 'stock quantity')
+
+
+def candidates(city, capacity_litres, delivery=False):
+    stocks = OxygenCylinderStock.objects.filter(
+        supplier__city__iexact=city,
+        capacity_litres=capacity_litres,
+        available_cylinders__gt=0,
+    ).select_related('supplier')
+    if delivery:
+        stocks = stocks.filter(supplier__delivery_available=True)
+    return stocks.order_by('price_per_cylinder', '-available_cylinders', '-supplier__delivery_available', 'pk')
+
+
+def _walk(city, capacity_litres, delivery, prefer):
+    stocks = candidates(city, capacity_litres, delivery)
+    if prefer is not None:
+        yield from stocks.filter(pk=prefer.pk)
+        stocks = stocks.exclude(pk=prefer.pk)
+    yield from stocks.iterator(chunk_size=100)
+
+
+def plan(city, capacity_litres, quantity, delivery=False, prefer=None):
+    """
+    Parts covering ``quantity`` cylinders, or None if the city cannot.
+    """
+    parts = []
+    needed = quantity
+    for stock in _walk(city, capacity_litres, delivery, prefer):
+        take = min(needed, stock.available_cylinders)
+        parts.append(Part(stock, take))
+        needed -= take
+        if not needed:
+            return parts
+    return None
+
+
+def _take(stock, wanted, user):
+    """
+    Take up to ``wanted`` cylinders from ``stock``; returns how many.
+    """
+    while wanted and stock.available_cylinders:
+        take = min(wanted, stock.available_cylinders)
+        if inventory.adjust(stock, 'available_cylinders', -take, 'OXYGEN_BOOKING', user=user):
+            return take
+        stock.refresh_from_db(fields=['available_cylinders'])
+    return 0
+
+
+@transaction.atomic
+def _book(patient, city, capacity_litres, quantity, details, delivery, parts):
+    booked = []
+    needed = quantity
+    for part in parts:
+        taken = _take(part.stock, min(part.quantity, needed), patient)
+        if taken:
+            booked.append(Part(part.stock, taken))
+            needed -= taken
+    if needed:
+        tried = [part.stock.pk for part in parts]
+        for stock in candidates(city, capacity_litres, delivery).exclude(pk__in=tried).iterator(chunk_size=100):
+            taken = _take(stock, needed, patient)
+            if taken:
+                booked.append(Part(stock, taken))
+                needed -= taken
+            if not needed:
+                break
+    if needed:
+        transaction.set_rollback(True)
+        return None
+
+    allocation = OxygenAllocation.objects.create(
+        patient=patient, city=city, capacity_litres=capacity_litres, quantity=quantity,
+    )
+    for part in booked:
+        # Saved one by one so the daily rollups see each booking.
+        OxygenBooking.objects.create(
+            patient=patient,
+            stock=part.stock,
+            quantity=part.quantity,
+            allocation=allocation,
+            reserved=True,
+            **details,
+        )
+    return allocation
+
+
+def allocate(patient, city, capacity_litres, quantity, details, delivery=False, prefer=None):
+    """
+    Book ``quantity`` cylinders as one reserved ``OxygenBooking`` per stock.
+    Returns the ``OxygenAllocation``, or None (having booked nothing) if
+    the city's suppliers cannot cover the request.
+
+    ``details`` holds the remaining ``OxygenBooking`` fields (address,
+    date, time slot, payment option).
+    """
+    parts = plan(city, capacity_litres, quantity, delivery, prefer)
+    if parts is None:
+        return None
+    return _book(patient, city, capacity_litres, quantity, details, delivery, parts)
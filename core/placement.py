@@ -0,0 +1,177 @@
+"""
+Bed placement recommendations: a ranked shortlist of hospitals in a city
+for a bed type and, optionally, a specialty.
+
+Each process keeps a candidate index per city in memory. For every bed type
+it holds the hospitals with free beds, sorted by a base score that mixes
+available beds (saturating, so 40 free beds do not outrank a better hospital
+with 8), ``Hospital.rating`` and ``support_24_7``, plus the same list split
+by specialty. A query adds the specialty weight to matching hospitals by
+merging the two sorted lists, so it only looks at about ``limit`` entries.
+
+Every change bumps the city's scope in ``core.caching``; processes compare
+it at most every ``PLACEMENT_REFRESH_SECONDS`` and rebuild just that city
+with one query. Bed counter changes made by this process also patch its
+index as soon as they commit, so the writer serves its own change at once.
+The patched index keeps the version it was built at and is rebuilt at the
+next check: ``bump_scopes`` is not atomic, so the version after a bump does
+not tell whether another process changed the city at the same time.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+
+from .caching import bump_scopes, scope_versions
+from .models import HospitalBed, HospitalSpecialty, Specialty
+
+Candidate = namedtuple(
+    'Candidate',
+    'score hospital_id name address emergency_contact rating support_24_7 specialties available_beds total_beds',
+)
+
+# Free beds at which the availability term reaches about two thirds.
+AVAILABILITY_SCALE = 5
+
+
+def city_key(city):
+    return ' '.join(city.split()).casefold()
+
+
+def city_scope(city):
+    return f'city:{city_key(city)}'
+
+
+def base_score(available_beds, rating, support_24_7):
+    weights = settings.PLACEMENT_WEIGHTS
+    return (
+        weights['availability'] * (1 - math.exp(-available_beds / AVAILABILITY_SCALE))
+        + weights['rating'] * float(rating) / 5
+        + weights['support_24_7'] * bool(support_24_7)
+    )
+
+
+def _rank(candidates):
+    return sorted(candidates, key=lambda c: (-c.score, c.hospital_id))
+
+
+class _CityIndex:
+    def __init__(self, version, rows, specialties):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.beds = {}
+        for row in rows:
+            candidate = Candidate(
+                base_score(row['available_beds'], row['hospital__rating'], row['hospital__support_24_7']),
+                row['hospital_id'],
+                row['hospital__name'],
+                row['hospital__address'],
+                row['hospital__emergency_contact'],
+                row['hospital__rating'],
+                row['hospital__support_24_7'],
+                specialties.get(row['hospital_id'], frozenset()),
+                row['available_beds'],
+                row['total_beds'],
+            )
+            self.beds.setdefault(row['bed_type'], {})[row['hospital_id']] = candidate
+        self.ranked = {}
+        self.by_specialty = {}
+        for bed_type in self.beds:
+            self._index(bed_type)
+
+    def _index(self, bed_type):
+        ranked = _rank(c for c in self.beds[bed_type].values() if c.available_beds > 0)
+        by_specialty = {}
+        for candidate in ranked:
+            for specialty in candidate.specialties:
+                by_specialty.setdefault(specialty, []).append(candidate)
+        # Readers may be iterating the old lists; swap in whole new ones.
+        self.ranked[bed_type] = ranked
+        self.by_specialty[bed_type] = by_specialty
+
+    def patch(self, hospital_id, bed_type, available_beds, total_beds):
+        candidate = self.beds.get(bed_type, {}).get(hospital_id)
+        if candidate is None:
+            return False
+        self.beds[bed_type][hospital_id] = candidate._replace(
+            score=base_score(available_beds, candidate.rating, candidate.support_24_7),
+            available_beds=available_beds,
+            total_beds=total_beds,
+        )
+        self._index(bed_type)
+        return True
+
+    def top(self, bed_type, specialty, limit):
+        ranked = self.ranked.get(bed_type, [])
+        if not specialty:
+            return [(candidate, False) for candidate in ranked[:limit]]
+        bonus = settings.PLACEMENT_WEIGHTS['specialty']
+        matching = ((-(c.score + bonus), c.hospital_id, c, True) for c in self.by_specialty.get(bed_type, {}).get(specialty, []))
+        others = ((-c.score, c.hospital_id, c, False) for c in ranked if specialty not in c.specialties)
+        return [(c, matched) for _, _, c, matched in islice(merge(matching, others), limit)]
+
+
+_cities = {}
+_lock = threading.Lock()
+
+
+def _load(city, version):
+    rows = HospitalBed.objects.filter(hospital__city__iexact=city).values(
+        'hospital_id', 'bed_type', 'available_beds', 'total_beds',
+        'hospital__name', 'hospital__address', 'hospital__emergency_contact',
+        'hospital__rating', 'hospital__support_24_7',
+    )
+    specialties = {}
+    for hospital_id, key in HospitalSpecialty.objects.filter(
+        hospital__city__iexact=city,
+    ).values_list('hospital_id', 'specialty__key'):
+        specialties.setdefault(hospital_id, set()).add(key)
+    return _CityIndex(version, rows, {pk: frozenset(keys) for pk, keys in specialties.items()})
+
+
+def _city_index(city):
+    key = city_key(city)
+    index = _cities.get(key)
+    now = time.monotonic()
+    if index is not None and now - index.checked_at < settings.PLACEMENT_REFRESH_SECONDS:
+        return index
+    [version] = scope_versions(city_scope(city))
+    if index is not None and index.version == version:
+        index.checked_at = now
+        return index
+    with _lock:
+        index = _cities.get(key)
+        if index is None or index.version != version:
+            index = _cities[key] = _load(city, version)
+    return index
+
+
+def recommend(city, bed_type, specialty=None, limit=10):
+    """
+    Up to ``limit`` ``(candidate, specialty_matched)`` pairs, best first.
+    """
+    specialty = Specialty.key_for(specialty) if specialty else None
+    return _city_index(city).top(bed_type, specialty, limit)
+
+
+def bed_changed(hospital_id, city, bed_type, available_beds, total_beds):
+    """
+    Bump the city's version after a committed bed change and patch this
+    process's index with it until the index is rebuilt.
+    """
+    key = city_key(city)
+    with _lock:
+        bump_scopes(city_scope(city))
+        index = _cities.get(key)
+        # The index keeps its old version, so the next check rebuilds it.
+        if index is not None and not index.patch(hospital_id, bed_type, available_beds, total_beds):
+            # A new bed row: rebuild on next use.
+            _cities.pop(key, None)
+
+
+def forget(city):
+    _cities.pop(city_key(city), None)
@@ -0,0 +1,162 @@
+"""
+Token-bucket rate limiting shared by every worker process on the host.
+
+Each endpoint class in ``settings.RATE_LIMITS`` has a rate (tokens per
+second) and a burst size. A client, the signed-in user or else the remote
+address, gets one bucket per class; a request takes a token or is answered
+with 429 and ``Retry-After``.
+
+Buckets live in a fixed-size open-addressing table in a memory-mapped file
+(``settings.RATE_LIMIT_FILE``), so all processes see the same counts without
+a round trip to the database. A slot holds the key's 64-bit hash, its tokens
+and the time they were counted. A key probes ``PROBE`` slots from its home
+slot; when they are all taken by other keys, it replaces the one idle for
+longest, which has usually refilled to a full bucket anyway and so loses
+nothing. Updates hold an ``fcntl`` record lock on the probed slots only, so
+clients rarely wait for each other, plus a process-local lock since record
+locks do not exclude threads of the same process.
+
+Without ``fcntl`` (Windows) the table is still used, but each process only
+sees its own requests.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.http import HttpResponse, JsonResponse
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+SLOT = struct.Struct('<Qdd')
+PROBE = 8
+
+
+class BucketTable:
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        # Spare slots at the end let a probe run past the last home slot.
+        size = (self.slots + PROBE) * SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+
+    def take(self, key, rate, burst, now=None):
+        """
+        Take a token from ``key``'s bucket. Returns 0 if one was available,
+        otherwise the seconds until one will be.
+        """
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        home = digest % self.slots
+        with self._lock:
+            if self._map is None:
+                self._open()
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, PROBE * SLOT.size, home * SLOT.size)
+            try:
+                now = time.time() if now is None else now
+                return self._take(digest, home, rate, burst, now)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, PROBE * SLOT.size, home * SLOT.size)
+
+    def _take(self, digest, home, rate, burst, now):
+        table = self._map
+        found, tokens = None, burst
+        stalest, stalest_updated = None, None
+        for offset in range(home * SLOT.size, (home + PROBE) * SLOT.size, SLOT.size):
+            owner, stored, updated = SLOT.unpack_from(table, offset)
+            if owner == digest:
+                found, tokens = offset, min(burst, stored + max(0.0, now - updated) * rate)
+                break
+            if owner == 0:
+                # Slots are never emptied, so the key is not further along.
+                found = offset
+                break
+            if stalest_updated is None or updated < stalest_updated:
+                stalest, stalest_updated = offset, updated
+        if found is None:
+            found = stalest
+
+        if tokens >= 1:
+            SLOT.pack_into(table, found, digest, tokens - 1, now)
+            return 0
+        SLOT.pack_into(table, found, digest, tokens, now)
+        return (1 - tokens) / rate
+
+
+_table = None
+
+
+def table():
+    global _table
+    if _table is None:
+        _table = BucketTable(settings.RATE_LIMIT_FILE, settings.RATE_LIMIT_SLOTS)
+    return _table
+
+
+def client_key(request):
+    # The session already names the user; request.user would cost a query.
+    user_id = request.session.get(SESSION_KEY)
+    if user_id:
+        return f'user:{user_id}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def _too_many(request, retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    message = f'Too many requests. Retry after {seconds}s.'
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' or '/api/' in request.path:
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def rate_limit(endpoint_class):
+    """
+    Charge one token from the client's ``endpoint_class`` bucket per call,
+    answering 429 once it is empty. A class missing from
+    ``settings.RATE_LIMITS`` (or set to None) is not limited, and neither are
+    requests marked ``rate_limit_exempt`` by internal callers.
+    """
+    def check(request):
+        limit = settings.RATE_LIMITS.get(endpoint_class)
+        if limit and not getattr(request, 'rate_limit_exempt', False):
+            rate, burst = limit
+            retry_after = table().take(f'{endpoint_class}:{client_key(request)}', rate, burst)
+            if retry_after:
+                return _too_many(request, retry_after)
+        return None
+
+    def decorator(view):
+        # The check never waits on I/O, so async views run it inline too.
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                return check(request) or await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapped(request, *args, **kwargs):
+                return check(request) or view(request, *args, **kwargs)
+        return wrapped
+    return decorator
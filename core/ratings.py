@@ -0,0 +1,186 @@
+"""
+Doctor and hospital ratings kept as running totals of patient reviews.
+
+A ``Review`` rates the doctor of a completed appointment or the hospital of a
+completed bed booking. Doctors and hospitals store ``rating_count`` and
+``rating_sum``; the hooks in ``core.signals`` snapshot a review before and
+after every save/delete and apply the difference in one ``UPDATE`` per
+doctor or hospital, which also sets ``rating`` to the new average. A review
+therefore costs the same however many the doctor already has, and nothing
+ever averages the whole table on a request. Until its first review a doctor
+or hospital keeps the rating it was given by hand.
+
+Full saves of a doctor or hospital (forms, the admin) re-read the totals
+first (``keep_current``) so they do not write back stale ones. Anything that
+still bypasses the hooks, such as bulk or raw SQL writes, is repaired by
+``reconcile``, run nightly by ``manage.py reconcile_ratings``: it recounts
+the reviews of a batch of doctors or hospitals at a time from the
+``review(doctor)`` and ``review(hospital)`` indexes and rewrites only the
+rows that disagree.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Sum, When
+from django.utils import timezone
+
+from . import doctor_ranking, placement
+from .caching import DOCTORS, HOSPITALS, bump_scopes, hospital_scope
+from .models import Appointment, Doctor, Hospital, Review
+
+BATCH_SIZE = 2000
+
+# Each rated model and the review column pointing at it.
+TARGETS = ((Doctor, 'doctor_id'), (Hospital, 'hospital_id'))
+
+
+def completed(booking, now=None):
+    """
+    Whether ``booking`` (an ``Appointment`` or ``BedBooking``) was confirmed
+    and its slot has started, so the patient may review it.
+    """
+    now = timezone.localtime(now)
+    day = booking.date if isinstance(booking, Appointment) else booking.booking_date
+    start = datetime.datetime.combine(day, booking.time_slot)
+    return booking.status == 'CONFIRMED' and start <= now.replace(tzinfo=None)
+
+
+def average(total, count):
+    """
+    ``total / count`` rounded half up to one decimal, as ``_add`` computes it.
+    """
+    return Decimal((20 * total + count) // (2 * count)).scaleb(-1)
+
+
+def _average_expression(total, count):
+    # Integer arithmetic rounds exactly; the division by 10.0 only places
+    # the decimal point.
+    return ExpressionWrapper(
+        (total * 20 + count) / (count * 2) / 10.0,
+        output_field=DecimalField(max_digits=2, decimal_places=1),
+    )
+
+
+def snapshot(pk):
+    """
+    ``(model, pk, rating)`` entries review ``pk`` currently counts towards.
+    """
+    if pk is None:
+        return []
+    row = Review.objects.filter(pk=pk).values('doctor_id', 'hospital_id', 'rating').first()
+    if row is None:
+        return []
+    return [(model, row[column], row['rating']) for model, column in TARGETS if row[column]]
+
+
+def apply_change(before, after):
+    """
+    Move the totals from snapshot ``before`` to ``after`` and return the
+    ``(model, pk)`` pairs whose rating changed.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for sign, entries in ((-1, before), (1, after)):
+        for model, pk, rating in entries:
+            delta = deltas[(model, pk)]
+            delta[0] += sign
+            delta[1] += sign * rating
+    touched = []
+    for (model, pk), (count, total) in deltas.items():
+        if count or total:
+            _add(model, pk, count, total)
+            touched.append((model, pk))
+    return touched
+
+
+def _add(model, pk, count, total):
+    new_count = F('rating_count') + count
+    new_sum = F('rating_sum') + total
+    # Every assignment reads the row as it was before the update.
+    model.objects.filter(pk=pk).update(
+        rating=Case(
+            When(rating_count__gt=-count, then=_average_expression(new_sum, new_count)),
+            default=F('rating'),
+        ),
+        rating_count=new_count,
+        rating_sum=new_sum,
+    )
+
+
+def keep_current(instance):
+    """
+    Load the stored review totals into an unsaved ``instance`` (a doctor or
+    hospital being saved in full) and set its rating from them.
+    """
+    if instance.pk:
+        totals = type(instance).objects.filter(pk=instance.pk).values_list('rating_count', 'rating_sum').first()
+        if totals:
+            instance.rating_count, instance.rating_sum = totals
+    if instance.rating_count:
+        instance.rating = average(instance.rating_sum, instance.rating_count)
+
+
+def propagate(doctor_ids=(), hospital_ids=()):
+    """
+    Rescore ``doctor_ids`` and invalidate the pages showing their ratings or
+    those of ``hospital_ids``.
+    """
+    doctor_ids, hospital_ids = list(doctor_ids), list(hospital_ids)
+    scopes = set()
+    if doctor_ids:
+        doctor_ranking.rescore(doctor_ids)
+        scopes.add(DOCTORS)
+        scopes.update(
+            hospital_scope(pk)
+            for pk in Doctor.objects.filter(pk__in=doctor_ids).values_list('hospital_id', flat=True).distinct()
+        )
+    if hospital_ids:
+        scopes.add(HOSPITALS)
+        scopes.update(hospital_scope(pk) for pk in hospital_ids)
+        # Placement indexes score hospitals by rating.
+        scopes.update(
+            placement.city_scope(city)
+            for city in Hospital.objects.filter(pk__in=hospital_ids).values_list('city', flat=True).distinct()
+        )
+    if scopes:
+        bump_scopes(*scopes)
+
+
+def _reconcile(model, column, batch_size):
+    rows = model.objects.only('rating', 'rating_count', 'rating_sum').order_by('pk')
+    changed = []
+    after = 0
+    while True:
+        batch = list(rows.filter(pk__gt=after)[:batch_size])
+        if not batch:
+            break
+        totals = {
+            pk: (count, total)
+            for pk, count, total in Review.objects.filter(**{f'{column}__in': [row.pk for row in batch]})
+            .values(column)
+            .annotate(count=Count('pk'), total=Sum('rating'))
+            .values_list(column, 'count', 'total')
+        }
+        updated = []
+        for row in batch:
+            count, total = totals.get(row.pk, (0, 0))
+            rating = average(total, count) if count else row.rating
+            if (count, total, rating) != (row.rating_count, row.rating_sum, row.rating):
+                row.rating_count, row.rating_sum, row.rating = count, total, rating
+                updated.append(row)
+        model.objects.bulk_update(updated, ['rating', 'rating_count', 'rating_sum'], batch_size=1000)
+        changed.extend(row.pk for row in updated)
+        after = batch[-1].pk
+    return changed
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """
+    Recount every doctor's and hospital's reviews, repair the totals that
+    drifted and return how many rows changed.
+    """
+    doctor_ids = _reconcile(Doctor, 'doctor_id', batch_size)
+    hospital_ids = _reconcile(Hospital, 'hospital_id', batch_size)
+    for start in range(0, max(len(doctor_ids), len(hospital_ids)), batch_size):
+        propagate(doctor_ids[start:start + batch_size], hospital_ids[start:start + batch_size])
+    return len(doctor_ids) + len(hospital_ids)
@@ -0,0 +1,159 @@
+"""
+Reminder notifications for upcoming appointments and bookings.
+
+For every kind of booking and every offset in ``settings.REMINDER_OFFSETS``
+a ``ReminderCursor`` records the start time (and id) of the last row
+reminded. Each run walks the ``(date, time_slot)`` index from the cursor up
+to ``now + offset`` in keyset-paginated chunks; a chunk's notifications and
+the cursor move are committed together, so a crashed or restarted run
+neither skips nor repeats anyone, and memory is bounded by ``CHUNK_SIZE``.
+
+Bookings that start before the next, shorter offset is reached are left to
+that offset, so a late booking gets one reminder rather than several at once.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import inbox
+from .models import Appointment, BedBooking, Notification, OxygenBooking, ReminderCursor
+
+CHUNK_SIZE = 2000
+
+MIDNIGHT = datetime.time(0, 0)
+
+
+def _appointment_message(doctor, date, time_slot):
+    return f'Reminder: appointment with Dr. {doctor} on {date} at {time_slot:%H:%M}.'
+
+
+def _bed_booking_message(hospital, date, time_slot):
+    return f'Reminder: your bed at {hospital} is booked for {date}, arrival {time_slot:%H:%M}.'
+
+
+def _oxygen_booking_message(supplier, date, time_slot):
+    when = f'{date} at {time_slot:%H:%M}' if time_slot != MIDNIGHT else str(date)
+    return f'Reminder: oxygen from {supplier} is scheduled for {when}.'
+
+
+# ``slot`` is the start-time expression; oxygen bookings without a time slot
+# are reminded as if they started at midnight.
+REMINDERS = {
+    'appointment': {
+        'model': Appointment,
+        'date_field': 'date',
+        'slot': F('time_slot'),
+        'statuses': ['PENDING', 'CONFIRMED'],
+        'label': 'doctor__name',
+        'message': _appointment_message,
+    },
+    'bed_booking': {
+        'model': BedBooking,
+        'date_field': 'booking_date',
+        'slot': F('time_slot'),
+        'statuses': ['PENDING', 'CONFIRMED'],
+        'label': 'hospital_bed__hospital__name',
+        'message': _bed_booking_message,
+    },
+    'oxygen_booking': {
+        'model': OxygenBooking,
+        'date_field': 'scheduled_date',
+        'slot': Coalesce('time_slot', Value(MIDNIGHT)),
+        'statuses': ['PENDING', 'CONFIRMED'],
+        'label': 'stock__supplier__name',
+        'message': _oxygen_booking_message,
+    },
+}
+
+
+def _position(moment):
+    moment = timezone.localtime(moment)
+    return moment.date(), moment.time().replace(microsecond=0)
+
+
+def _upcoming(spec, after, until, limit):
+    """
+    Rows starting strictly after ``after`` = (date, time, id) and no later
+    than ``until`` = (date, time), in start order.
+    """
+    date_field = spec['date_field']
+    after_date, after_time, after_id = after
+    until_date, until_time = until
+    rows = (
+        spec['model'].objects.filter(
+            status__in=spec['statuses'],
+            **{f'{date_field}__gte': after_date, f'{date_field}__lte': until_date},
+        )
+        .annotate(start_slot=spec['slot'])
+        .filter(
+            Q(**{f'{date_field}__gt': after_date})
+            | Q(**{date_field: after_date, 'start_slot__gt': after_time})
+            | Q(**{date_field: after_date, 'start_slot': after_time, 'pk__gt': after_id})
+        )
+        .filter(
+            Q(**{f'{date_field}__lt': until_date})
+            | Q(**{date_field: until_date, 'start_slot__lte': until_time})
+        )
+        .order_by(date_field, 'start_slot', 'pk')
+    )
+    return list(rows.values_list('pk', date_field, 'start_slot', 'patient_id', spec['label'])[:limit])
+
+
+def _remind_chunk(kind, offset, now, floor, chunk_size):
+    spec = REMINDERS[kind]
+    with transaction.atomic():
+        start_date, start_time = _position(now)
+        cursor, _ = ReminderCursor.objects.select_for_update().get_or_create(
+            kind=kind,
+            offset_minutes=offset,
+            defaults={'date': start_date, 'time_slot': start_time},
+        )
+        # Never remind about bookings that have already started (or that the
+        # next offset will cover), however long the scheduler was down.
+        after = max((cursor.date, cursor.time_slot, cursor.last_id), (*_position(floor), 0))
+        until = _position(now + datetime.timedelta(minutes=offset))
+        rows = _upcoming(spec, after, until, chunk_size)
+        if not rows:
+            return 0
+
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    user_id=patient_id,
+                    message=spec['message'](label, date, time_slot),
+                    notification_type='APPOINTMENT',
+                )
+                for _, date, time_slot, patient_id, label in rows
+            ],
+            batch_size=1000,
+        )
+        inbox.wake(patient_id for _, _, _, patient_id, _ in rows)
+        last_id, cursor.date, cursor.time_slot = rows[-1][:3]
+        cursor.last_id = last_id
+        cursor.save(update_fields=['date', 'time_slot', 'last_id', 'updated_at'])
+    return len(rows)
+
+
+def send_reminders(now=None, chunk_size=CHUNK_SIZE):
+    """
+    Emit every reminder due at ``now``. Returns ``{(kind, offset): count}``.
+    """
+    now = now or timezone.now()
+    sent = {}
+    for kind, offsets in settings.REMINDER_OFFSETS.items():
+        offsets = sorted(offsets, reverse=True)
+        for i, offset in enumerate(offsets):
+            shorter = offsets[i + 1] if i + 1 < len(offsets) else 0
+            floor = now + datetime.timedelta(minutes=shorter)
+            total = 0
+            while True:
+                count = _remind_chunk(kind, offset, now, floor, chunk_size)
+                total += count
+                if count < chunk_size:
+                    break
+            sent[(kind, offset)] = total
+    return sent
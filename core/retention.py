@@ -0,0 +1,106 @@
+"""
+Retention for ``Notification``: read notifications older than
+``settings.NOTIFICATION_RETENTION_DAYS`` move to ``NotificationArchive``.
+
+Rows are moved in primary-key batches, each copied and deleted in one
+transaction, so the live table shrinks steadily without long locks and an
+interrupted run simply resumes. With digests on, each user's notifications
+of one type on one day become a single archive row holding the latest
+message and a count.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+BATCH_SIZE = 5000
+
+
+def _archive_digests(rows):
+    """
+    Fold ``rows`` into per (user, type, day) archive rows, merging with rows
+    an earlier batch already wrote for the same day.
+    """
+    groups = {}
+    for _, user_id, notification_type, message, created_at in rows:
+        key = (user_id, notification_type, timezone.localdate(created_at))
+        count, latest_at, latest = groups.get(key, (0, None, ''))
+        if latest_at is None or created_at >= latest_at:
+            latest_at, latest = created_at, message
+        groups[key] = (count + 1, latest_at, latest)
+
+    first_day = min(day for _, _, day in groups)
+    existing = {}
+    candidates = NotificationArchive.objects.filter(
+        user_id__in={user_id for user_id, _, _ in groups},
+        created_at__date__gte=first_day,
+    ).order_by('created_at')
+    for archived in candidates:
+        existing[(archived.user_id, archived.notification_type, timezone.localdate(archived.created_at))] = archived
+
+    created, updated = [], []
+    for key, (count, latest_at, latest) in groups.items():
+        archived = existing.get(key)
+        if archived is None:
+            user_id, notification_type, _ = key
+            created.append(NotificationArchive(
+                user_id=user_id,
+                notification_type=notification_type,
+                message=latest,
+                count=count,
+                created_at=latest_at,
+            ))
+            continue
+        archived.count += count
+        if latest_at >= archived.created_at:
+            archived.created_at = latest_at
+            archived.message = latest
+        updated.append(archived)
+    NotificationArchive.objects.bulk_create(created, batch_size=1000)
+    NotificationArchive.objects.bulk_update(updated, ['count', 'created_at', 'message'], batch_size=1000)
+
+
+def archive_notifications(days=None, digest=None, batch_size=BATCH_SIZE, now=None):
+    """
+    Move read notifications older than ``days`` to the archive.
+
+    Returns the number of notifications moved.
+    """
+    days = settings.NOTIFICATION_RETENTION_DAYS if days is None else days
+    digest = settings.NOTIFICATION_ARCHIVE_DIGEST if digest is None else digest
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    candidates = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+    moved = 0
+    after = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                candidates.filter(pk__gt=after)
+                .order_by('pk')
+                .values_list('pk', 'user_id', 'notification_type', 'message', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+            if digest:
+                _archive_digests(rows)
+            else:
+                NotificationArchive.objects.bulk_create(
+                    [
+                        NotificationArchive(
+                            user_id=user_id,
+                            notification_type=notification_type,
+                            message=message,
+                            created_at=created_at,
+                        )
+                        for _, user_id, notification_type, message, created_at in rows
+                    ],
+                    batch_size=1000,
+                )
+            Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        moved += len(rows)
+        after = rows[-1][0]
+    return moved
@@ -0,0 +1,227 @@
+"""
+Incrementally maintained daily rollups (see ``DailyRollup``).
+
+Each tracked row contributes a small list of *facts*: ``(day, metric, key,
+status) -> (count, amount)``. The hooks in ``core.signals`` snapshot a row's
+facts before and after every save/delete and apply only the difference, so a
+status change costs a couple of indexed upserts regardless of table size.
+``backfill`` rebuilds the same numbers from the raw tables.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Appointment,
+    BedBooking,
+    DailyRollup,
+    MedicineOrder,
+    MedicineOrderItem,
+    OxygenBooking,
+)
+
+ZERO = Decimal('0')
+
+_LINE_TOTAL = ExpressionWrapper(
+    F('items__quantity') * F('items__price_at_order'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+
+def _day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _appointment_facts(row):
+    return [(_day(row['created_at']), 'APPOINTMENT', 0, row['status'], 1, ZERO)]
+
+
+def _bed_booking_facts(row):
+    facts = [(_day(row['created_at']), 'BED_BOOKING', 0, row['status'], 1, ZERO)]
+    if row['status'] == 'CONFIRMED':
+        facts.append((row['booking_date'], 'BED_CONFIRMED', row['hospital_bed__hospital_id'], '', 1, ZERO))
+    return facts
+
+
+def _oxygen_booking_facts(row):
+    facts = [(_day(row['created_at']), 'OXYGEN_BOOKING', 0, row['status'], 1, ZERO)]
+    if row['status'] == 'DELIVERED':
+        facts.append((row['scheduled_date'], 'OXYGEN_DELIVERED', row['stock__supplier_id'], '', row['quantity'], ZERO))
+    return facts
+
+
+def _medicine_order_facts(row):
+    day = _day(row['created_at'])
+    facts = [(day, 'MEDICINE_ORDER', 0, row['status'], 1, ZERO)]
+    if row['status'] != 'CANCELLED':
+        facts.append((day, 'PHARMACY_REVENUE', row['pharmacy_id'], '', 1, ZERO))
+    return facts
+
+
+def _order_item_facts(row):
+    if row['order__status'] == 'CANCELLED':
+        return []
+    amount = row['quantity'] * row['price_at_order']
+    return [(_day(row['order__created_at']), 'PHARMACY_REVENUE', row['order__pharmacy_id'], '', 0, amount)]
+
+
+TRACKED = {
+    Appointment: (('created_at', 'status'), _appointment_facts),
+    BedBooking: (('created_at', 'status', 'booking_date', 'hospital_bed__hospital_id'), _bed_booking_facts),
+    OxygenBooking: (
+        ('created_at', 'status', 'scheduled_date', 'quantity', 'stock__supplier_id'),
+        _oxygen_booking_facts,
+    ),
+    MedicineOrder: (('created_at', 'status', 'pharmacy_id'), _medicine_order_facts),
+    MedicineOrderItem: (
+        ('quantity', 'price_at_order', 'order__created_at', 'order__status', 'order__pharmacy_id'),
+        _order_item_facts,
+    ),
+}
+
+
+def snapshot(model, pk, with_children=True):
+    """
+    Facts currently contributed by row ``pk`` of ``model``.
+
+    An order's line revenue depends on the order's status, so order snapshots
+    include their items unless ``with_children`` is False. Deletes pass False
+    because cascaded items subtract their own revenue.
+    """
+    if pk is None:
+        return []
+    fields, facts_for = TRACKED[model]
+    row = model.objects.filter(pk=pk).values(*fields).first()
+    if row is None:
+        return []
+    facts = facts_for(row)
+    if model is MedicineOrder and with_children:
+        item_fields, item_facts = TRACKED[MedicineOrderItem]
+        for item in MedicineOrderItem.objects.filter(order_id=pk).values(*item_fields):
+            facts.extend(item_facts(item))
+    return facts
+
+
+def _totals(facts):
+    totals = defaultdict(lambda: [0, ZERO])
+    for day, metric, key, status, count, amount in facts:
+        entry = totals[(day, metric, key, status)]
+        entry[0] += count
+        entry[1] += amount
+    return totals
+
+
+def apply_change(before, after):
+    """
+    Add ``after - before`` to the rollup table.
+    """
+    old = _totals(before)
+    new = _totals(after)
+    for ident in old.keys() | new.keys():
+        count = new.get(ident, (0, ZERO))[0] - old.get(ident, (0, ZERO))[0]
+        amount = new.get(ident, (0, ZERO))[1] - old.get(ident, (0, ZERO))[1]
+        if count or amount:
+            _add(ident, count, amount)
+
+
+def _add(ident, count, amount):
+    day, metric, key, status = ident
+    lookup = {'day': day, 'metric': metric, 'key': key, 'status': status}
+    updated = DailyRollup.objects.filter(**lookup).update(
+        count=F('count') + count,
+        amount=F('amount') + amount,
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            DailyRollup.objects.create(count=count, amount=amount, **lookup)
+    except IntegrityError:
+        # Another writer created the row first.
+        DailyRollup.objects.filter(**lookup).update(
+            count=F('count') + count,
+            amount=F('amount') + amount,
+        )
+
+
+def series(metric, start, end, key=0, status=None):
+    """
+    Per-day ``{'count', 'amount'}`` for ``metric`` between two dates inclusive.
+
+    Reads one indexed row per day (per status when ``status`` is None).
+    """
+    rows = DailyRollup.objects.filter(metric=metric, key=key, day__range=(start, end))
+    if status is not None:
+        rows = rows.filter(status=status)
+    result = []
+    for day, row_status, count, amount in rows.order_by('day', 'status').values_list(
+        'day', 'status', 'count', 'amount'
+    ):
+        result.append({'day': day, 'status': row_status, 'count': count, 'amount': amount})
+    return result
+
+
+def _backfill_facts(start, end):
+    for model, metric in (
+        (Appointment, 'APPOINTMENT'),
+        (BedBooking, 'BED_BOOKING'),
+        (OxygenBooking, 'OXYGEN_BOOKING'),
+        (MedicineOrder, 'MEDICINE_ORDER'),
+    ):
+        rows = (
+            model.objects.filter(created_at__date__range=(start, end))
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'status')
+            .annotate(n=Count('id'))
+        )
+        for row in rows:
+            yield (row['day'], metric, 0, row['status'], row['n'], ZERO)
+
+    rows = (
+        BedBooking.objects.filter(status='CONFIRMED', booking_date__range=(start, end))
+        .values('booking_date', 'hospital_bed__hospital_id')
+        .annotate(n=Count('id'))
+    )
+    for row in rows:
+        yield (row['booking_date'], 'BED_CONFIRMED', row['hospital_bed__hospital_id'], '', row['n'], ZERO)
+
+    rows = (
+        OxygenBooking.objects.filter(status='DELIVERED', scheduled_date__range=(start, end))
+        .values('scheduled_date', 'stock__supplier_id')
+        .annotate(n=Sum('quantity'))
+    )
+    for row in rows:
+        yield (row['scheduled_date'], 'OXYGEN_DELIVERED', row['stock__supplier_id'], '', row['n'], ZERO)
+
+    rows = (
+        MedicineOrder.objects.filter(created_at__date__range=(start, end))
+        .exclude(status='CANCELLED')
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'pharmacy_id')
+        .annotate(n=Count('id', distinct=True), revenue=Sum(_LINE_TOTAL))
+    )
+    for row in rows:
+        yield (row['day'], 'PHARMACY_REVENUE', row['pharmacy_id'], '', row['n'], row['revenue'] or ZERO)
+
+
+@transaction.atomic
+def backfill(start, end):
+    """
+    Rebuild every rollup row for days in ``[start, end]`` from the raw tables.
+
+    Returns the number of rollup rows written.
+    """
+    DailyRollup.objects.filter(day__range=(start, end)).delete()
+    totals = _totals(_backfill_facts(start, end))
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(day=day, metric=metric, key=key, status=status, count=count, amount=amount)
+            for (day, metric, key, status), (count, amount) in totals.items()
+        ],
+        batch_size=1000,
+    )
+    return len(totals)
@@ -0,0 +1,290 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .caching import (
+    DOCTORS,
+    HOSPITALS,
+    MEDICINES,
+    OXYGEN,
+    bump_scopes,
+    hospital_scope,
+    user_scope,
+)
+from . import doctor_ranking, inventory, placement, ratings, rollups
+from .models import (
+    Appointment,
+    Cart,
+    CartItem,
+    Doctor,
+    DoctorLanguage,
+    Hospital,
+    HospitalBed,
+    HospitalSpecialty,
+    Language,
+    Medicine,
+    MedicineProduct,
+    OxygenCylinderStock,
+    OxygenSupplier,
+    Pharmacy,
+    Review,
+    Specialty,
+)
+
+
+def _bump_on_commit(*scopes):
+    transaction.on_commit(lambda: bump_scopes(*scopes))
+
+
+@receiver(pre_save, sender=HospitalBed)
+@receiver(pre_save, sender=Doctor)
+def remember_previous_hospital(sender, instance, raw=False, **kwargs):
+    # Rows can be moved between hospitals from the admin; the hospital they
+    # left needs its fragments invalidated as well.
+    instance._previous_hospital_id = None
+    if instance.pk and not raw:
+        instance._previous_hospital_id = (
+            sender.objects.filter(pk=instance.pk).values_list('hospital_id', flat=True).first()
+        )
+
+
+def _hospital_city(hospital_id):
+    return Hospital.objects.filter(pk=hospital_id).values_list('city', flat=True).first()
+
+
+@receiver(pre_save, sender=Hospital)
+def remember_previous_city(sender, instance, raw=False, **kwargs):
+    instance._previous_city = None
+    if instance.pk and not raw:
+        instance._previous_city = sender.objects.filter(pk=instance.pk).values_list('city', flat=True).first()
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def hospital_changed(sender, instance, **kwargs):
+    cities = {instance.city, getattr(instance, '_previous_city', None) or instance.city}
+    _bump_on_commit(HOSPITALS, DOCTORS, hospital_scope(instance.pk), *map(placement.city_scope, cities))
+    for city in cities:
+        transaction.on_commit(lambda city=city: placement.forget(city))
+
+
+def _specialties_changed(hospitals):
+    # ``hospitals`` are (pk, city) pairs; their pages and placement indexes
+    # show the specialties.
+    hospitals = list(hospitals)
+    cities = {city for _, city in hospitals}
+    _bump_on_commit(
+        HOSPITALS, *(hospital_scope(pk) for pk, _ in hospitals), *map(placement.city_scope, cities),
+    )
+    for city in cities:
+        transaction.on_commit(lambda city=city: placement.forget(city))
+
+
+@receiver(m2m_changed, sender=HospitalSpecialty)
+def hospital_specialties_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_hospitals = list(instance.hospitals.values_list('pk', 'city'))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _specialties_changed([(instance.pk, instance.city)])
+    elif action == 'post_clear':
+        _specialties_changed(getattr(instance, '_cleared_hospitals', []))
+    elif pk_set:
+        _specialties_changed(Hospital.objects.filter(pk__in=pk_set).values_list('pk', 'city'))
+
+
+@receiver(post_save, sender=HospitalSpecialty)
+@receiver(post_delete, sender=HospitalSpecialty)
+def hospital_specialty_changed(sender, instance, raw=False, **kwargs):
+    # Links saved one at a time (the admin inline) send no m2m_changed.
+    if not raw:
+        _specialties_changed(Hospital.objects.filter(pk=instance.hospital_id).values_list('pk', 'city'))
+
+
+@receiver(post_save, sender=Specialty)
+def specialty_changed(sender, instance, raw=False, **kwargs):
+    # A rename; deletes cascade to the links, which report themselves.
+    if not raw:
+        _specialties_changed(instance.hospitals.values_list('pk', 'city'))
+
+
+@receiver(post_save, sender=HospitalBed)
+@receiver(post_delete, sender=HospitalBed)
+@receiver(inventory.inventory_changed, sender=HospitalBed)
+def hospital_bed_changed(sender, instance, signal, **kwargs):
+    scopes = {HOSPITALS, hospital_scope(instance.hospital_id)}
+    previous = getattr(instance, '_previous_hospital_id', None)
+    if previous:
+        scopes.add(hospital_scope(previous))
+        if previous != instance.hospital_id:
+            previous_city = _hospital_city(previous)
+            if previous_city:
+                scopes.add(placement.city_scope(previous_city))
+                transaction.on_commit(lambda: placement.forget(previous_city))
+    city = instance.hospital.city if sender.hospital.is_cached(instance) else _hospital_city(instance.hospital_id)
+    if city:
+        if signal is post_delete:
+            scopes.add(placement.city_scope(city))
+            transaction.on_commit(lambda: placement.forget(city))
+        else:
+            # Bumps the city scope itself and patches this process's index.
+            transaction.on_commit(lambda: placement.bed_changed(
+                instance.hospital_id, city, instance.bed_type, instance.available_beds, instance.total_beds,
+            ))
+    _bump_on_commit(*scopes)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    scopes = {DOCTORS, hospital_scope(instance.hospital_id)}
+    previous = getattr(instance, '_previous_hospital_id', None)
+    if previous:
+        scopes.add(hospital_scope(previous))
+    _bump_on_commit(*scopes)
+
+
+@receiver(pre_save, sender=Hospital)
+@receiver(pre_save, sender=Doctor)
+def keep_rating(sender, instance, raw=False, **kwargs):
+    # Connected before rank_doctor, which scores the rating.
+    if not raw:
+        ratings.keep_current(instance)
+
+
+@receiver(pre_save, sender=Doctor)
+def rank_doctor(sender, instance, raw=False, **kwargs):
+    if not raw:
+        doctor_ranking.refresh(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    # A booked or freed slot moves the doctor's availability term.
+    doctor_id = instance.doctor_id
+    transaction.on_commit(lambda: doctor_ranking.rescore([doctor_id]))
+
+
+@receiver(pre_save, sender=Review)
+def review_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._ratings_before = ratings.snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+def review_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _ratings_changed(ratings.apply_change(
+            getattr(instance, '_ratings_before', []), ratings.snapshot(instance.pk),
+        ))
+
+
+@receiver(pre_delete, sender=Review)
+def review_before_delete(sender, instance, **kwargs):
+    instance._ratings_before = ratings.snapshot(instance.pk)
+
+
+@receiver(post_delete, sender=Review)
+def review_after_delete(sender, instance, **kwargs):
+    _ratings_changed(ratings.apply_change(getattr(instance, '_ratings_before', []), []))
+
+
+def _ratings_changed(touched):
+    doctor_ids = [pk for model, pk in touched if model is Doctor]
+    hospital_ids = [pk for model, pk in touched if model is Hospital]
+    if touched:
+        transaction.on_commit(lambda: ratings.propagate(doctor_ids, hospital_ids))
+
+
+@receiver(m2m_changed, sender=DoctorLanguage)
+@receiver(post_save, sender=DoctorLanguage)
+@receiver(post_delete, sender=DoctorLanguage)
+@receiver(post_save, sender=Language)
+def doctor_languages_changed(sender, raw=False, action='post_save', **kwargs):
+    # Forms set languages through the relation (m2m_changed), the admin
+    # inline saves links one at a time, and deletes cascade to the links.
+    if not raw and action.startswith('post_'):
+        _bump_on_commit(DOCTORS)
+
+
+@receiver(post_save, sender=OxygenSupplier)
+@receiver(post_delete, sender=OxygenSupplier)
+@receiver(post_save, sender=OxygenCylinderStock)
+@receiver(post_delete, sender=OxygenCylinderStock)
+@receiver(inventory.inventory_changed, sender=OxygenCylinderStock)
+def oxygen_changed(sender, instance, **kwargs):
+    _bump_on_commit(OXYGEN)
+
+
+@receiver(post_save, sender=Pharmacy)
+@receiver(post_delete, sender=Pharmacy)
+@receiver(post_save, sender=Medicine)
+@receiver(post_delete, sender=Medicine)
+@receiver(post_save, sender=MedicineProduct)
+@receiver(post_delete, sender=MedicineProduct)
+@receiver(inventory.inventory_changed, sender=Medicine)
+def medicine_changed(sender, instance, **kwargs):
+    _bump_on_commit(MEDICINES)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    _bump_on_commit(user_scope(instance.user_id))
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    _bump_on_commit(user_scope(instance.cart.user_id))
+
+
+def rollup_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._rollup_before = rollups.snapshot(sender, instance.pk)
+
+
+def rollup_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.apply_change(
+            getattr(instance, '_rollup_before', []),
+            rollups.snapshot(sender, instance.pk),
+        )
+
+
+def rollup_before_delete(sender, instance, **kwargs):
+    # Cascaded order items remove their own revenue.
+    instance._rollup_before = rollups.snapshot(sender, instance.pk, with_children=False)
+
+
+def rollup_after_delete(sender, instance, **kwargs):
+    rollups.apply_change(getattr(instance, '_rollup_before', []), [])
+
+
+for _model in rollups.TRACKED:
+    pre_save.connect(rollup_before_save, sender=_model)
+    post_save.connect(rollup_after_save, sender=_model)
+    pre_delete.connect(rollup_before_delete, sender=_model)
+    post_delete.connect(rollup_after_delete, sender=_model)
+
+
+def ledger_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._inventory_before = inventory.counters(sender, instance.pk) if instance.pk else None
+
+
+def ledger_after_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        inventory.record_save(instance, getattr(instance, '_inventory_before', None), created)
+
+
+def ledger_after_delete(sender, instance, **kwargs):
+    inventory.record_delete(instance)
+
+
+for _model in inventory.TRACKED:
+    pre_save.connect(ledger_before_save, sender=_model)
+    post_save.connect(ledger_after_save, sender=_model)
+    post_delete.connect(ledger_after_delete, sender=_model)
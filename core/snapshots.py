@@ -0,0 +1,163 @@
+"""
+Static snapshots of the public availability pages for emergency mode.
+
+``write_snapshots`` renders ``hospital_list``, ``oxygen_list`` and
+``emergency_contacts`` as an anonymous visitor would see them, once for
+every city with a hospital or oxygen supplier and once unfiltered, and
+writes the HTML (and, for the hospital list, its ``X-Requested-With`` JSON)
+under ``settings.EMERGENCY_SNAPSHOT_DIR``::
+
+    <dir>/<page>/<city slug or "all">.html
+    <dir>/<page>/<city slug or "all">.json
+
+Each file is written to a temporary name and renamed into place, so a reader
+never sees a half-written page. ``snapshot_response`` turns a stored file
+back into a response without touching the database; the time the file was
+written is the "data as of" time. See ``core.middleware`` for when that
+happens.
+"""
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.http import http_date
+from django.utils.text import slugify
+
+from . import views
+from .models import Hospital, OxygenSupplier
+
+ALL_CITIES = 'all'
+
+Page = namedtuple('Page', 'name per_city json')
+
+# Emergency contacts do not depend on the city, so one copy serves them all.
+PAGES = (
+    Page('hospital_list', per_city=True, json=True),
+    Page('oxygen_list', per_city=True, json=False),
+    Page('emergency_contacts', per_city=False, json=False),
+)
+PAGES_BY_NAME = {page.name: page for page in PAGES}
+
+Snapshot = namedtuple('Snapshot', 'path content_type')
+
+BANNER = (
+    '<div role="status" style="background:#fff4d6;border-bottom:1px solid #e0b84c;'
+    'color:#5c4300;padding:0.6rem 1rem;text-align:center;">'
+    'The service is under heavy load, so this is a saved copy: data as of '
+    '<strong>{as_of}</strong>. Filters other than the city are not applied, '
+    'and bookings are paused until it recovers.</div>'
+)
+
+
+def city_slug(city):
+    return slugify((city or '').strip()) or ALL_CITIES
+
+
+def snapshot_cities():
+    """
+    Every distinct city (case-insensitively) with a hospital or supplier.
+    """
+    cities = {}
+    for model in (Hospital, OxygenSupplier):
+        for city in model.objects.values_list('city', flat=True).distinct():
+            cities.setdefault(city.strip().casefold(), city.strip())
+    return sorted(city for city in cities.values() if city)
+
+
+def _directory():
+    return Path(settings.EMERGENCY_SNAPSHOT_DIR)
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _render(view, path, city, xhr=False):
+    headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if xhr else {}
+    request = RequestFactory().get(path, {'city': city} if city else {}, **headers)
+    request.user = AnonymousUser()
+    # One pass renders every city, far beyond any client's burst.
+    request.rate_limit_exempt = True
+    response = view(request)
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} answered {response.status_code} while snapshotting')
+    return response.content
+
+
+def write_snapshots():
+    """
+    Render and store every snapshot. Returns the number of files written.
+    """
+    directory = _directory()
+    cities = snapshot_cities()
+    written = 0
+    for page in PAGES:
+        view, path = getattr(views, page.name), reverse(page.name)
+        for city in ([None] + cities if page.per_city else [None]):
+            slug = city_slug(city)
+            _write(directory / page.name / f'{slug}.html', _render(view, path, city))
+            written += 1
+            if page.json:
+                _write(directory / page.name / f'{slug}.json', _render(view, path, city, xhr=True))
+                written += 1
+    return written
+
+
+def find_snapshot(name, request):
+    """
+    The stored copy of page ``name`` for ``request``, or None if there is
+    none. An unknown city gets the unfiltered copy.
+    """
+    page = PAGES_BY_NAME[name]
+    wants_json = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    if wants_json and not page.json:
+        return None
+    suffix, content_type = ('.json', 'application/json') if wants_json else ('.html', 'text/html; charset=utf-8')
+    slugs = [city_slug(request.GET.get('city')), ALL_CITIES] if page.per_city else [ALL_CITIES]
+    for slug in slugs:
+        path = _directory() / name / f'{slug}{suffix}'
+        if path.is_file():
+            return Snapshot(path, content_type)
+    return None
+
+
+def snapshot_response(name, request):
+    """
+    Serve page ``name`` from its snapshot, with the "data as of" banner, or
+    return None if no snapshot exists yet.
+    """
+    snapshot = find_snapshot(name, request)
+    if snapshot is None:
+        return None
+    try:
+        with open(snapshot.path, 'rb') as handle:
+            content = handle.read()
+            written = os.fstat(handle.fileno()).st_mtime
+    except OSError:
+        return None
+    as_of = datetime.fromtimestamp(written, tz=dt_timezone.utc)
+    if snapshot.content_type.startswith('text/html'):
+        banner = BANNER.format(as_of=escape(f'{timezone.localtime(as_of):%d %b %Y, %H:%M}'))
+        content = content.replace(b'<body>', b'<body>' + banner.encode(), 1)
+    response = HttpResponse(content, content_type=snapshot.content_type)
+    response['X-Data-As-Of'] = http_date(written)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
@@ -0,0 +1,49 @@
+"""
+Background task handlers (see ``core.jobs``).
+"""
+from django.contrib.auth import get_user_model
+
+from . import inbox, jobs
+from .models import Notification, SupportRequest
+
+
+@jobs.task(batch=True)
+def notify(payloads):
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                user_id=p['user_id'],
+                message=p['message'],
+                notification_type=p['notification_type'],
+            )
+            for p in payloads
+        ],
+        batch_size=1000,
+    )
+    inbox.wake(p['user_id'] for p in payloads)
+
+
+def queue_notification(user, message, notification_type, priority=None):
+    """
+    Queue an in-app notification for the worker, or write it now when no
+    worker is deployed (see ``jobs.enqueue``).
+    """
+    return jobs.enqueue(
+        'notify',
+        {'user_id': user.pk, 'message': message, 'notification_type': notification_type},
+        priority=priority,
+    )
+
+
+@jobs.task(priority=jobs.HIGH)
+def alert_support_staff(payload):
+    support = SupportRequest.objects.filter(pk=payload['support_request_id']).first()
+    if support is None or support.status != 'OPEN':
+        return
+    prefix = 'EMERGENCY support request' if support.is_emergency else 'New support request'
+    staff = list(get_user_model().objects.filter(userprofile__role='ADMIN', is_active=True).only('pk'))
+    Notification.objects.bulk_create([
+        Notification(user=user, message=f'{prefix}: "{support.subject}"', notification_type='SUPPORT')
+        for user in staff
+    ])
+    inbox.wake(user.pk for user in staff)
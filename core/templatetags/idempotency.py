@@ -0,0 +1,15 @@
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import FIELD, new_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_field():
+    """
+    A hidden input with a fresh idempotency key, for forms posting to views
+    wrapped in ``core.idempotency.idempotent``.
+    """
+    return format_html('<input type="hidden" name="{}" value="{}">', FIELD, new_key())
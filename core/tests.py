@@ -1,3 +1,275 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from . import doctor_ranking, inventory, placement, ratings
+from .caching import OXYGEN, bump_scopes
+from .idempotency import idempotent
+from .models import (
+    Doctor,
+    Hospital,
+    HospitalBed,
+    HospitalSpecialty,
+    IdempotencyKey,
+    InventoryLedgerEntry,
+    Specialty,
+)
+
+
+def make_hospital(**fields):
+    fields = {'name': 'City Hospital', 'address': '1 Main Road', 'city': 'Pune', 'state': 'Maharashtra', **fields}
+    return Hospital.objects.create(**fields)
+
+
+def make_doctor(hospital, **fields):
+    fields = {
+        'name': 'Dr. Rao',
+        'speciality': 'General',
+        'experience_years': 10,
+        'consultation_fee': Decimal('500'),
+        'available_from': datetime.time(9),
+        'available_to': datetime.time(17),
+        'city': hospital.city,
+        **fields,
+    }
+    return Doctor.objects.create(hospital=hospital, **fields)
+
+
+class RatingsTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor(make_hospital())
+
+    def totals(self):
+        return Doctor.objects.filter(pk=self.doctor.pk).values_list('rating_count', 'rating_sum', 'rating').get()
+
+    def test_average_rounds_half_up_to_one_decimal(self):
+        self.assertEqual(ratings.average(7, 2), Decimal('3.5'))
+        self.assertEqual(ratings.average(10, 3), Decimal('3.3'))
+        self.assertEqual(ratings.average(11, 3), Decimal('3.7'))
+        self.assertEqual(ratings.average(5, 4), Decimal('1.3'))
+        self.assertEqual(ratings.average(5, 1), Decimal('5.0'))
+
+    def test_added_reviews_update_totals_and_average(self):
+        for rating in (4, 4, 5):
+            ratings.apply_change([], [(Doctor, self.doctor.pk, rating)])
+        self.assertEqual(self.totals(), (3, 13, Decimal('4.3')))
+
+    def test_edited_review_moves_the_difference(self):
+        ratings.apply_change([], [(Doctor, self.doctor.pk, 4)])
+        touched = ratings.apply_change([(Doctor, self.doctor.pk, 4)], [(Doctor, self.doctor.pk, 2)])
+        self.assertEqual(touched, [(Doctor, self.doctor.pk)])
+        self.assertEqual(self.totals(), (1, 2, Decimal('2.0')))
+
+    def test_unchanged_review_touches_nothing(self):
+        entry = [(Doctor, self.doctor.pk, 3)]
+        ratings.apply_change([], entry)
+        self.assertEqual(ratings.apply_change(entry, entry), [])
+
+    def test_last_review_removed_keeps_the_rating(self):
+        ratings.apply_change([], [(Doctor, self.doctor.pk, 2)])
+        ratings.apply_change([(Doctor, self.doctor.pk, 2)], [])
+        self.assertEqual(self.totals(), (0, 0, Decimal('2.0')))
+
+    def test_database_average_matches_average(self):
+        for rating in (1, 2, 2, 5, 5, 5, 4):
+            ratings.apply_change([], [(Doctor, self.doctor.pk, rating)])
+        count, total, rating = self.totals()
+        self.assertEqual(rating, ratings.average(total, count))
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('patient')
+        self.calls = 0
+
+        @idempotent
+        def view(request):
+            self.calls += 1
+            return JsonResponse({'call': self.calls}, status=201)
+        self.view = view
+
+    def post(self, data, key='booking-key-1', **headers):
+        request = RequestFactory().post('/core/book/', dict(data, idempotency_key=key), headers=headers)
+        request.user = self.user
+        request._messages = CookieStorage(request)
+        return self.view(request)
+
+    def test_repeat_replays_the_first_response(self):
+        first = self.post({'slot': '10:00'})
+        again = self.post({'slot': '10:00'})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((again.status_code, again.content), (201, first.content))
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_for_another_body_is_rejected(self):
+        self.post({'slot': '10:00'})
+        response = self.post({'slot': '11:00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_repeat_while_running_is_a_conflict_for_xhr(self):
+        self.post({'slot': '10:00'})
+        IdempotencyKey.objects.update(status_code=None)
+        response = self.post({'slot': '10:00'}, x_requested_with='XMLHttpRequest')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_repeat_while_running_sends_pages_to_the_dashboard(self):
+        self.post({'slot': '10:00'})
+        IdempotencyKey.objects.update(status_code=None)
+        response = self.post({'slot': '10:00'})
+        self.assertEqual((response.status_code, response['Location']), (302, '/core/dashboard/'))
+        self.assertEqual(self.calls, 1)
+
+    def test_failed_view_releases_its_key(self):
+        @idempotent
+        def failing(request):
+            return JsonResponse({}, status=503)
+        request = RequestFactory().post('/core/book/', {'idempotency_key': 'booking-key-2'})
+        request.user = self.user
+        failing(request)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_malformed_key_is_rejected(self):
+        self.assertEqual(self.post({'slot': '10:00'}, key='no spaces').status_code, 400)
+        self.assertEqual(self.calls, 0)
+
+
+class DoctorCursorTests(TestCase):
+    def parse(self, sort, cursor):
+        return doctor_ranking._parse_cursor(doctor_ranking.SORTS[sort], cursor)
+
+    def test_valid_cursors_parse_with_the_sort_type(self):
+        self.assertEqual(self.parse('rank', '0.75_12'), (0.75, 12))
+        self.assertEqual(self.parse('rating', '4.5_3'), (Decimal('4.5'), 3))
+        self.assertEqual(self.parse('experience', '20_7'), (20, 7))
+        self.assertEqual(self.parse('fee', '350.00_9'), (Decimal('350.00'), 9))
+
+    def test_malformed_cursors_are_ignored(self):
+        for cursor in ('', 'abc', '12', 'x_1', '0.5_y', '0.5_'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(self.parse('rank', cursor))
+
+    def test_non_finite_cursors_are_ignored(self):
+        for sort in ('rank', 'rating', 'fee'):
+            for value in ('inf', '-inf', 'nan', 'sNaN', 'Infinity'):
+                with self.subTest(sort=sort, value=value):
+                    self.assertIsNone(self.parse(sort, f'{value}_1'))
+
+    def test_cursor_continues_after_the_last_row(self):
+        # Seed data has doctors too; search a city of our own.
+        hospital = make_hospital(city='Testpur')
+        for years in (5, 15, 25):
+            make_doctor(hospital, experience_years=years)
+        first = doctor_ranking.page(doctor_ranking.search(city='Testpur', sort='experience', limit=2), 'experience', limit=2)
+        self.assertEqual([d.experience_years for d in first.doctors], [25, 15])
+        rest = doctor_ranking.page(
+            doctor_ranking.search(city='Testpur', sort='experience', cursor=first.next_cursor, limit=2), 'experience', limit=2,
+        )
+        self.assertEqual([d.experience_years for d in rest.doctors], [5])
+        self.assertIsNone(rest.next_cursor)
+
+    @override_settings(RATE_LIMITS={})
+    def test_search_page_survives_non_finite_cursors(self):
+        for after in ('inf_1', 'nan_1', 'sNaN_1'):
+            with self.subTest(after=after):
+                response = self.client.get('/core/doctors/search/', {'after': after})
+                self.assertEqual(response.status_code, 200)
+
+
+class InventoryAdjustTests(TestCase):
+    def setUp(self):
+        self.beds = HospitalBed.objects.create(hospital=make_hospital(), bed_type='ICU', total_beds=5, available_beds=2)
+
+    def bookings(self):
+        return InventoryLedgerEntry.objects.filter(reason='BED_BOOKING')
+
+    def test_decrement_updates_instance_and_ledger(self):
+        self.assertTrue(inventory.adjust(self.beds, 'available_beds', -2, 'BED_BOOKING'))
+        self.assertEqual(self.beds.available_beds, 0)
+        self.assertEqual(inventory.counters(HospitalBed, self.beds.pk)['available_beds'], 0)
+        self.assertEqual(list(self.bookings().values_list('delta', 'value_after')), [(-2, 0)])
+
+    def test_decrement_beyond_stock_writes_nothing(self):
+        self.assertFalse(inventory.adjust(self.beds, 'available_beds', -3, 'BED_BOOKING'))
+        self.assertEqual(inventory.counters(HospitalBed, self.beds.pk)['available_beds'], 2)
+        self.assertFalse(self.bookings().exists())
+
+    def test_stale_instance_cannot_overbook(self):
+        stale = HospitalBed.objects.get(pk=self.beds.pk)
+        inventory.take(self.beds, 'available_beds', 2, 'BED_BOOKING')
+        with self.assertRaises(inventory.InsufficientStock):
+            inventory.take(stale, 'available_beds', 1, 'BED_BOOKING')
+        self.assertEqual(self.bookings().count(), 1)
+
+    def test_only_counters_can_be_adjusted(self):
+        with self.assertRaises(ValueError):
+            inventory.adjust(self.beds, 'bed_type', 1, 'EDITED')
+
+
+@override_settings(RATE_LIMITS={})
+class ConditionalGetTests(TestCase):
+    url = '/core/oxygen/'
+
+    def test_unchanged_page_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Last-Modified', first)
+        again = self.client.get(self.url, headers={'if-none-match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_bumped_scope_moves_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        bump_scopes(OXYGEN)
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_partial_and_full_pages_differ(self):
+        full = self.client.get(self.url)['ETag']
+        partial = self.client.get(self.url, headers={'x-requested-with': 'XMLHttpRequest'})['ETag']
+        self.assertNotEqual(full, partial)
+
+    def test_login_moves_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(get_user_model().objects.create_user('patient'))
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class PlacementTests(TestCase):
+    def setUp(self):
+        placement._cities.clear()
+        self.addCleanup(placement._cities.clear)
+        self.large = make_hospital(name='Large', city='Testpur', rating=Decimal('3.0'))
+        self.cardiac = make_hospital(name='Cardiac', city='Testpur', rating=Decimal('3.0'))
+        self.full = make_hospital(name='Full', city='Testpur', rating=Decimal('5.0'))
+        for hospital, available in ((self.large, 10), (self.cardiac, 3), (self.full, 0)):
+            HospitalBed.objects.create(hospital=hospital, bed_type='ICU', total_beds=10, available_beds=available)
+        specialty = Specialty.objects.filter(key='cardiology').first() or Specialty.objects.create(name='Cardiology')
+        HospitalSpecialty.objects.create(hospital=self.cardiac, specialty=specialty)
+
+    def names(self, *args, **kwargs):
+        return [(c.name, matched) for c, matched in placement.recommend('Testpur', *args, **kwargs)]
+
+    def test_ranks_hospitals_with_free_beds(self):
+        self.assertEqual(self.names('ICU'), [('Large', False), ('Cardiac', False)])
+
+    def test_specialty_match_lifts_a_hospital(self):
+        self.assertEqual(self.names('ICU', ' Cardiology '), [('Cardiac', True), ('Large', False)])
+        self.assertEqual(self.names('ICU', 'Cardiology', limit=1), [('Cardiac', True)])
+
+    def test_bed_type_without_beds_is_empty(self):
+        self.assertEqual(self.names('EMERGENCY'), [])
+        self.assertEqual(self.names('EMERGENCY', 'Cardiology'), [])
+        self.assertEqual(placement.recommend('Nowhere', 'ICU', 'Cardiology'), [])
+
+    def test_bed_change_patches_the_index(self):
+        self.names('ICU')
+        placement.bed_changed(self.full.pk, 'Testpur', 'ICU', 10, 10)
+        self.assertEqual(self.names('ICU')[0], ('Full', False))
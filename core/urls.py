@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, exports, views
+
+# Under ASGI the public search pages are served by their async versions.
+search_views = async_views if settings.ASYNC_SEARCH_VIEWS else views
 
 urlpatterns = [
     path('register/', views.register, name='register'),
@@ -11,29 +15,35 @@ urlpatterns = [
     path('dashboard/hospital-admin/', views.hospital_admin_dashboard, name='hospital_admin_dashboard'),
     path('dashboard/pharmacy-admin/', views.pharmacy_admin_dashboard, name='pharmacy_admin_dashboard'),
     path('dashboard/oxygen-supplier/', views.oxygen_supplier_dashboard, name='oxygen_supplier_dashboard'),
+    path('dashboard/oxygen-supplier/deliveries/', views.oxygen_delivery_plan, name='oxygen_delivery_plan'),
     path('dashboard/admin/', views.admin_dashboard, name='admin_dashboard'),
 
-    path('hospitals/', views.hospital_list, name='hospital_list'),
+    path('hospitals/', search_views.hospital_list, name='hospital_list'),
     path('hospitals/<int:pk>/', views.hospital_detail, name='hospital_detail'),
     path('hospitals/book-bed/<int:bed_id>/', views.bed_booking_create, name='bed_booking_create'),
+    path('bed-bookings/<int:pk>/review/', views.review_bed_booking, name='review_bed_booking'),
 
-    path('doctors/search/', views.doctor_search, name='doctor_search'),
+    path('doctors/search/', search_views.doctor_search, name='doctor_search'),
     path('doctors/<int:pk>/', views.doctor_detail, name='doctor_detail'),
     path('doctors/<int:doctor_id>/book/', views.book_appointment, name='book_appointment'),
+    path('appointments/<int:pk>/review/', views.review_appointment, name='review_appointment'),
 
-    path('oxygen/', views.oxygen_list, name='oxygen_list'),
+    path('oxygen/', search_views.oxygen_list, name='oxygen_list'),
     path('oxygen/booking/<int:stock_id>/', views.oxygen_booking_create, name='oxygen_booking_create'),
 
-    path('medicines/search/', views.medicine_search, name='medicine_search'),
+    path('medicines/search/', search_views.medicine_search, name='medicine_search'),
     path('medicines/order/<int:medicine_id>/', views.medicine_order_create, name='medicine_order_create'),
     path('medicines/cart/', views.cart_detail, name='cart_detail'),
     path('medicines/cart/add/<int:medicine_id>/', views.cart_add, name='cart_add'),
     path('medicines/cart/update/<int:item_id>/', views.cart_update, name='cart_update'),
     path('medicines/cart/remove/<int:item_id>/', views.cart_remove, name='cart_remove'),
     path('medicines/cart/checkout/', views.cart_checkout, name='cart_checkout'),
+    path('medicines/cart/optimize/', views.cart_optimize, name='cart_optimize'),
 
     path('notifications/', views.notifications_list, name='notifications_list'),
     path('notifications/<int:pk>/read/', views.notification_mark_read, name='notification_mark_read'),
+    path('notifications/read-all/', views.notification_mark_all_read, name='notification_mark_all_read'),
+    path('notifications/inbox/', views.notification_inbox, name='notification_inbox'),
 
     path('emergency-contacts/', views.emergency_contacts, name='emergency_contacts'),
     path('support-request/', views.support_request_create, name='support_request_create'),
@@ -48,6 +58,18 @@ urlpatterns = [
     path('manage/oxygen-bookings/<int:pk>/status/', views.admin_update_oxygen_booking_status, name='admin_update_oxygen_booking_status'),
     path('manage/bed-bookings/<int:pk>/status/', views.admin_update_bed_booking_status, name='admin_update_bed_booking_status'),
     path('manage/support-requests/<int:pk>/status/', views.admin_update_support_request_status, name='admin_update_support_request_status'),
+    path('manage/exports/<slug:kind>/', exports.export_view, name='export_data'),
+    path('manage/rollups/', views.rollup_report, name='rollup_report'),
+
+    # Read-only JSON API
+    path('api/v1/hospitals/', api.hospitals, name='api_hospitals'),
+    path('api/v1/doctors/', api.doctors, name='api_doctors'),
+    path('api/v1/medicines/', api.medicines, name='api_medicines'),
+    path('api/v1/oxygen-stock/', api.oxygen_stock, name='api_oxygen_stock'),
+    path('api/v1/availability/', api.availability, name='api_availability'),
+    path('api/v1/occupancy-forecast/', api.occupancy_forecast, name='api_occupancy_forecast'),
+    path('api/v1/inventory-changes/', api.inventory_changes, name='api_inventory_changes'),
+    path('api/v1/bed-recommendations/', api.bed_recommendations, name='api_bed_recommendations'),
 
     # --- ADMIN MANAGEMENT: DOCTORS ---
     path('manage/doctors/', views.manage_doctors, name='manage_doctors'),
@@ -1,13 +1,29 @@
+import asyncio
+from datetime import timedelta
+
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-
+from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.vary import vary_on_headers
+
+from .caching import (
+    DOCTORS,
+    HOSPITALS,
+    MEDICINES,
+    OXYGEN,
+    conditional_on,
+    fragment_context,
+    hospital_scope,
+)
+from . import cart_split, delivery, doctor_ranking, inbox, inventory, jobs, oxygen_allocation, ratings, rollups
 from .forms import (
     AppointmentForm,
     BedBookingForm,
@@ -16,6 +32,7 @@ from .forms import (
     MedicineOrderItemForm,
     OxygenBookingForm,
     PatientRegistrationForm,
+    ReviewForm,
     SupportRequestForm,
     DoctorForm
 )
@@ -24,20 +41,28 @@ from .models import (
     BedBooking,
     Cart,
     CartItem,
+    DailyRollup,
     Doctor,
     Hospital,
     HospitalBed,
+    Language,
     Medicine,
     MedicineOrder,
     MedicineOrderItem,
+    MedicineProduct,
     Notification,
     OxygenBooking,
     OxygenCylinderStock,
     OxygenSupplier,
     Pharmacy,
+    Review,
+    Specialty,
     SupportRequest,
     UserProfile,
 )
+from .idempotency import idempotent
+from .ratelimit import rate_limit
+from .tasks import queue_notification
 
 
 def home(request):
@@ -215,11 +240,15 @@ def dashboard(request):
 @login_required
 @role_required(['PATIENT'])
 def patient_dashboard(request):
-    appointments = request.user.appointments.select_related('doctor').order_by('-created_at')[:5]
+    appointments = request.user.appointments.select_related('doctor', 'review').order_by('-created_at')[:5]
     medicine_orders = request.user.medicine_orders.select_related('pharmacy').order_by('-created_at')[:5]
     oxygen_bookings = request.user.oxygen_bookings.select_related('stock').order_by('-created_at')[:5]
     notifications = request.user.notifications.order_by('-created_at')[:10]
-    bed_bookings = request.user.bed_bookings.select_related('hospital_bed__hospital').order_by('-created_at')[:5]
+    bed_bookings = (
+        request.user.bed_bookings.select_related('hospital_bed__hospital', 'review').order_by('-created_at')[:5]
+    )
+    for booking in [*appointments, *bed_bookings]:
+        booking.can_review = ratings.completed(booking) and not hasattr(booking, 'review')
     return render(request, 'core/dashboards/patient_dashboard.html', {
         'appointments': appointments,
         'medicine_orders': medicine_orders,
@@ -254,7 +283,7 @@ def admin_update_appointment_status(request, pk):
     if status in valid_statuses:
         appointment.status = status
         appointment.save()
-        Notification.objects.create(
+        queue_notification(
             user=appointment.patient,
             message=f'Your appointment with Dr. {appointment.doctor.name} on {appointment.date} is now {status}.',
             notification_type='APPOINTMENT',
@@ -275,7 +304,7 @@ def admin_update_medicine_order_status(request, pk):
     if status in valid_statuses:
         order.status = status
         order.save()
-        Notification.objects.create(
+        queue_notification(
             user=order.patient,
             message=f'Medicine order #{order.id} status updated to {status}.',
             notification_type='MEDICINE',
@@ -298,16 +327,26 @@ def admin_update_oxygen_booking_status(request, pk):
         booking.status = status
         booking.save()
         
+        if booking.reserved:
+            # Split bookings took their cylinders when booked; cancelling
+            # gives them back.
+            if status == 'CANCELLED' and old_status != 'CANCELLED':
+                inventory.adjust(
+                    booking.stock, 'available_cylinders', booking.quantity, 'OXYGEN_BOOKING', user=request.user,
+                )
+            elif old_status == 'CANCELLED' and status != 'CANCELLED':
+                if not inventory.adjust(
+                    booking.stock, 'available_cylinders', -booking.quantity, 'OXYGEN_BOOKING', user=request.user,
+                ):
+                    messages.warning(request, 'Stock is insufficient, but booking was reopened.')
         # If approved, reduce available cylinders
-        if status == 'CONFIRMED' and old_status != 'CONFIRMED':
-            stock = booking.stock
-            if stock.available_cylinders >= booking.quantity:
-                stock.available_cylinders -= booking.quantity
-                stock.save()
-            else:
+        elif status == 'CONFIRMED' and old_status != 'CONFIRMED':
+            if not inventory.adjust(
+                booking.stock, 'available_cylinders', -booking.quantity, 'OXYGEN_BOOKING', user=request.user,
+            ):
                 messages.warning(request, f'Stock is insufficient, but booking was marked confirmed.')
 
-        Notification.objects.create(
+        queue_notification(
             user=booking.patient,
             message=f'Your oxygen booking from {booking.stock.supplier.name} is now {status}.',
             notification_type='OXYGEN',
@@ -330,7 +369,7 @@ def admin_update_support_request_status(request, pk):
         support.save()
         # Optional: notify linked user
         if support.user:
-            Notification.objects.create(
+            queue_notification(
                 user=support.user,
                 message=f'Your support request "{support.subject}" is now {status}.',
                 notification_type='SUPPORT',
@@ -356,7 +395,7 @@ def hospital_admin_dashboard(request):
 @role_required(['PHARMACY_ADMIN'])
 def pharmacy_admin_dashboard(request):
     pharmacy = getattr(request.user, 'pharmacy', None)
-    medicines = pharmacy.medicines.all() if pharmacy else Medicine.objects.none()
+    medicines = pharmacy.medicines.select_related('product') if pharmacy else Medicine.objects.none()
     orders = pharmacy.orders.order_by('-created_at')[:10] if pharmacy else MedicineOrder.objects.none()
     return render(request, 'core/dashboards/pharmacy_admin_dashboard.html', {
         'pharmacy': pharmacy,
@@ -378,6 +417,22 @@ def oxygen_supplier_dashboard(request):
     })
 
 
+@login_required
+@role_required(['OXYGEN_SUPPLIER'])
+def oxygen_delivery_plan(request):
+    supplier = getattr(request.user, 'oxygen_supplier', None)
+    if supplier is None:
+        messages.error(request, 'No oxygen supplier profile is linked to this account.')
+        return redirect('oxygen_supplier_dashboard')
+    date = parse_date(request.GET.get('date') or '') or timezone.localdate()
+    plan = delivery.plan_deliveries(supplier, date)
+    return render(request, 'core/oxygen/delivery_plan.html', {
+        'supplier': supplier,
+        'plan': plan,
+        'stops': sum(len(trip.stops) for manifest in plan.manifests for trip in manifest.trips),
+    })
+
+
 @login_required
 @user_passes_test(is_super_admin)
 def admin_dashboard(request):
@@ -397,10 +452,57 @@ def admin_dashboard(request):
     })
 
 
+ROLLUP_MAX_DAYS = 366
+
+
+@login_required
+@role_required(['ADMIN', 'PHARMACY_ADMIN'])
+def rollup_report(request):
+    """
+    Daily rollup series as JSON, e.g. ``?metric=PHARMACY_REVENUE&key=3&from=...&to=...``.
+
+    Pharmacy admins only see revenue for their own pharmacy. Hospital admins
+    are not linked to a hospital, so they get no series at all.
+    """
+    metric = request.GET.get('metric')
+    if metric not in {choice[0] for choice in DailyRollup.METRIC_CHOICES}:
+        return JsonResponse({'error': 'Unknown metric.'}, status=400)
+
+    try:
+        end = parse_date(request.GET.get('to') or '') or timezone.localdate()
+        start = parse_date(request.GET.get('from') or '') or end - timedelta(days=29)
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+    if start > end or (end - start).days >= ROLLUP_MAX_DAYS:
+        return JsonResponse({'error': f'Date range must be 1-{ROLLUP_MAX_DAYS} days.'}, status=400)
+
+    try:
+        key = int(request.GET.get('key', 0))
+    except ValueError:
+        return JsonResponse({'error': 'key must be an id.'}, status=400)
+
+    profile = getattr(request.user, 'userprofile', None)
+    if profile is not None and profile.role == 'PHARMACY_ADMIN' and not request.user.is_staff:
+        pharmacy = getattr(request.user, 'pharmacy', None)
+        if pharmacy is None or metric != 'PHARMACY_REVENUE':
+            return JsonResponse({'error': 'Not available for pharmacy accounts.'}, status=403)
+        key = pharmacy.id
+
+    rows = rollups.series(metric, start, end, key=key, status=request.GET.get('status'))
+    for row in rows:
+        row['day'] = row['day'].isoformat()
+        row['amount'] = float(row['amount'])
+    return JsonResponse({'metric': metric, 'key': key, 'from': start.isoformat(), 'to': end.isoformat(), 'rows': rows})
+
+
+@rate_limit('search')
+@vary_on_headers('X-Requested-With')
+@conditional_on(lambda request: [HOSPITALS])
 def hospital_list(request):
     city = request.GET.get('city')
     bed_type = request.GET.get('bed_type')
     min_rating = request.GET.get('min_rating')
+    specialty = request.GET.get('specialty')
 
     hospitals = Hospital.objects.all()
 
@@ -408,14 +510,18 @@ def hospital_list(request):
         hospitals = hospitals.filter(city__icontains=city)
     if min_rating:
         hospitals = hospitals.filter(rating__gte=min_rating)
+    if specialty:
+        hospitals = hospitals.filter(specialty_links__specialty__key=Specialty.key_for(specialty))
     if bed_type:
         hospitals = hospitals.filter(beds__bed_type=bed_type).distinct()
 
     context = {
-        'hospitals': hospitals.prefetch_related('beds'),
+        'hospitals': hospitals.prefetch_related('beds', 'specialties'),
+        'specialties': Specialty.objects.order_by('name'),
         'selected_city': city or '',
         'selected_bed_type': bed_type or '',
         'selected_min_rating': min_rating or '',
+        'selected_specialty': specialty or '',
     }
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -433,25 +539,31 @@ def hospital_list(request):
                 'name': hospital.name,
                 'city': hospital.city,
                 'rating': float(hospital.rating),
+                'specialties': [s.name for s in hospital.specialties.all()],
                 'beds': beds,
             })
         return JsonResponse({'hospitals': data})
     return render(request, 'core/hospitals/hospital_list.html', context)
 
 
+@conditional_on(lambda request, pk: [hospital_scope(pk)])
 def hospital_detail(request, pk):
-    hospital = get_object_or_404(Hospital, pk=pk)
-    beds = hospital.beds.all()
-    doctors = hospital.doctors.all()
-    return render(request, 'core/hospitals/hospital_detail.html', {
-        'hospital': hospital,
-        'beds': beds,
-        'doctors': doctors,
-    })
+    context = fragment_context(request, 'hospital_detail', [hospital_scope(pk)], pk)
+    if not context['fragment_cached']:
+        # The fragment only exists for hospitals that existed when it was
+        # rendered (deletes bump the version), so only a miss needs the lookup.
+        hospital = get_object_or_404(Hospital.objects.prefetch_related('specialties'), pk=pk)
+        context.update({
+            'hospital': hospital,
+            'beds': hospital.beds.all(),
+            'doctors': hospital.doctors.all(),
+        })
+    return render(request, 'core/hospitals/hospital_detail.html', context)
 
 
 @login_required
 @role_required(['PATIENT'])
+@idempotent
 def bed_booking_create(request, bed_id):
     bed = get_object_or_404(HospitalBed, id=bed_id)
     if bed.available_beds <= 0:
@@ -470,7 +582,7 @@ def bed_booking_create(request, bed_id):
             # Usually for medical booking, we only reduce upon CONFIRMATION by admin.
             # But the user asked for "booking" visible in admin to approve.
             
-            Notification.objects.create(
+            queue_notification(
                 user=request.user,
                 message=f'Bed booking request for {bed.get_bed_type_display()} at {bed.hospital.name} submitted.',
                 notification_type='BED',
@@ -500,14 +612,12 @@ def admin_update_bed_booking_status(request, pk):
         
         # If approved, reduce available beds
         if status == 'CONFIRMED' and old_status != 'CONFIRMED':
-            bed = booking.hospital_bed
-            if bed.available_beds > 0:
-                bed.available_beds -= 1
-                bed.save()
-            else:
+            if not inventory.adjust(
+                booking.hospital_bed, 'available_beds', -1, 'BED_BOOKING', user=request.user,
+            ):
                 messages.warning(request, f'Bed count is already 0, but booking was marked confirmed.')
 
-        Notification.objects.create(
+        queue_notification(
             user=booking.patient,
             message=f'Your bed booking at {booking.hospital_bed.hospital.name} is now {status}.',
             notification_type='BED',
@@ -518,30 +628,43 @@ def admin_update_bed_booking_status(request, pk):
     return redirect('admin_dashboard')
 
 
+@rate_limit('search')
+@conditional_on(lambda request: [DOCTORS])
 def doctor_search(request):
     speciality = request.GET.get('speciality')
     city = request.GET.get('city')
-    doctors = Doctor.objects.filter(is_active=True)
-
-    if speciality:
-        doctors = doctors.filter(speciality__iexact=speciality)
-    if city:
-        doctors = doctors.filter(city__icontains=city)
+    languages = sorted({language for language in request.GET.getlist('language') if language.strip()})
+    sort = doctor_ranking.sort_key(request.GET.get('sort'))
+    after = request.GET.get('after')
 
-    return render(request, 'core/doctors/doctor_search.html', {
-        'doctors': doctors.select_related('hospital'),
+    context = fragment_context(
+        request, 'doctor_search', [DOCTORS], speciality or '', city or '', ','.join(languages), sort, after or '',
+    )
+    doctors, next_cursor = [], None
+    if not context['fragment_cached']:
+        rows = doctor_ranking.search(speciality, city, sort, after, languages=languages)
+        doctors, next_cursor = doctor_ranking.page(rows.select_related('hospital').prefetch_related('languages'), sort)
+    context.update({
+        'doctors': doctors,
+        'next_cursor': next_cursor,
+        'sorts': doctor_ranking.SORTS,
+        'selected_sort': sort,
+        'language_options': Language.objects.order_by('name'),
+        'selected_languages': languages,
         'selected_speciality': speciality or '',
         'selected_city': city or '',
     })
+    return render(request, 'core/doctors/doctor_search.html', context)
 
 
 def doctor_detail(request, pk):
-    doctor = get_object_or_404(Doctor, pk=pk)
+    doctor = get_object_or_404(Doctor.objects.prefetch_related('languages'), pk=pk)
     return render(request, 'core/doctors/doctor_detail.html', {'doctor': doctor})
 
 
 @login_required
 @role_required(['PATIENT'])
+@idempotent
 def book_appointment(request, doctor_id):
     doctor = get_object_or_404(Doctor, id=doctor_id, is_active=True)
     if request.method == 'POST':
@@ -551,7 +674,7 @@ def book_appointment(request, doctor_id):
             appointment.patient = request.user
             appointment.doctor = doctor
             appointment.save()
-            Notification.objects.create(
+            queue_notification(
                 user=request.user,
                 message=f'Appointment booked with Dr. {doctor.name} on {appointment.date}.',
                 notification_type='APPOINTMENT',
@@ -566,22 +689,81 @@ def book_appointment(request, doctor_id):
     })
 
 
+def _review(request, booking, field, subject, visit):
+    if not ratings.completed(booking):
+        messages.error(request, 'You can leave a review once your visit has taken place.')
+        return redirect('patient_dashboard')
+    if hasattr(booking, 'review'):
+        messages.info(request, 'You have already reviewed this visit.')
+        return redirect('patient_dashboard')
+
+    if request.method == 'POST':
+        form = ReviewForm(request.POST, instance=Review(patient=request.user, **{field: booking}))
+        if form.is_valid():
+            try:
+                with transaction.atomic():
+                    form.save()
+            except IntegrityError:
+                # The same form submitted twice.
+                messages.info(request, 'You have already reviewed this visit.')
+            else:
+                messages.success(request, f'Thank you for rating {subject}.')
+            return redirect('patient_dashboard')
+    else:
+        form = ReviewForm()
+    return render(request, 'core/reviews/review_form.html', {
+        'form': form,
+        'subject': subject,
+        'visit': visit,
+    })
+
+
+@login_required
+@role_required(['PATIENT'])
+def review_appointment(request, pk):
+    appointment = get_object_or_404(
+        Appointment.objects.select_related('doctor', 'review'), pk=pk, patient=request.user,
+    )
+    return _review(
+        request, appointment, 'appointment', f'Dr. {appointment.doctor.name}',
+        f'Appointment on {appointment.date} at {appointment.time_slot}',
+    )
+
+
+@login_required
+@role_required(['PATIENT'])
+def review_bed_booking(request, pk):
+    booking = get_object_or_404(
+        BedBooking.objects.select_related('hospital_bed__hospital', 'review'), pk=pk, patient=request.user,
+    )
+    return _review(
+        request, booking, 'bed_booking', booking.hospital_bed.hospital.name,
+        f'{booking.hospital_bed.get_bed_type_display()} bed from {booking.booking_date}',
+    )
+
+
+@rate_limit('search')
+@conditional_on(lambda request: [OXYGEN])
 def oxygen_list(request):
     city = request.GET.get('city')
     suppliers = OxygenSupplier.objects.all().select_related('user')
     if city:
         suppliers = suppliers.filter(city__icontains=city)
     suppliers = suppliers.prefetch_related('stocks')
-    return render(request, 'core/oxygen/oxygen_list.html', {
+    context = fragment_context(request, 'oxygen_list', [OXYGEN], city or '')
+    context.update({
         'suppliers': suppliers,
         'selected_city': city or '',
     })
+    return render(request, 'core/oxygen/oxygen_list.html', context)
 
 
 @login_required
 @role_required(['PATIENT'])
+@idempotent
 def oxygen_booking_create(request, stock_id):
-    stock = get_object_or_404(OxygenCylinderStock, id=stock_id)
+    stock = get_object_or_404(OxygenCylinderStock.objects.select_related('supplier'), id=stock_id)
+    split = None
     if request.method == 'POST':
         form = OxygenBookingForm(request.POST)
         if form.is_valid():
@@ -589,10 +771,42 @@ def oxygen_booking_create(request, stock_id):
             booking.patient = request.user
             booking.stock = stock
             if booking.quantity > stock.available_cylinders:
-                messages.error(request, 'Not enough cylinders available.')
+                # Offer to split the request across suppliers of the same
+                # cylinder size in the city, delivering if this one does.
+                request_args = (stock.supplier.city, stock.capacity_litres, booking.quantity)
+                delivery = stock.supplier.delivery_available
+                if request.POST.get('split'):
+                    details = {field: getattr(booking, field) for field in form.Meta.fields if field != 'quantity'}
+                    allocation = oxygen_allocation.allocate(
+                        request.user, *request_args, details, delivery=delivery, prefer=stock,
+                    )
+                    if allocation is not None:
+                        suppliers = allocation.bookings.count()
+                        queue_notification(
+                            user=request.user,
+                            message=(
+                                f'Oxygen booking for {allocation.quantity} x {allocation.capacity_litres}L '
+                                f'split across {suppliers} suppliers submitted.'
+                            ),
+                            notification_type='OXYGEN',
+                        )
+                        messages.success(
+                            request,
+                            f'Booked {allocation.quantity} cylinders across {suppliers} suppliers. Waiting for approval.',
+                        )
+                        return redirect('patient_dashboard')
+                split = oxygen_allocation.plan(*request_args, delivery=delivery, prefer=stock)
+                if split is None:
+                    messages.error(request, 'Not enough cylinders available.')
+                else:
+                    messages.info(
+                        request,
+                        f'{stock.supplier.name} has {stock.available_cylinders} cylinder(s); '
+                        f'the request can be split across {len(split)} suppliers in {stock.supplier.city}.',
+                    )
             else:
                 booking.save()
-                Notification.objects.create(
+                queue_notification(
                     user=request.user,
                     message=f'Oxygen booking request for {stock.capacity_litres}L from {stock.supplier.name} submitted.',
                     notification_type='OXYGEN',
@@ -604,16 +818,22 @@ def oxygen_booking_create(request, stock_id):
     return render(request, 'core/oxygen/oxygen_booking_form.html', {
         'stock': stock,
         'form': form,
+        'split': split,
+        'split_total': sum(part.stock.price_per_cylinder * part.quantity for part in split) if split else None,
     })
 
 
+@rate_limit('search')
+@conditional_on(lambda request: [MEDICINES])
 def medicine_search(request):
     name = request.GET.get('name')
     city = request.GET.get('city')
-    medicines = Medicine.objects.select_related('pharmacy').all()
+    medicines = Medicine.objects.select_related('pharmacy', 'product').all()
 
     if name:
-        medicines = medicines.filter(name__icontains=name)
+        # Match against the catalog, then fetch listings for the hits only.
+        products = MedicineProduct.objects.filter(name__icontains=name).values('pk')
+        medicines = medicines.filter(product__in=products)
     if city:
         medicines = medicines.filter(pharmacy__city__icontains=city)
 
@@ -633,32 +853,35 @@ def medicine_search(request):
 
 @login_required
 @role_required(['PATIENT'])
+@idempotent
 def medicine_order_create(request, medicine_id):
-    medicine = get_object_or_404(Medicine, id=medicine_id)
+    medicine = get_object_or_404(Medicine.objects.select_related('product', 'pharmacy'), id=medicine_id)
     if request.method == 'POST':
         item_form = MedicineOrderItemForm(request.POST)
         contact_form = MedicineOrderContactForm(request.POST)
         if item_form.is_valid() and contact_form.is_valid():
             quantity = item_form.cleaned_data['quantity']
-            if quantity > medicine.stock:
+            try:
+                with transaction.atomic():
+                    inventory.take(medicine, 'stock', quantity, 'MEDICINE_ORDER', user=request.user)
+                    order = MedicineOrder.objects.create(
+                        patient=request.user,
+                        pharmacy=medicine.pharmacy,
+                        status='PENDING',
+                        contact_phone=contact_form.cleaned_data['contact_phone'],
+                        shipping_address=contact_form.cleaned_data['shipping_address'],
+                    )
+                    MedicineOrderItem.objects.create(
+                        order=order,
+                        medicine=medicine,
+                        quantity=quantity,
+                        price_at_order=medicine.price,
+                    )
+            except inventory.InsufficientStock:
+                medicine.refresh_from_db(fields=['stock'])
                 messages.error(request, 'Not enough stock.')
             else:
-                order = MedicineOrder.objects.create(
-                    patient=request.user,
-                    pharmacy=medicine.pharmacy,
-                    status='PENDING',
-                    contact_phone=contact_form.cleaned_data['contact_phone'],
-                    shipping_address=contact_form.cleaned_data['shipping_address'],
-                )
-                MedicineOrderItem.objects.create(
-                    order=order,
-                    medicine=medicine,
-                    quantity=quantity,
-                    price_at_order=medicine.price,
-                )
-                medicine.stock -= quantity
-                medicine.save()
-                Notification.objects.create(
+                queue_notification(
                     user=request.user,
                     message=f'Medicine order #{order.id} created.',
                     notification_type='MEDICINE',
@@ -716,7 +939,7 @@ def cart_add(request, medicine_id):
 def cart_detail(request):
     cart = (
         Cart.objects.filter(user=request.user, is_active=True)
-        .prefetch_related('items__medicine__pharmacy')
+        .prefetch_related('items__medicine__pharmacy', 'items__medicine__product')
         .first()
     )
     items = cart.items.all() if cart else []
@@ -728,6 +951,10 @@ def cart_detail(request):
             totals_by_pharmacy.setdefault(pharmacy, 0)
             totals_by_pharmacy[pharmacy] += item.subtotal
 
+    plan = cart_split.cart_plan(request.user, cart) if cart else None
+    if plan and not plan.improves:
+        plan = None
+
     return render(
         request,
         'core/medicines/cart_detail.html',
@@ -735,10 +962,38 @@ def cart_detail(request):
             'cart': cart,
             'items': items,
             'totals_by_pharmacy': totals_by_pharmacy,
+            'plan': plan,
+            'plan_signature': cart_split.signature(plan) if plan else '',
         },
     )
 
 
+@login_required
+@role_required(['PATIENT'])
+@require_POST
+def cart_optimize(request):
+    cart = (
+        Cart.objects.filter(user=request.user, is_active=True)
+        .prefetch_related('items__medicine__pharmacy', 'items__medicine__product')
+        .first()
+    )
+    plan = cart_split.cart_plan(request.user, cart) if cart else None
+    if plan is None or not plan.improves:
+        messages.info(request, 'Your cart is already the best split we could find.')
+        return redirect('cart_detail')
+    if request.POST.get('plan') != cart_split.signature(plan):
+        # The cart or the listings changed since the page was shown.
+        messages.warning(request, 'Prices or stock changed, so the suggested split was updated. Please check it again.')
+        return redirect('cart_detail')
+
+    cart_split.apply_plan(cart, plan)
+    messages.success(
+        request,
+        f'Cart rearranged into {plan.orders} pharmacy order(s) for ₹{plan.total}.',
+    )
+    return redirect('cart_detail')
+
+
 @login_required
 @role_required(['PATIENT'])
 @require_POST
@@ -786,10 +1041,11 @@ def cart_remove(request, item_id):
 
 @login_required
 @role_required(['PATIENT'])
+@idempotent
 def cart_checkout(request):
     cart = (
         Cart.objects.filter(user=request.user, is_active=True)
-        .prefetch_related('items__medicine__pharmacy')
+        .prefetch_related('items__medicine__pharmacy', 'items__medicine__product')
         .first()
     )
     if not cart or not cart.items.exists():
@@ -820,25 +1076,31 @@ def cart_checkout(request):
             for item in items:
                 by_pharmacy.setdefault(item.medicine.pharmacy, []).append(item)
 
-            for pharmacy, pharmacy_items in by_pharmacy.items():
-                order = MedicineOrder.objects.create(
-                    patient=request.user,
-                    pharmacy=pharmacy,
-                    status='PENDING',
-                    contact_phone=contact_form.cleaned_data['contact_phone'],
-                    shipping_address=contact_form.cleaned_data['shipping_address'],
-                )
-                for item in pharmacy_items:
-                    medicine = item.medicine
-                    MedicineOrderItem.objects.create(
-                        order=order,
-                        medicine=medicine,
-                        quantity=item.quantity,
-                        price_at_order=medicine.price,
-                    )
-                    medicine.stock -= item.quantity
-                    medicine.save()
-                orders_created.append(order)
+            # Stock is taken line by line; if another order got there first,
+            # nothing from this checkout is kept.
+            try:
+                with transaction.atomic():
+                    for pharmacy, pharmacy_items in by_pharmacy.items():
+                        order = MedicineOrder.objects.create(
+                            patient=request.user,
+                            pharmacy=pharmacy,
+                            status='PENDING',
+                            contact_phone=contact_form.cleaned_data['contact_phone'],
+                            shipping_address=contact_form.cleaned_data['shipping_address'],
+                        )
+                        for item in pharmacy_items:
+                            medicine = item.medicine
+                            inventory.take(medicine, 'stock', item.quantity, 'MEDICINE_ORDER', user=request.user)
+                            MedicineOrderItem.objects.create(
+                                order=order,
+                                medicine=medicine,
+                                quantity=item.quantity,
+                                price_at_order=medicine.price,
+                            )
+                        orders_created.append(order)
+            except inventory.InsufficientStock as exc:
+                messages.error(request, f'Not enough stock for {exc.instance.name}.')
+                return redirect('cart_detail')
 
             # Clear cart
             cart.items.all().delete()
@@ -846,7 +1108,7 @@ def cart_checkout(request):
             cart.save()
 
             for order in orders_created:
-                Notification.objects.create(
+                queue_notification(
                     user=request.user,
                     message=f'Medicine order #{order.id} created from your cart.',
                     notification_type='MEDICINE',
@@ -883,6 +1145,7 @@ def notifications_list(request):
     notifications = request.user.notifications.order_by('-created_at')
     return render(request, 'core/notifications/notification_list.html', {
         'notifications': notifications,
+        'unread_count': request.user.notifications.filter(is_read=False).count(),
     })
 
 
@@ -895,6 +1158,65 @@ def notification_mark_read(request, pk):
     return redirect('notifications_list')
 
 
+@login_required
+@require_POST
+def notification_mark_all_read(request):
+    updated = request.user.notifications.filter(is_read=False).update(is_read=True)
+    if updated:
+        messages.success(request, f'{updated} notification(s) marked as read.')
+    return redirect('notifications_list')
+
+
+INBOX_BATCH = 50
+
+
+async def _inbox_payload(user, after):
+    notifications = [
+        n async for n in Notification.objects.filter(user=user, pk__gt=after)
+        .order_by('pk')
+        .values('id', 'message', 'notification_type', 'is_read', 'created_at')[:INBOX_BATCH]
+    ]
+    return {
+        'notifications': notifications,
+        'last_id': notifications[-1]['id'] if notifications else after,
+        'unread_count': await Notification.objects.filter(user=user, is_read=False).acount(),
+    }
+
+
+@login_required
+@require_GET
+async def notification_inbox(request):
+    """
+    Long poll for notifications newer than ``?after=<id>``.
+
+    Answers as soon as there are any, or with an empty list after
+    ``?timeout=`` seconds (at most ``settings.INBOX_MAX_WAIT``). While
+    waiting, the request is parked in ``core.inbox`` and makes no queries.
+    Without ``after`` it answers at once with the id to poll from.
+    """
+    user = await request.auser()
+    try:
+        timeout = min(float(request.GET.get('timeout', settings.INBOX_MAX_WAIT)), settings.INBOX_MAX_WAIT)
+        after = request.GET.get('after')
+        after = int(after) if after is not None else None
+    except ValueError:
+        return JsonResponse({'error': 'after must be an id and timeout a number of seconds.'}, status=400)
+
+    if after is None:
+        last_id = await Notification.objects.filter(user=user).order_by('-pk').values_list('pk', flat=True).afirst()
+        return JsonResponse(await _inbox_payload(user, last_id or 0))
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(timeout, 0)
+    with inbox.waiting(user.pk) as waiter:
+        while True:
+            payload = await _inbox_payload(user, after)
+            remaining = deadline - loop.time()
+            if payload['notifications'] or remaining <= 0 or not await waiter.wait(remaining):
+                break
+    return JsonResponse(payload)
+
+
 def emergency_contacts(request):
     return render(request, 'core/support/emergency_contacts.html')
 
@@ -907,11 +1229,14 @@ def support_request_create(request):
             if request.user.is_authenticated:
                 support.user = request.user
             support.save()
+            priority = jobs.EMERGENCY if support.is_emergency else None
+            jobs.enqueue('alert_support_staff', {'support_request_id': support.pk}, priority=priority)
             if support.user:
-                Notification.objects.create(
+                queue_notification(
                     user=support.user,
                     message=f'Support request \"{support.subject}\" received.',
                     notification_type='SUPPORT',
+                    priority=priority,
                 )
             messages.success(request, 'Support request submitted. Our team will contact you soon.')
             return redirect('home')
@@ -948,6 +1273,7 @@ from django.conf import settings
 
 @csrf_exempt
 @require_POST
+@rate_limit('assistant')
 def assistant_api(request):
     """
     Intelligent Assistant powered by OpenAI (ChatGPT).
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.EmergencyFallbackMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +87,154 @@ DATABASES = {
 }
 
 
+# Cache
+# A file-based cache is shared by every worker process on the host, which keeps
+# the signal-driven fragment versions in core.caching consistent across workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.django_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Upper bound on how long a rendered fragment lives; signals invalidate earlier.
+FRAGMENT_CACHE_TIMEOUT = 600
+
+
+# Reminders
+# Minutes before the start of a booking at which `manage.py send_reminders`
+# notifies the patient (see core.reminders).
+
+REMINDER_OFFSETS = {
+    'appointment': [24 * 60, 60],
+    'bed_booking': [24 * 60, 2 * 60],
+    'oxygen_booking': [3 * 60],
+}
+
+
+# Notifications
+# Read notifications older than this many days are moved to the archive by
+# `manage.py archive_notifications`; with digests on, each user's archived
+# notifications are collapsed to one row per type and day.
+
+NOTIFICATION_RETENTION_DAYS = 30
+NOTIFICATION_ARCHIVE_DIGEST = False
+
+
+# Background jobs
+# Jobs queued with core.jobs.enqueue (notifications, support alerts) are run by
+# `manage.py run_worker`. Deployments running that worker set
+# CURA_JOB_WORKER=1; without it the handlers run inline in the request that
+# queues them, so nothing waits for a worker that does not exist.
+
+JOBS_INLINE = os.environ.get('CURA_JOB_WORKER') != '1'
+
+
+# Cart
+# Rupees a pharmacy order is considered to cost when suggesting how to split
+# a cart between pharmacies (see core.cart_split); higher favours fewer orders.
+
+CART_ORDER_PENALTY = 40
+
+
+# Oxygen deliveries
+# Width in minutes of the time-slot windows `core.delivery` batches a
+# supplier's bookings into before routing each batch.
+
+DELIVERY_SLOT_MINUTES = 120
+
+
+# Bed placement
+# Weights of the terms in the hospital shortlist score (see core.placement),
+# and how often, in seconds, a process checks whether another one changed a
+# city's beds.
+
+PLACEMENT_WEIGHTS = {
+    'availability': 0.45,
+    'rating': 0.25,
+    'specialty': 0.2,
+    'support_24_7': 0.1,
+}
+PLACEMENT_REFRESH_SECONDS = 2
+
+
+# Emergency mode
+# Where `manage.py write_snapshots` stores the static copies of the public
+# availability pages, and when core.middleware serves them instead: the
+# average database time (ms) or share of failing requests over the last
+# EMERGENCY_WINDOW requests for those pages, and how long, in seconds, to keep
+# serving them.
+
+EMERGENCY_SNAPSHOT_DIR = BASE_DIR / '.emergency_snapshots'
+EMERGENCY_DB_LATENCY_MS = 500
+EMERGENCY_ERROR_RATE = 0.5
+EMERGENCY_WINDOW = 20
+EMERGENCY_MIN_SAMPLES = 5
+EMERGENCY_COOLDOWN_SECONDS = 30
+
+
+# Rate limiting
+# (tokens per second, burst) for each endpoint class guarded by
+# core.ratelimit.rate_limit, per signed-in user or else per address. Buckets
+# are shared by the worker processes on a host through RATE_LIMIT_FILE.
+
+RATE_LIMITS = {
+    'search': (5, 30),
+    'assistant': (0.2, 5),
+}
+RATE_LIMIT_FILE = BASE_DIR / '.ratelimit'
+RATE_LIMIT_SLOTS = 65536
+
+
+# Async views
+# CURA_ASYNC_VIEWS=1 routes the public search pages to core.async_views. Off by
+# default, also under ASGI: each of their queries takes a thread and connection
+# of its own, and they are not yet faster than the sync views
+# (manage.py bench_search_views compares them).
+
+ASYNC_SEARCH_VIEWS = os.environ.get('CURA_ASYNC_VIEWS') == '1'
+
+
+# Notification inbox
+# Longest a long poll of the notification inbox waits, in seconds, and where
+# the processes waiting on it bind the sockets core.inbox wakes them through.
+
+INBOX_MAX_WAIT = 25
+INBOX_SOCKET_DIR = BASE_DIR / '.inbox'
+
+
+# Doctor ranking
+# Weights of the terms core.doctor_ranking sums into a doctor's search score,
+# the caps that scale experience and fee to 0..1, how many days ahead open
+# appointment slots count, and how many doctors a search page shows.
+
+DOCTOR_RANK_WEIGHTS = {
+    'rating': 0.4,
+    'experience': 0.2,
+    'fee': 0.15,
+    'availability': 0.25,
+}
+DOCTOR_RANK_EXPERIENCE_CAP = 30
+DOCTOR_RANK_FEE_CAP = 2000
+DOCTOR_RANK_HORIZON_DAYS = 3
+DOCTOR_SLOT_MINUTES = 30
+DOCTOR_SEARCH_PAGE_SIZE = 20
+
+
+# Idempotency keys
+# How long, in seconds, core.idempotency keeps the response to a keyed
+# booking or order POST for replay (manage.py sweep_idempotency_keys deletes
+# older keys), after how long a request that never answered stops holding its
+# key, and how long a resubmitted form waits for the first submission's
+# response.
+
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_LOCK_SECONDS = 60
+IDEMPOTENCY_WAIT_SECONDS = 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 